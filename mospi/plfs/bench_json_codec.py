@@ -0,0 +1,80 @@
+import argparse
+import io
+import itertools
+import os
+import time
+
+from json_codec import CODECS, available_codecs
+from store import DATA_ROOT, cleaned_path
+
+# Throughput of each JSON codec (json_codec.py) on a cleaned PLFS file, per stage:
+#
+#   stream read  iter_items() over the file, record by record
+#   whole read   load() of the whole array
+#   write        dump_array() of the records into memory
+#
+# Usage: python bench_json_codec.py [path] [--codecs stdlib fast] [--limit 100000]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench(codec, path, limit=None, repeat=1):
+    size_mb = os.path.getsize(path) / 1e6
+
+    def stream_read():
+        with open(path, "r", encoding="utf-8") as fin:
+            return sum(1 for _ in itertools.islice(codec.iter_items(fin), limit))
+
+    def whole_read():
+        with open(path, "r", encoding="utf-8") as fin:
+            return codec.load(fin)
+
+    results = {}
+    seconds, count = min((timed(stream_read) for _ in range(repeat)), key=lambda r: r[0])
+    results["stream read"] = (seconds, count, size_mb if limit is None else None)
+
+    if limit is None:
+        seconds, records = min((timed(whole_read) for _ in range(repeat)), key=lambda r: r[0])
+        results["whole read"] = (seconds, len(records), size_mb)
+    else:
+        with open(path, "r", encoding="utf-8") as fin:
+            records = list(itertools.islice(codec.iter_items(fin), limit))
+
+    def write():
+        buf = io.StringIO()
+        codec.dump_array(records, buf)
+        return buf.tell()
+
+    seconds, chars = min((timed(write) for _ in range(repeat)), key=lambda r: r[0])
+    results["write"] = (seconds, len(records), chars / 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON codecs on a cleaned PLFS file")
+    parser.add_argument("path", nargs="?", default=cleaned_path("perv1", DATA_ROOT, "json"))
+    parser.add_argument("--codecs", nargs="*", default=None, help=f"subset of {', '.join(CODECS)}")
+    parser.add_argument("--limit", type=int, default=None, help="records to read / write (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is reported")
+    args = parser.parse_args()
+
+    installed = available_codecs()
+    names = args.codecs or installed
+    for name in names:
+        if name not in installed:
+            parser.error(f"codec {name!r} is not available (installed: {', '.join(installed)})")
+
+    print(f"{os.path.basename(args.path)}: {os.path.getsize(args.path) / 1e6:,.1f} MB")
+    print(f"{'codec':<8} {'stage':<12} {'rows':>10} {'seconds':>9} {'MB/s':>8}")
+    for name in names:
+        for stage, (seconds, rows, mb) in bench(CODECS[name](), args.path, args.limit, args.repeat).items():
+            rate = f"{mb / seconds:8.1f}" if mb is not None and seconds else f"{'-':>8}"
+            print(f"{name:<8} {stage:<12} {rows:>10,} {seconds:>9.3f} {rate}")
+
+
+if __name__ == "__main__":
+    main()
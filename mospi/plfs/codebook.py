@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from store import DATA_ROOT
+
+# Compiled reference codebook: district_mapping.json, nss_regions.json,
+# industry_codes.json and occupation_codes.json turned into flat int32 lookup
+# arrays (code -> string id) plus one UTF-8 string table.
+#
+#   codebook/meta.json            format version, source hashes, table layout
+#   codebook/strings.bin          all labels, UTF-8, back to back
+#   codebook/offsets.npy          string id -> byte offset (n + 1 entries)
+#   codebook/<table>_<digits>.npy code -> string id (-1 = no entry), per key length
+#   codebook/district.npy         [state id, district code] -> string id
+#
+# Every array is opened with np.load(mmap_mode="r"): opening is a few small
+# reads, and a process pool that opens the same codebook shares its pages
+# instead of unpickling a copy of every dict per worker.
+
+CODEBOOK_VERSION = 1
+CODEBOOK_DIR = "codebook"
+
+SOURCES = {
+    "district": "district_mapping.json",
+    "nss": "nss_regions.json",
+    "nic": "industry_codes.json",
+    "nco": "occupation_codes.json",
+}
+
+
+def codebook_dir(data_root=DATA_ROOT):
+    return os.path.join(data_root, CODEBOOK_DIR)
+
+
+def source_hashes(data_root=DATA_ROOT):
+    hashes = {}
+    for fname in SOURCES.values():
+        with open(os.path.join(data_root, fname), "rb") as f:
+            hashes[fname] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def compile_codebook(data_root=DATA_ROOT):
+    """Compiles the four mapping JSONs into codebook/ under data_root."""
+    out_dir = codebook_dir(data_root)
+    os.makedirs(out_dir, exist_ok=True)
+
+    strings, index = [], {}
+
+    def string_id(s):
+        s = str(s)
+        if s not in index:
+            index[s] = len(strings)
+            strings.append(s)
+        return index[s]
+
+    def flat_table(mapping):
+        """{'07': 'x', '123': 'y'} -> {2: array, 3: array}; non-numeric keys kept aside."""
+        by_len, extra = {}, {}
+        for key, label in mapping.items():
+            if key.isdigit():
+                by_len.setdefault(len(key), {})[int(key)] = string_id(label)
+            else:
+                extra[key] = label
+        arrays = {}
+        for digits, entries in by_len.items():
+            arr = np.full(max(entries) + 1, -1, dtype=np.int32)
+            arr[list(entries)] = list(entries.values())
+            arrays[digits] = arr
+        return arrays, extra
+
+    meta = {"version": CODEBOOK_VERSION, "sources": source_hashes(data_root), "tables": {}, "extra": {}}
+
+    for table in ("nss", "nic", "nco"):
+        with open(os.path.join(data_root, SOURCES[table]), "r", encoding="utf-8") as f:
+            arrays, extra = flat_table(json.load(f))
+        for digits, arr in arrays.items():
+            np.save(os.path.join(out_dir, f"{table}_{digits}.npy"), arr)
+        meta["tables"][table] = sorted(arrays)
+        meta["extra"][table] = extra
+
+    with open(os.path.join(data_root, SOURCES["district"]), "r", encoding="utf-8") as f:
+        district_mapping = json.load(f)
+    states = sorted(district_mapping)
+    width = 1 + max((int(c) for codes in district_mapping.values() for c in codes if c.isdigit()), default=0)
+    district = np.full((len(states), width), -1, dtype=np.int32)
+    for i, state in enumerate(states):
+        for code, name in district_mapping[state].items():
+            if code.isdigit():
+                district[i, int(code)] = string_id(name)
+    np.save(os.path.join(out_dir, "district.npy"), district)
+    meta["states"] = states
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    with open(os.path.join(out_dir, "strings.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Codebook v{CODEBOOK_VERSION}: {len(strings):,} labels, {len(states)} states → {out_dir}")
+    return out_dir
+
+
+class CodeTable:
+    """One code -> label table; .get() behaves like the dict loaded from JSON."""
+
+    def __init__(self, codebook, arrays, extra):
+        self.codebook = codebook
+        self.arrays = arrays
+        self.extra = extra
+
+    def ids(self, codes, width=2):
+        """Vectorized: integer codes -> string ids (-1 where there is no entry)."""
+        codes = np.asarray(codes, dtype=np.float64)
+        valid = np.isfinite(codes) & (codes >= 0)
+        ints = np.where(valid, codes, 0).astype(np.int64)
+        digits = np.maximum(width, np.char.str_len(ints.astype(str)))
+        out = np.full(len(codes), -1, dtype=np.int32)
+        for n, arr in self.arrays.items():
+            sel = valid & (digits == n) & (ints < len(arr))
+            out[sel] = arr[ints[sel]]
+        return out
+
+    def lookup(self, codes, width=2):
+        """Vectorized: integer codes -> object array of labels (None where missing)."""
+        return self.codebook.labels(self.ids(codes, width))
+
+    def reverse(self):
+        """label -> code key (e.g. '07'), for turning decoded labels back into codes."""
+        out = {}
+        for n, arr in sorted(self.arrays.items()):
+            for code in np.flatnonzero(np.asarray(arr) >= 0):
+                out.setdefault(self.codebook.label(int(arr[code])), str(code).zfill(n))
+        return out
+
+    def get(self, key, default=None):
+        if key in self.extra:
+            return self.extra[key]
+        if not key.isdigit():
+            return default
+        arr = self.arrays.get(len(key))
+        if arr is None or int(key) >= len(arr) or arr[int(key)] < 0:
+            return default
+        return self.codebook.label(int(arr[int(key)]))
+
+
+class DistrictTable:
+    """(state, district code) -> district name; .get(state).get(code) like district_mapping.json."""
+
+    def __init__(self, codebook, array, states):
+        self.codebook = codebook
+        self.array = array
+        self.state_ids = {s: i for i, s in enumerate(states)}
+
+    def ids(self, state_ids, codes):
+        """Vectorized: (state id, integer district code) arrays -> string ids."""
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.float64)
+        ok = (state_ids >= 0) & np.isfinite(codes) & (codes >= 0) & (codes < self.array.shape[1])
+        out = np.full(len(codes), -1, dtype=np.int32)
+        out[ok] = self.array[state_ids[ok], codes[ok].astype(np.int64)]
+        return out
+
+    def get(self, state, default=None):
+        i = self.state_ids.get(state)
+        if i is None:
+            return {} if default is None else default
+        return _DistrictRow(self, i)
+
+
+class _DistrictRow:
+    def __init__(self, table, state_id):
+        self.table = table
+        self.state_id = state_id
+
+    def get(self, code, default=None):
+        if not code.isdigit() or int(code) >= self.table.array.shape[1]:
+            return default
+        sid = self.table.array[self.state_id, int(code)]
+        return self.table.codebook.label(int(sid)) if sid >= 0 else default
+
+
+class Codebook:
+    def __init__(self, data_root=DATA_ROOT):
+        folder = codebook_dir(data_root)
+        with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != CODEBOOK_VERSION:
+            raise ValueError(f"codebook version {self.meta['version']} != {CODEBOOK_VERSION}; recompile it")
+
+        self.offsets = np.load(os.path.join(folder, "offsets.npy"), mmap_mode="r")
+        self.blob = np.memmap(os.path.join(folder, "strings.bin"), dtype=np.uint8, mode="r") \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self._labels = {}
+
+        self.tables = {}
+        for table, lengths in self.meta["tables"].items():
+            arrays = {n: np.load(os.path.join(folder, f"{table}_{n}.npy"), mmap_mode="r") for n in lengths}
+            self.tables[table] = CodeTable(self, arrays, self.meta["extra"][table])
+        self.tables["district"] = DistrictTable(
+            self, np.load(os.path.join(folder, "district.npy"), mmap_mode="r"), self.meta["states"])
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+    def label(self, sid):
+        if sid not in self._labels:
+            self._labels[sid] = bytes(self.blob[self.offsets[sid]:self.offsets[sid + 1]]).decode("utf-8")
+        return self._labels[sid]
+
+    def labels(self, ids):
+        """Vectorized id -> label: decodes each distinct id once."""
+        ids = np.asarray(ids)
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        values = np.empty(len(uniq), dtype=object)
+        values[:] = [self.label(int(i)) if i >= 0 else None for i in uniq]
+        return values[inverse.ravel()]
+
+
+def open_codebook(data_root=DATA_ROOT):
+    """Opens codebook/ under data_root, recompiling it first if missing or out of date."""
+    folder = codebook_dir(data_root)
+    meta_path = os.path.join(folder, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stale = meta.get("version") != CODEBOOK_VERSION or meta.get("sources") != source_hashes(data_root)
+    if stale:
+        compile_codebook(data_root)
+    return Codebook(data_root)
+
+
+def code_labels(dist, table, roundup_dig=2):
+    """
+    Re-keys a distribution over code keys ('01', '111'; see decoders.code_keys)
+    by the codes' labels in `table`; unlabelled codes and 'other' keep their
+    key, and codes sharing a label are added up.
+    """
+    out = {}
+    for key, share in dist.items():
+        label = table.get(key, key)
+        out[label] = round(out[label] + share, roundup_dig) if label in out else share
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the PLFS mapping JSONs into a binary codebook")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    args = parser.parse_args()
+    compile_codebook(args.data_root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from store import DATA_ROOT, cleaned_path, file_source, read_json_frame, source_signature
+
+# On-disk column store for the cleaned PLFS files.
+#
+#   column_store/<name>/dictionary.json   the dataset's string table
+#   column_store/<name>/manifest.json     row count, per-column kind/dtype/file, origin
+#   column_store/<name>/c<i>.bin          raw array: float64 values or int32 codes
+#
+# String columns are stored as int32 indexes into the dataset's dictionary (-1
+# for missing), numeric columns as float64. Each dataset's store is self-contained,
+# so building one never rewrites another's files. Everything is opened with np.memmap, so
+# opening a store reads two small JSON files and only the touched columns are
+# ever paged in.
+#
+# "origin" is the copy the store was built from (store.file_source) with the
+# size and modification time of its files; once they change the store is stale
+# and store.cleaned_source rebuilds it.
+
+STORE_DIR = "column_store"
+CODE_DTYPE = np.int32
+VALUE_DTYPE = np.float64
+
+
+def store_root(data_root=DATA_ROOT):
+    return os.path.join(data_root, STORE_DIR)
+
+
+def load_dictionary(folder):
+    with open(os.path.join(folder, "dictionary.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_dictionary(folder, strings):
+    with open(os.path.join(folder, "dictionary.json"), "w", encoding="utf-8") as f:
+        json.dump(strings, f, ensure_ascii=False)
+
+
+def origin(name, data_root=DATA_ROOT):
+    """{"source", "files"}: the copy a store of `name` is built from and its files' signature."""
+    source = file_source(name, data_root)
+    return {"source": source, "files": source_signature(name, source, data_root)}
+
+
+def is_current(name, data_root=DATA_ROOT):
+    """
+    False when the copy the store was built from changed since, or the store
+    predates per-dataset dictionaries (True when no copy is left to rebuild from).
+    """
+    current = origin(name, data_root)
+    if current["source"] == "json" and not os.path.exists(cleaned_path(name, data_root, "json")):
+        return True
+    folder = os.path.join(store_root(data_root), name)
+    if not os.path.exists(os.path.join(folder, "dictionary.json")):
+        return False
+    with open(os.path.join(folder, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f).get("origin") == current
+
+
+def iter_source_frames(name, data_root, source):
+    """Yields the cleaned dataset in pieces: Parquet row groups, or the whole partitioned / JSON copy."""
+    from partitions import load_partitions
+
+    if source == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(cleaned_path(name, data_root, "parquet"))
+        for i in range(pf.num_row_groups):
+            yield pf.read_row_group(i).to_pandas()
+    elif source == "partitioned":
+        yield load_partitions(name, data_root=data_root)
+    else:
+        yield read_json_frame(cleaned_path(name, data_root, "json"))
+
+
+def is_numeric(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return pd.api.types.is_numeric_dtype(series.dropna().infer_objects())
+
+
+def build_column_store(name, data_root=DATA_ROOT):
+    """Converts <name>_cleaned.{parquet,json} into a memory-mappable column store."""
+    folder = os.path.join(store_root(data_root), name)
+    os.makedirs(folder, exist_ok=True)
+
+    built_from = origin(name, data_root)  # before reading: a copy changed meanwhile leaves the store stale
+    strings = []
+    index = {}
+
+    def dictionary_codes(values):
+        codes = np.empty(len(values), dtype=CODE_DTYPE)
+        for i, v in enumerate(values):
+            key = str(v)
+            if key not in index:
+                index[key] = len(strings)
+                strings.append(key)
+            codes[i] = index[key]
+        return codes
+
+    columns, handles, n_rows = {}, {}, 0
+    try:
+        for df in iter_source_frames(name, data_root, built_from["source"]):
+            if not columns:
+                for i, col in enumerate(df.columns):
+                    kind = "numeric" if is_numeric(df[col]) else "category"
+                    dtype = VALUE_DTYPE if kind == "numeric" else CODE_DTYPE
+                    columns[col] = {"kind": kind, "dtype": np.dtype(dtype).name, "file": f"c{i}.bin"}
+                    handles[col] = open(os.path.join(folder, f"c{i}.bin"), "wb")
+
+            for col, info in columns.items():
+                series = df[col]
+                if info["kind"] == "numeric":
+                    arr = pd.to_numeric(series, errors="coerce").to_numpy(dtype=VALUE_DTYPE, na_value=np.nan)
+                else:
+                    cat = pd.Categorical(series.astype(object).where(series.notna(), None))
+                    lookup = dictionary_codes(cat.categories)
+                    arr = np.where(cat.codes >= 0, lookup[cat.codes] if len(lookup) else -1, -1).astype(CODE_DTYPE)
+                handles[col].write(arr.tobytes())
+            n_rows += len(df)
+    finally:
+        for f in handles.values():
+            f.close()
+
+    save_dictionary(folder, strings)
+    with open(os.path.join(folder, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"n_rows": n_rows, "columns": columns, "origin": built_from}, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ {name}: {n_rows:,} rows, {len(columns)} columns → {folder}")
+    return folder
+
+
+class ColumnStore:
+    """Read-only view of one dataset in the column store."""
+
+    def __init__(self, name, data_root=DATA_ROOT):
+        self.name = name
+        self.folder = os.path.join(store_root(data_root), name)
+        with open(os.path.join(self.folder, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.n_rows = manifest["n_rows"]
+        self.columns = manifest["columns"]
+        self.dictionary = load_dictionary(self.folder)
+        self._index = None
+        self._maps = {}
+
+    @classmethod
+    def exists(cls, name, data_root=DATA_ROOT):
+        return os.path.exists(os.path.join(store_root(data_root), name, "manifest.json"))
+
+    def array(self, col):
+        """float64 values or int32 codes for `col`, memory-mapped (not read until touched)."""
+        if col not in self._maps:
+            info = self.columns[col]
+            path = os.path.join(self.folder, info["file"])
+            if self.n_rows == 0:
+                self._maps[col] = np.empty(0, dtype=info["dtype"])
+            else:
+                self._maps[col] = np.memmap(path, dtype=info["dtype"], mode="r", shape=(self.n_rows,))
+        return self._maps[col]
+
+    def is_category(self, col):
+        return self.columns[col]["kind"] == "category"
+
+    def code(self, value):
+        """Dictionary code of a string (-2 if it never occurs, so it matches nothing)."""
+        if self._index is None:
+            self._index = {s: i for i, s in enumerate(self.dictionary)}
+        return self._index.get(value, -2)
+
+    def mask_eq(self, col, value):
+        return self.array(col) == self.code(value)
+
+    def categorical(self, col, rows=slice(None)):
+        """pandas Categorical over the dictionary; only used categories are kept."""
+        codes = np.asarray(self.array(col)[rows])
+        used = np.unique(codes[codes >= 0])
+        remap = np.full(len(self.dictionary) + 1, -1, dtype=CODE_DTYPE)
+        remap[used] = np.arange(len(used), dtype=CODE_DTYPE)
+        local = np.where(codes >= 0, remap[codes], -1)
+        return pd.Categorical.from_codes(local, categories=[self.dictionary[i] for i in used])
+
+    def frame(self, columns=None, rows=slice(None)):
+        """DataFrame of `columns` over `rows` (a slice): categoricals and float64, never object dtype."""
+        columns = list(columns) if columns else list(self.columns)
+        missing = [c for c in columns if c not in self.columns]
+        if missing:
+            raise KeyError(f"{self.name} column store has no column(s): {missing}")
+        data = {c: (self.categorical(c, rows) if self.is_category(c) else self.array(c)[rows]) for c in columns}
+        return pd.DataFrame(data, copy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped PLFS column store")
+    parser.add_argument("datasets", nargs="*", help="any of hhv1, hhrv, perv1, perrv (default: all)")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    args = parser.parse_args()
+
+    for name in args.datasets or ["hhv1", "hhrv", "perv1", "perrv"]:
+        build_column_store(name, args.data_root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from store import DATA_ROOT, load_cleaned, write_parquet
+from weighted import WEIGHT_COLS, final_weight
+
+# Weighted OLAP cube over the PLFS person records.
+#
+# Every person is reduced to eight dimensions (state, sector, gender, age band,
+# general education, activity-status category, NIC section, NCO division) and
+# the cube stores, per observed combination:
+#
+#   n                  records (unweighted sample size)
+#   w                  sum of survey weights (estimated persons)
+#   <measure>_w        sum of weights where the measure is present
+#   <measure>_wx       sum of weight * value
+#   <measure>_wxx      sum of weight * value^2
+#
+# Any slice, weighted mean, standard deviation or share is then a sum over
+# cube cells:  python cube.py  builds  <data_root>/cube/person_cube.parquet.
+
+CUBE_DIR = "cube"
+CUBE_FILE = "person_cube.parquet"
+
+# rural from the first-visit file, urban from the revisit file, as in statewise_v3.py
+SOURCES = {"rural": "perv1", "urban": "perrv"}
+
+# revisit spellings -> first-visit names
+COLUMN_FIXES = {"Earnings For Regular Salarid/Wage Activity": "Earnings For Regular Salaried/Wage Activity"}
+
+DIMENSIONS = ["state", "sector", "gender", "age_band", "education", "status", "nic_section", "nco_division"]
+
+MEASURES = {
+    "regular_wage": "Earnings For Regular Salaried/Wage Activity",
+    "self_employed_earning": "Earnings For Self Employed",
+    "age": "Age",
+    "years_education": "No. of years in Formal Education",
+}
+
+AGE_BANDS = ([0, 15, 30, 60, np.inf], ["0-14", "15-29", "30-59", "60+"])
+
+STATUS_GROUPS = {
+    "worked in h.h. enterprise (self-employed): own account worker": "self_employed",
+    "worked in h.h. enterprise (self-employed): employer": "self_employed",
+    "worked as helper in h.h. enterprise (unpaid family worker)": "self_employed",
+    "worked as regular salaried/wage employee": "regular_wage",
+    "worked as casual wage labour: in public works": "casual_labour",
+    "worked as casual wage labour: in other types of work": "casual_labour",
+    "did not work but was seeking and/or available for work": "unemployed",
+    "attended educational institution": "not_in_labour_force",
+    "attended domestic duties only": "not_in_labour_force",
+    "attended domestic duties and was also engaged in free collection of goods (vegetables, roots, firewood, cattle feed, etc.), sewing, tailoring, weaving, etc. for household use": "not_in_labour_force",
+    "rentiers, pensioners, remittance recipients, etc.": "not_in_labour_force",
+    "not able to work due to disability": "not_in_labour_force",
+    "others (including begging, prostitution, etc.)": "not_in_labour_force",
+    # weekly (CWS) and daily statuses only
+    "worked as casual wage labour: in mgnreg public works": "casual_labour",
+    "worked as casual wage labour: in public works other than mgnreg public works": "casual_labour",
+    "had work in h.h. enterprise but did not work due to sickness": "self_employed",
+    "had work in h.h. enterprise but did not work due to other reasons": "self_employed",
+    "had regular salaried/wage employment but did not work due to sickness": "regular_wage",
+    "had regular salaried/wage employment but did not work due to other reasons": "regular_wage",
+    "sought work": "unemployed",
+    "did not seek but was available for work": "unemployed",
+    "did not work due to sickness (for casual workers only)": "not_in_labour_force",
+    "children of age 0-4 years": "not_in_labour_force",
+}
+# NSS activity-status codes (usual, weekly and daily status share the list, see
+# perv1/StatusCode.csv), for statuses kept as codes (lazy labels) or whose label
+# is spelled differently from STATUS_GROUPS
+STATUS_CODES = {
+    11: "self_employed", 12: "self_employed", 21: "self_employed",
+    61: "self_employed", 62: "self_employed",
+    31: "regular_wage", 71: "regular_wage", 72: "regular_wage",
+    41: "casual_labour", 42: "casual_labour", 51: "casual_labour",
+    81: "unemployed", 82: "unemployed",
+    91: "not_in_labour_force", 92: "not_in_labour_force", 93: "not_in_labour_force", 94: "not_in_labour_force",
+    95: "not_in_labour_force", 97: "not_in_labour_force", 98: "not_in_labour_force", 99: "not_in_labour_force",
+}
+EMPLOYED = ["self_employed", "regular_wage", "casual_labour"]
+
+
+def cube_path(data_root=DATA_ROOT):
+    return os.path.join(data_root, CUBE_DIR, CUBE_FILE)
+
+
+def person_dimensions(df):
+    """
+    The cube's dimension columns for a cleaned person frame (status group and
+    age band from the derived-column cache, NIC / NCO rollups from ingest).
+    """
+    return pd.DataFrame({
+        "state": df["State/Ut Code"].astype(object),
+        "sector": df["Sector"].astype(object),
+        "gender": df["Gender"].astype(object),
+        "age_band": df["age_band"].astype(object),
+        "education": df["General Educaion Level"].astype(object),
+        "status": df["status_group"].astype(object),
+        "nic_section": df["NIC Section"].astype(object),
+        "nco_division": df["NCO Division"],
+    }, index=df.index)
+
+
+def build_cube(data_root=DATA_ROOT, sources=SOURCES):
+    """Reduces the person files to cube cells (one row per observed dimension combination)."""
+    columns = ["State/Ut Code", "Sector", "Gender", "age_band", "General Educaion Level", "status_group",
+               "NIC Section", "NCO Division"] + list(MEASURES.values()) + WEIGHT_COLS
+    columns = list(dict.fromkeys(columns))
+    fixes_back = {v: k for k, v in COLUMN_FIXES.items()}
+
+    parts = []
+    for sector, name in sources.items():
+        wanted = [fixes_back.get(c, c) if name == "perrv" else c for c in columns]
+        df = load_cleaned(name, wanted, data_root, sectors=[sector]).rename(columns=COLUMN_FIXES)
+        w = final_weight(df)
+
+        cells = person_dimensions(df)
+        cells["n"] = 1
+        cells["w"] = w
+        for measure, col in MEASURES.items():
+            x = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(x)
+            x = np.where(present, x, 0.0)
+            cells[f"{measure}_w"] = np.where(present, w, 0.0)
+            cells[f"{measure}_wx"] = np.where(present, w * x, 0.0)
+            cells[f"{measure}_wxx"] = np.where(present, w * x * x, 0.0)
+        parts.append(cells.groupby(DIMENSIONS, dropna=False, sort=False).sum().reset_index())
+
+    cube = pd.concat(parts, ignore_index=True)
+    return cube.groupby(DIMENSIONS, dropna=False, sort=False).sum().reset_index()
+
+
+def save_cube(cube, data_root=DATA_ROOT):
+    path = cube_path(data_root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_parquet([cube], path)
+    return path
+
+
+class Cube:
+    """
+    Answers weighted slice queries from cube cells. Filters are dimension=value
+    or dimension=[values]; dimensions left out are summed over, e.g.
+
+        cube.mean("regular_wage", state="Gujarat", sector="rural", gender="male", status="regular_wage")
+    """
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.n_cells = len(cells)
+        self.codes, self.categories = {}, {}
+        for dim in DIMENSIONS:
+            codes, uniques = pd.factorize(cells[dim].astype(object), use_na_sentinel=False)
+            self.codes[dim] = codes.astype(np.int32)
+            self.categories[dim] = {v: i for i, v in enumerate(uniques)}
+        self.values = {c: cells[c].to_numpy(dtype=np.float64) for c in cells.columns if c not in DIMENSIONS}
+        self._masks = {}
+
+    @classmethod
+    def load(cls, data_root=DATA_ROOT):
+        import pyarrow.parquet as pq
+
+        return cls(pq.read_table(cube_path(data_root)).to_pandas())
+
+    def dimension_values(self, dim):
+        return list(self.categories[dim])
+
+    def mask(self, **filters):
+        mask = np.ones(self.n_cells, dtype=bool)
+        for dim, value in filters.items():
+            if dim not in self.codes:
+                raise KeyError(f"unknown cube dimension: {dim!r} (dimensions: {DIMENSIONS})")
+            values = tuple(value) if isinstance(value, (list, tuple, set)) else (value,)
+            key = (dim, values)
+            if key not in self._masks:
+                ids = [self.categories[dim][v] for v in values if v in self.categories[dim]]
+                self._masks[key] = np.isin(self.codes[dim], ids)
+            mask &= self._masks[key]
+        return mask
+
+    def total(self, column="w", **filters):
+        """Sum of a cell column over the slice (default: weighted population)."""
+        return float(self.values[column][self.mask(**filters)].sum())
+
+    def sample_size(self, **filters):
+        return int(self.total("n", **filters))
+
+    def mean(self, measure, **filters):
+        m = self.mask(**filters)
+        w = self.values[f"{measure}_w"][m].sum()
+        return float(self.values[f"{measure}_wx"][m].sum() / w) if w > 0 else float("nan")
+
+    def std(self, measure, **filters):
+        m = self.mask(**filters)
+        w = self.values[f"{measure}_w"][m].sum()
+        if w <= 0:
+            return float("nan")
+        mean = self.values[f"{measure}_wx"][m].sum() / w
+        return float(np.sqrt(max(self.values[f"{measure}_wxx"][m].sum() / w - mean * mean, 0.0)))
+
+    def share(self, within=None, **filters):
+        """Weighted share of the slice `filters` inside the slice `within` (dict of filters)."""
+        within = within or {}
+        denominator = self.total(**within)
+        return self.total(**{**within, **filters}) / denominator if denominator > 0 else float("nan")
+
+    def breakdown(self, dim, column="w", **filters):
+        """{value of dim: total of column} over the slice."""
+        m = self.mask(**filters)
+        sums = np.bincount(self.codes[dim][m], weights=self.values[column][m], minlength=len(self.categories[dim]))
+        return {v: float(sums[i]) for v, i in self.categories[dim].items() if sums[i]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the weighted PLFS person cube")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    args = parser.parse_args()
+
+    cube = build_cube(args.data_root)
+    path = save_cube(cube, args.data_root)
+    print(f"✅ Person cube: {len(cube):,} cells over {len(DIMENSIONS)} dimensions → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+# Column-level decoding for the PLFS files (the rules of <dataset>/decode_json.py).
+#
+# Which column goes through which codebook is worked out once from the column
+# names (build_plan). decode_frame then applies each lookup to a whole column:
+# the lookup runs once per distinct value (or per distinct (state, district) /
+# (sector, household type) pair) and is broadcast back with the category codes,
+# so the per-row cost is a numpy take.
+
+QUARTER_MAP = {"Q1": "Quarter 1", "Q2": "Quarter 2", "Q3": "Quarter 3", "Q4": "Quarter 4"}
+VISIT_MAP = {"V1": "Visit 1", "V2": "Visit 2", "V3": "Visit 3", "V4": "Visit 4"}
+
+HOUSEHOLD_TYPE = {
+    "rural": {
+        "1": "self-employed in agriculture",
+        "2": "self-employed in non-agriculture",
+        "3": "regular wage/salary earning",
+        "4": "casual labour in agriculture",
+        "5": "casual labour in non-agriculture",
+        "9": "others"
+    },
+    "urban": {
+        "1": "self-employed",
+        "2": "regular wage/salary earning",
+        "3": "casual labour",
+        "9": "others"
+    }
+}
+
+# Rollup columns derived at ingest from the raw activity / occupation codes:
+# the code's leading digits as integers (NIC-2008 division and group, NCO-2015
+# division, sub-division and group) and the NIC section letter, so aggregation
+# picks a level by column instead of re-parsing codes. Numeric codes are
+# zero-padded to the code width first (the .sav drops leading zeros: 01111 -> 1111).
+CODE_ROLLUPS = {
+    "nic": {"width": 5, "levels": {"NIC Division": 2, "NIC Group": 3}},
+    "nco": {"width": 3, "levels": {"NCO Division": 1, "NCO Sub-division": 2, "NCO Group": 3}},
+}
+NIC_SECTION = "NIC Section"
+ROLLUP_COLUMNS = {col: table for table, rollup in CODE_ROLLUPS.items() for col in rollup["levels"]}
+ROLLUP_COLUMNS[NIC_SECTION] = "nic"
+
+# NIC-2008 sections by 2-digit division
+NIC_SECTIONS = [
+    ("A", 1, 3), ("B", 5, 9), ("C", 10, 33), ("D", 35, 35), ("E", 36, 39), ("F", 41, 43),
+    ("G", 45, 47), ("H", 49, 53), ("I", 55, 56), ("J", 58, 63), ("K", 64, 66), ("L", 68, 68),
+    ("M", 69, 75), ("N", 77, 82), ("O", 84, 84), ("P", 85, 85), ("Q", 86, 88), ("R", 90, 93),
+    ("S", 94, 96), ("T", 97, 98), ("U", 99, 99),
+]
+
+
+def code_str(value, width=2):
+    """Formats a raw code the way the decode scripts expect (e.g. 7 / 7.0 / '7' -> '07')."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).zfill(width)
+
+
+def as_value(v):
+    """Category values come back as numpy scalars / NaN; the lookups expect python values."""
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def code_digits(value, width):
+    """A raw code as its digit string ('01111'), or None; numeric codes are zero-padded to `width`."""
+    if isinstance(value, str):
+        value = value.strip()
+        return value if value.isdigit() else None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return str(value).zfill(width)
+    return None
+
+
+def code_rollups(series, table):
+    """
+    The rollup columns of one raw code column, {column: Series}: each level's
+    leading digits as integer-valued floats (NaN where the code is missing or
+    shorter than the level), plus the section letter for NIC. Each distinct
+    code is parsed once.
+    """
+    rollup = CODE_ROLLUPS[table]
+    cat = pd.Categorical(series)
+    digits = [code_digits(as_value(c), rollup["width"]) for c in cat.categories]
+    out = {}
+    for col, n in rollup["levels"].items():
+        values = np.full(len(digits) + 1, np.nan)  # code -1 (missing) picks the last slot
+        values[:-1] = [int(d[:n]) if d and len(d) >= n else np.nan for d in digits]
+        out[col] = pd.Series(values[cat.codes], index=series.index)
+    if table == "nic":
+        out[NIC_SECTION] = nic_sections(out["NIC Division"])
+    return out
+
+
+def nic_sections(divisions):
+    """NIC-2008 section letter of each 2-digit division (None where there is none)."""
+    lookup = np.full(100, None, dtype=object)
+    for section, lo, hi in NIC_SECTIONS:
+        lookup[lo:hi + 1] = section
+    d = np.asarray(divisions, dtype=np.float64)
+    ok = np.isfinite(d) & (d >= 0) & (d < len(lookup))
+    out = np.full(len(d), None, dtype=object)
+    out[ok] = lookup[d[ok].astype(np.int64)]
+    return pd.Series(out, index=getattr(divisions, "index", None), dtype=object)
+
+
+def code_keys(series, digits):
+    """Integer code prefixes as the codebook's zero-padded keys ('01', '111'); None where missing."""
+    return map_values(series, lambda v: None if v is None else str(int(v)).zfill(digits))
+
+
+def map_values(series, func):
+    """func(value) evaluated once per distinct value, broadcast over the column."""
+    cat = pd.Categorical(series)
+    values = np.empty(len(cat.categories) + 1, dtype=object)
+    values[:-1] = [func(as_value(c)) for c in cat.categories]
+    values[-1] = func(None)  # code -1 (missing) picks the last slot
+    return pd.Series(values[cat.codes], index=series.index, dtype=object)
+
+
+def map_pairs(first, second, func):
+    """func(a, b) evaluated once per distinct (a, b) pair, broadcast over the rows."""
+    ca, cb = pd.Categorical(first), pd.Categorical(second)
+    width = len(cb.categories) + 1
+    keys = (ca.codes.astype(np.int64) + 1) * width + (cb.codes.astype(np.int64) + 1)
+    uniq, inverse = np.unique(keys, return_inverse=True)
+
+    a_vals = np.append(np.asarray(ca.categories, dtype=object), None)
+    b_vals = np.append(np.asarray(cb.categories, dtype=object), None)
+    values = np.empty(len(uniq), dtype=object)
+    values[:] = [func(as_value(a_vals[k // width - 1]), as_value(b_vals[k % width - 1])) for k in uniq]
+    return pd.Series(values[inverse.ravel()], index=first.index, dtype=object)
+
+
+def build_plan(columns, spec):
+    """
+    Resolves, once per file, how each (renamed) column is decoded.
+    Returns a list of (op, column) in the original column order.
+    """
+    person = spec["level"] == "person"
+    plan = []
+    for k in columns:
+        if k == "District Code":
+            op = "district"
+        elif k == "NSS-Region":
+            op = "nss"
+        elif k == "Household Type" and not person:
+            op = "household_type"
+        elif person and (("Industry Code (NIC) for activity" in k) or ("Industry Code (CWS)" in k)):
+            op = "nic"
+        elif person and "Occupation Code (CWS)" in k:
+            op = "nco"
+        elif k == "Quarter":
+            op = "quarter"
+        elif k == "Visit":
+            op = "visit"
+        elif k == "FSU":
+            op = "fsu"
+        elif k == "File Identification":
+            op = "file_identification"
+        else:
+            op = "keep"
+        plan.append((op, k))
+    return plan
+
+
+def input_columns(output_keys, spec):
+    """Renamed input columns that decode_frame needs to produce `output_keys`."""
+    needed = []
+    for k in output_keys:
+        if k == "District Name":
+            needed += ["District Code", "State/Ut Code"]
+        elif k == spec["fsu_key"]:
+            needed.append("FSU")
+        elif k in ROLLUP_COLUMNS:
+            needed.append(spec["code_columns"][ROLLUP_COLUMNS[k]])
+        elif k == "Household Type" and spec["level"] != "person":
+            needed += ["Household Type", "Sector"]
+        else:
+            needed.append(k)
+    return list(dict.fromkeys(needed))
+
+
+def decode_frame(df, plan, spec, mappings):
+    """Applies a build_plan() plan to a renamed chunk and returns the decoded chunk."""
+    out = {}
+    for op, k in plan:
+        col = df[k]
+        if op == "district":
+            district = mappings["district"]
+            unknown = spec["unknown_district"]
+
+            def lookup(state, code):
+                name = district.get((state or "").upper(), {}).get(code_str(code))
+                return name if name else unknown
+            out["District Name"] = map_pairs(df["State/Ut Code"], col, lookup)
+
+        elif op == "nss":
+            nss = mappings["nss"]
+            # unknown codes -> missing rather than {}, so the region can be grouped on (regional.py)
+            out[k] = map_values(col, lambda v: nss.get(code_str(v)))
+
+        elif op == "household_type":
+            out[k] = map_pairs(df["Sector"], col,
+                               lambda sector, v: HOUSEHOLD_TYPE.get(sector or "", {}).get(code_str(v, 1), "others"))
+
+        elif op == "nic":
+            nic, digits = mappings["nic"], spec["nic_digits"]
+            out[k] = map_values(col, lambda v: nic.get(code_str(str(v)[:digits] if digits else v), None))
+
+        elif op == "nco":
+            nco = mappings["nco"]
+            out[k] = map_values(col, lambda v: nco.get(code_str(v), None))
+
+        elif op == "quarter":
+            out[k] = map_values(col, lambda v: QUARTER_MAP.get(v, v))
+
+        elif op == "visit":
+            out[k] = map_values(col, lambda v: VISIT_MAP.get(v, v))
+
+        elif op == "fsu":
+            out[spec["fsu_key"]] = col
+
+        elif op == "file_identification":
+            out[k] = pd.Series(spec["file_identification"], index=df.index, dtype=object)
+
+        elif pd.api.types.is_numeric_dtype(col):
+            out[k] = col
+        else:
+            out[k] = col.astype(object).where(col != "", None)
+
+    # raw NIC / NCO codes -> integer rollup columns, before any label decoding
+    for table, source in spec.get("code_columns", {}).items():
+        if source in df.columns:
+            out.update(code_rollups(df[source], table))
+
+    return pd.DataFrame(out, index=df.index)
@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from cube import AGE_BANDS, STATUS_CODES, STATUS_GROUPS
+from decoders import map_values
+from store import (DATA_ROOT, cleaned_path, cleaned_source, label_frame, load_value_labels, read_source,
+                   source_signature)
+
+# Derived person columns, computed once per cleaned dataset and cached next to it.
+#
+# status_group (cube.STATUS_GROUPS), age_band (cube.AGE_BANDS) and
+# vocational_training (yes / no) feed every aggregation, so instead of being
+# rebuilt from the label strings on each run they are stored as int8 category
+# codes in the row order of the copy they were computed from:
+#
+#   <name>/<name>_cleaned.derived/<source>/meta.json     categories, source signature, definitions hash
+#   <name>/<name>_cleaned.derived/<source>/<column>.npy  codes (-1 = missing)
+#
+# <source> is the copy store.load_cleaned reads (column_store, parquet,
+# partitioned or json), since their row orders can differ. load_cleaned hands
+# the columns out like any other: ask for "status_group" and get a categorical
+# aligned to the returned rows. A cache is rebuilt when its source files change
+# or when the definitions below do.
+
+DERIVED_VERSION = 1
+CODE_DTYPE = np.int8
+
+# answers counted as having received vocational / technical training
+VOCATIONAL_YES = ("received", "yes")
+
+
+def status_group(value):
+    """Group of an activity status label or code (cube.STATUS_GROUPS / STATUS_CODES), "unknown" for neither."""
+    if value in STATUS_GROUPS:
+        return STATUS_GROUPS[value]
+    try:
+        return STATUS_CODES.get(int(float(value)), "unknown")
+    except (TypeError, ValueError):
+        return "unknown"
+
+
+def status_groups(df, column="Status Code"):
+    return map_values(df[column], status_group)
+
+
+def age_bands(df):
+    # numeric first: a chunk whose ages are all missing arrives as object / None
+    edges, labels = AGE_BANDS
+    return pd.cut(pd.to_numeric(df["Age"], errors="coerce"), edges, right=False, labels=labels)
+
+
+def vocational_training(df):
+    # all "yes" responses -> "yes", others -> "no" (once per distinct answer)
+    voc = df["Whether received any Vocational/Technical Training"]
+    return map_values(voc, lambda x: "yes" if any(w in str(x).lower() for w in VOCATIONAL_YES) else "no").where(
+        voc.notna())
+
+
+# column -> (source columns, function(df) -> values, categories)
+DERIVED_COLUMNS = {
+    "status_group": (["Status Code"], status_groups, list(dict.fromkeys(STATUS_GROUPS.values())) + ["unknown"]),
+    "age_band": (["Age"], age_bands, list(AGE_BANDS[1])),
+    "vocational_training": (["Whether received any Vocational/Technical Training"], vocational_training,
+                            ["yes", "no"]),
+}
+
+
+def cached_columns(columns):
+    """`columns` with every derived column's sources swapped for the derived column (for load_cleaned)."""
+    out = []
+    for col in columns:
+        derived = [name for name, (sources, _, _) in DERIVED_COLUMNS.items() if col in sources]
+        out += derived or [col]
+    return list(dict.fromkeys(out))
+
+
+def definitions_hash():
+    """Changes whenever a derived column would come out differently."""
+    spec = {
+        "version": DERIVED_VERSION,
+        "status_groups": STATUS_GROUPS,
+        "status_codes": STATUS_CODES,
+        "age_bands": [[str(e) for e in AGE_BANDS[0]], list(AGE_BANDS[1])],
+        "vocational_yes": list(VOCATIONAL_YES),
+        "categories": {col: categories for col, (_, _, categories) in DERIVED_COLUMNS.items()},
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def derived_dir(name, source, data_root=DATA_ROOT):
+    return os.path.join(os.path.dirname(cleaned_path(name, data_root)), f"{name}_cleaned.derived", source)
+
+
+def load_meta(folder):
+    path = os.path.join(folder, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_derived(name, columns, source, data_root=DATA_ROOT):
+    """
+    Makes sure `columns` are cached for one source copy, dropping a stale
+    cache first; only the missing columns are computed. Returns (folder, meta).
+    """
+    folder = derived_dir(name, source, data_root)
+    meta = load_meta(folder)
+    expected = {"version": DERIVED_VERSION, "definitions": definitions_hash(),
+                "source": source_signature(name, source, data_root)}
+    if meta is None or any(meta.get(k) != v for k, v in expected.items()):
+        shutil.rmtree(folder, ignore_errors=True)
+        meta = {**expected, "n_rows": None, "columns": {}}
+    os.makedirs(folder, exist_ok=True)
+
+    missing = [c for c in columns if c not in meta["columns"]]
+    if missing:
+        sources = list(dict.fromkeys(s for c in missing for s in DERIVED_COLUMNS[c][0]))
+        df = label_frame(read_source(name, source, sources, data_root), load_value_labels(name, data_root))
+        for col in missing:
+            _, func, categories = DERIVED_COLUMNS[col]
+            values = pd.Categorical(func(df), categories=categories)
+            np.save(os.path.join(folder, f"{col}.npy"), values.codes.astype(CODE_DTYPE))
+            meta["columns"][col] = categories
+        meta["n_rows"] = len(df)
+        with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    return folder, meta
+
+
+def load_derived(name, columns, source=None, rows=None, data_root=DATA_ROOT):
+    """
+    {column: Categorical} for the derived `columns` of a dataset, in the row
+    order of `source` (default: the copy load_cleaned reads), cut down to the
+    row positions `rows` when given. Builds or refreshes the cache first.
+    """
+    source = source or cleaned_source(name, data_root)
+    folder, meta = build_derived(name, columns, source, data_root)
+    out = {}
+    for col in columns:
+        codes = np.load(os.path.join(folder, f"{col}.npy"), mmap_mode="r")
+        codes = np.asarray(codes if rows is None else codes[rows])
+        out[col] = pd.Categorical.from_codes(codes, meta["columns"][col])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the cached derived person columns")
+    parser.add_argument("datasets", nargs="*", default=["perv1", "perrv"])
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    args = parser.parse_args()
+    for name in args.datasets:
+        source = cleaned_source(name, args.data_root)
+        folder, meta = build_derived(name, list(DERIVED_COLUMNS), source, args.data_root)
+        print(f"✅ {name}: {', '.join(meta['columns'])} for {meta['n_rows']:,} rows ({source}) → {folder}")
+
+
+if __name__ == "__main__":
+    main()
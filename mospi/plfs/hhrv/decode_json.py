@@ -1,5 +1,9 @@
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
 
 filename = "hhrv_labeled_renamed.json"
 data_folder = "C:/Users/nishn/OneDrive/Desktop/BTP/Data BTP/Data/mospi/plfs/hhrv"
@@ -9,8 +13,8 @@ initial_file_path = os.path.join(data_folder, filename)
 destination_path = os.path.join(data_folder, final_filename)
 
 
-with open(initial_file_path, "r", encoding="utf-8") as infile:
-    raw_data = json.load(infile)
+# --- JSON codec (json_codec.py): streaming reads with native floats, compact writes ---
+codec = get_codec()
 
 household_type = {
     "rural": {
@@ -37,9 +41,7 @@ with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\nss_reg
     nss_mappings = json.load(f)
 
 
-decoded_data = []
-
-for row in raw_data:
+def decode_row(row):
     decoded_row = {}
     state_name = row.get("State/Ut Code", "").upper()
     for k, v in row.items():
@@ -79,11 +81,12 @@ for row in raw_data:
             decoded_row[k] = "Revisit Household 7"
         else:
             decoded_row[k] = v
-    decoded_data.append(decoded_row)
-    # break
+    return decoded_row
+
 
-# Write the cleaned file
-with open(destination_path, "w", encoding="utf-8") as outfile:
-    json.dump(decoded_data, outfile, indent=4, ensure_ascii=False)
+# Stream, decode and write the cleaned file, one record at a time
+with open(initial_file_path, "r", encoding="utf-8") as infile, \
+     open(destination_path, "w", encoding="utf-8") as outfile:
+    count = codec.dump_array((decode_row(row) for row in codec.iter_items(infile)), outfile)
 
-print(f"✅ Succesfully reformatted {len(raw_data)} rows from {filename} to {len(decoded_data)} rows and saved in {final_filename}")
+print(f"✅ Succesfully reformatted {count} rows from {filename} and saved in {final_filename}")
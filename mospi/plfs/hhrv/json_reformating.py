@@ -1,24 +1,24 @@
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
 
 # Load mapping
 with open("column_labels_from_web.json", "r", encoding="utf-8") as f:
     column_mapping = json.load(f)
 
-# Load original labeled data
-with open("hhrv_labeled.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Apply renaming, streamed (json_codec.py: native floats, one compact record per line)
+codec = get_codec()
+
+
+def rename(row):
+    return {column_mapping.get(key, key): value for key, value in row.items()}  # Use mapped name if available
 
-# Apply renaming
-renamed_data = []
-for row in data:
-    renamed_row = {}
-    for key, value in row.items():
-        new_key = column_mapping.get(key, key)  # Use mapped name if available
-        renamed_row[new_key] = value
-    renamed_data.append(renamed_row)
 
-# Save renamed output
-with open("hhrv_labeled_renamed.json", "w", encoding="utf-8") as f:
-    json.dump(renamed_data, f, indent=2, ensure_ascii=False)
+with open("hhrv_labeled.json", "r", encoding="utf-8") as fin, \
+     open("hhrv_labeled_renamed.json", "w", encoding="utf-8") as fout:
+    count = codec.dump_array((rename(row) for row in codec.iter_items(fin)), fout)
 
-print(f"✅ Saved renamed JSON with {len(renamed_data)} rows to hhrv_labeled_renamed.json")
+print(f"✅ Saved renamed JSON with {count} rows to hhrv_labeled_renamed.json")
@@ -1,5 +1,8 @@
-import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
 
 # === User input ===
 input_file = r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\hhv1\hhv1_labeled_final.json"  
@@ -9,6 +12,7 @@ output_file = r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\hhv
 required_keys = {
     "State/Ut Code",
     "District Name",
+    "NSS-Region",
     "Household Size",
     "Household Type",
     "Religion",
@@ -17,28 +21,25 @@ required_keys = {
     "Survey Code",
     "Response Code",
     "Household'S Usual Consumer Expenditure In A Month (Rs.)",
+    "First Stage Unit(FSU):",
+    "Hamlet Group/Sub-Block No.",
+    "Second Stage Stratum No.",
+    "Sample Household Number",
+    "Quarter",
+    "Visit",
+    "Sub-sample",
     "Sub-sample wise Multiplier",
     "Ns count for sector x stratum x substratum x sub-sample",
     "Ns count for sector x stratum x substratum",
     "Count of contributing State x Sector x Stratum x SubStratum in 4 Quarters"
 }
 
-# Read JSON file
-with open(input_file, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# Ensure the file is a list of dicts
-if isinstance(data, dict):
-    data = [data]
-
-# Filter each record to only keep required keys
-filtered_data = [
-    {key: record[key] for key in required_keys if key in record}
-    for record in data
-]
+# === Stream processing (json_codec.py: native floats, one compact record per line) ===
+codec = get_codec()
 
-# Write filtered data to new JSON
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(filtered_data, f, indent=4, ensure_ascii=False)
+with open(input_file, "r", encoding="utf-8") as fin, open(output_file, "w", encoding="utf-8") as fout:
+    # Filter each record to only keep required keys
+    codec.dump_array(({key: record[key] for key in required_keys if key in record}
+                      for record in codec.iter_items(fin)), fout)
 
 print(f"✅ Filtered file saved as: {output_file}")
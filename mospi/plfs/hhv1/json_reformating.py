@@ -1,7 +1,12 @@
 import json
 import os
+import sys
+
 import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
+
 # Paths
 filename = "hhv1_labeled.json"
 data_folder = "C:/Users/nishn/OneDrive/Desktop/BTP/Data BTP/Data/mospi/plfs/hhv1"
@@ -15,22 +20,15 @@ destination_path = os.path.join(data_folder, reformatted_filename)
 with open(col_names_path, "r", encoding="utf-8") as f:
     column_mapping = json.load(f)
 
-# Load original labeled JSON
-with open(initial_file_path, "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Rename the keys of each record, streamed (json_codec.py: native floats, one compact record per line)
+codec = get_codec()
 
-renamed_data = []
-for row in data:
-    renamed_row = {}
 
-    for key, value in row.items():
-        new_key = column_mapping.get(key, key)  
-        renamed_row[new_key] = value
-    renamed_data.append(renamed_row)
+def rename(row):
+    return {column_mapping.get(key, key): value for key, value in row.items()}
 
 
-# Save output
-with open(destination_path, "w", encoding="utf-8") as f:
-    json.dump(renamed_data, f, indent=2, ensure_ascii=False)
+with open(initial_file_path, "r", encoding="utf-8") as fin, open(destination_path, "w", encoding="utf-8") as fout:
+    count = codec.dump_array((rename(row) for row in codec.iter_items(fin)), fout)
 
-print(f"✅ Succesfully reformatted {len(data)} rows from {filename} to {len(renamed_data)} rows and saved in {reformatted_filename}")
+print(f"✅ Succesfully reformatted {count} rows from {filename} and saved in {reformatted_filename}")
@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+from store import DATA_ROOT, cleaned_source, source_signature
+from metrics import HOUSEHOLD_COLUMNS, HOUSEHOLD_SOURCES, PERSON_COLUMNS, PERSON_SOURCES
+from streaming import CHUNK_SIZE, SKETCH_CAPACITY, source_chunks, statewise_aggregator, statewise_results
+
+# Incremental statewise aggregation, one survey period at a time.
+#
+# The streamed state of streaming.py is kept per (Quarter, Visit) under
+#
+#   <data_root>/aggregates/<name>/<Quarter>__<Visit>.json
+#
+# and the statewise output is the merge of every stored period. `add` is the
+# fast path: when a new quarter lands as its own file, only its rows are read.
+#
+#   python incremental.py add perv1 new_quarter/perv1_cleaned.json
+#   python incremental.py update            # the cleaned files, when they changed
+#   python incremental.py report            # merge the stored periods -> statewise JSON
+#
+# Each period's state records the signature (size / mtime) of the file it was
+# read from and a digest of its rows. `update` reads a dataset's cleaned file
+# only when no stored period carries its current signature -- it is new or
+# changed since. It then hashes the file's rows per period and re-aggregates
+# only the periods whose digest changed; unchanged ones just take the new
+# signature, and periods no longer in the file are dropped. A period found
+# again in new rows is replaced, not added to, so re-delivered quarters do not
+# count twice. STATE_VERSION changes whenever the statewise metrics
+# (metrics.py) or the stored fields change; older state is then ignored and
+# rebuilt by `update`.
+
+AGGREGATES_DIR = "aggregates"
+STATE_VERSION = 5
+PERIOD_KEYS = ["Quarter", "Visit"]
+
+SOURCES = {
+    **{name: ("household", sector) for sector, name in HOUSEHOLD_SOURCES.items()},
+    **{name: ("person", sector) for sector, name in PERSON_SOURCES.items()},
+}
+
+
+def aggregates_dir(name, data_root=DATA_ROOT):
+    return os.path.join(data_root, AGGREGATES_DIR, name)
+
+
+def period_key(quarter, visit):
+    return f"{quarter}__{visit}"
+
+
+def partial_path(name, period, data_root=DATA_ROOT):
+    return os.path.join(aggregates_dir(name, data_root), re.sub(r"[^\w.-]+", "_", period) + ".json")
+
+
+def new_aggregator(name, capacity=SKETCH_CAPACITY):
+    level, _ = SOURCES[name]
+    return statewise_aggregator(level, capacity)
+
+
+def source_of(name, path=None, data_root=DATA_ROOT):
+    """What a period's rows are read from: the dataset's cleaned copy (path None) or a file, with its signature."""
+    if path is None:
+        copy = cleaned_source(name, data_root)  # the copy streaming.iter_chunks reads
+        return {"copy": copy, "files": source_signature(name, copy, data_root)}
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "files": {os.path.basename(path): [st.st_size, st.st_mtime_ns]}}
+
+
+def stored_states(name, data_root=DATA_ROOT):
+    """{period: (path, source, digest)} of the partial states on disk for a dataset (current STATE_VERSION only)."""
+    folder = aggregates_dir(name, data_root)
+    if not os.path.isdir(folder):
+        return {}
+    periods = {}
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith(".json"):
+            continue
+        path = os.path.join(folder, file)
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") == STATE_VERSION:
+            periods[meta["period"]] = path, meta["source"], meta["digest"]
+    return periods
+
+
+def stored_periods(name, data_root=DATA_ROOT):
+    """{period: path} of the partial states on disk for a dataset (current STATE_VERSION only)."""
+    return {period: path for period, (path, *_) in stored_states(name, data_root).items()}
+
+
+def period_rows(name, chunks):
+    """(period, rows) for each period's rows in each of `chunks`."""
+    for chunk in chunks:
+        missing = [k for k in PERIOD_KEYS if k not in chunk]
+        if missing:
+            raise KeyError(f"{name}: no {', '.join(missing)} column; re-run ingest.py, which now keeps them")
+        groups = chunk.groupby([chunk[k].astype(str) for k in PERIOD_KEYS], sort=False).indices
+        for values, index in groups.items():
+            yield period_key(*values), chunk.iloc[index]
+
+
+def hash_rows(digests, period, rows):
+    if period not in digests:
+        digests[period] = hashlib.sha1()
+    digests[period].update(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+
+
+def period_digests(name, chunks):
+    """{period: digest of its rows, in file order} over `chunks`."""
+    digests = {}
+    for period, rows in period_rows(name, chunks):
+        hash_rows(digests, period, rows)
+    return {period: h.hexdigest() for period, h in digests.items()}
+
+
+def aggregate_periods(name, chunks, skip=(), capacity=SKETCH_CAPACITY):
+    """
+    ({period: aggregator}, {period: digest of its rows}) over the rows of
+    `chunks`, leaving out periods in `skip`.
+    """
+    aggs, digests = {}, {}
+    for period, rows in period_rows(name, chunks):
+        if period in skip:
+            continue
+        if period not in aggs:
+            aggs[period] = new_aggregator(name, capacity)
+        aggs[period].update(rows)
+        hash_rows(digests, period, rows)
+    return aggs, {period: h.hexdigest() for period, h in digests.items()}
+
+
+def save_partial(name, period, agg, rows, source, digest, data_root=DATA_ROOT):
+    path = partial_path(name, period, data_root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    level, sector = SOURCES[name]
+    state = {"version": STATE_VERSION, "dataset": name, "level": level, "sector": sector, "period": period,
+             "rows": rows, "source": source, "digest": digest, "groups": agg.state_dict()}
+    write_state(path, state)
+    return path
+
+
+def write_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)  # stdlib: keeps NaN / Infinity moments
+    os.replace(tmp, path)
+
+
+def restamp(path, source):
+    """Records a new source signature on a stored state whose rows did not change."""
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state["source"] = source
+    write_state(path, state)
+
+
+def load_partial(path, capacity=SKETCH_CAPACITY):
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return new_aggregator(state["dataset"], capacity).load_state(state["groups"])
+
+
+def dataset_chunks(name, data_root=DATA_ROOT, chunk_size=CHUNK_SIZE, path=None):
+    level, sector = SOURCES[name]
+    columns = (HOUSEHOLD_COLUMNS if level == "household" else PERSON_COLUMNS) + PERIOD_KEYS
+    return source_chunks(name, columns, sector, data_root, chunk_size, path=path)
+
+
+def add(name, path=None, data_root=DATA_ROOT, skip=(), chunk_size=CHUNK_SIZE, capacity=SKETCH_CAPACITY,
+        source=None):
+    """
+    Aggregates the rows of a cleaned file (the dataset's own when path is None)
+    per period and stores each period's state with the file's signature,
+    replacing any stored one. Returns {period: rows aggregated}.
+    """
+    source = source or source_of(name, path, data_root)  # before reading: a file changed meanwhile is read again
+    aggs, digests = aggregate_periods(name, dataset_chunks(name, data_root, chunk_size, path), skip, capacity)
+    rows = {}
+    for period, agg in aggs.items():
+        rows[period] = sum(s.n for s in agg.groups.values())
+        save_partial(name, period, agg, rows[period], source, digests[period], data_root)
+    return rows
+
+
+def update(names=None, data_root=DATA_ROOT, rebuild=False, chunk_size=CHUNK_SIZE, capacity=SKETCH_CAPACITY):
+    """
+    Refreshes the stored periods of each cleaned dataset whose file is new or
+    changed since they were stored: periods gone from the file are dropped,
+    periods whose rows changed are aggregated again, the rest only take the
+    file's new signature. With rebuild every period is aggregated again;
+    unchanged datasets are not read. Returns {name: {period: rows aggregated}}.
+    """
+    added = {}
+    for name in names or SOURCES:
+        stored = stored_states(name, data_root)
+        source = source_of(name, None, data_root)
+        if rebuild:
+            for path, *_ in stored.values():
+                os.remove(path)
+            stored = {}
+        elif source in [s for _, s, _ in stored.values()]:
+            added[name] = {}
+            continue
+        # periods stored from an older version of the copy (not those added from their own file)
+        from_copy = {period: (path, digest) for period, (path, s, digest) in stored.items() if "copy" in s}
+        unchanged = set()
+        if from_copy:
+            digests = period_digests(name, dataset_chunks(name, data_root, chunk_size))
+            for period, (path, digest) in from_copy.items():
+                if period not in digests:
+                    os.remove(path)
+                elif digests[period] == digest:
+                    restamp(path, source)
+                    unchanged.add(period)
+            if unchanged == set(digests):
+                added[name] = {}
+                continue
+        added[name] = add(name, None, data_root, unchanged, chunk_size, capacity, source)
+    return added
+
+
+def merged(name, data_root=DATA_ROOT, capacity=SKETCH_CAPACITY):
+    """One aggregator holding every stored period of a dataset."""
+    agg = new_aggregator(name, capacity)
+    for path in stored_periods(name, data_root).values():
+        agg.merge(load_partial(path, capacity))
+    return agg
+
+
+def report(data_root=DATA_ROOT, capacity=SKETCH_CAPACITY):
+    """statewise_v3.py's final_state_data from the stored periods."""
+    return statewise_results({SOURCES[name]: merged(name, data_root, capacity) for name in SOURCES}, data_root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-quarter / per-visit statewise aggregates, merged on demand")
+    parser.add_argument("command", choices=["update", "add", "report"])
+    parser.add_argument("args", nargs="*", help="update: dataset names (default: all); add: NAME PATH")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--rebuild", action="store_true", help="update: drop stored periods and aggregate again")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sketch-capacity", type=int, default=SKETCH_CAPACITY)
+    parser.add_argument("--output", default="statewise_plfs_weighted.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "add":
+        if len(args.args) != 2 or args.args[0] not in SOURCES:
+            parser.error(f"add takes NAME PATH, NAME one of {', '.join(SOURCES)}")
+        added = {args.args[0]: add(args.args[0], args.args[1], args.data_root, (), args.chunk_size,
+                                   args.sketch_capacity)}
+    elif args.command == "update":
+        unknown = set(args.args) - set(SOURCES)
+        if unknown:
+            parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+        added = update(args.args, args.data_root, args.rebuild, args.chunk_size, args.sketch_capacity)
+    else:
+        added = {}
+    for name, periods in added.items():
+        for period, rows in periods.items():
+            print(f"{name}: {period} ({rows:,} rows)")
+
+    with open(args.output, "w") as f:
+        json.dump(report(args.data_root, args.sketch_capacity), f, indent=2)
+    print(f"✅ Statewise aggregates from stored periods → {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from cube import AGE_BANDS, EMPLOYED
+from derived import status_groups
+from store import DATA_ROOT, load_cleaned
+from weighted import WEIGHT_COLS, final_weight, group_ids
+
+# Labour-force indicators from the person files:
+#
+#   LFPR = (employed + unemployed) / persons with a known status
+#   WPR  = employed / persons with a known status
+#   UR   = unemployed / (employed + unemployed)
+#
+# "usual" reads the first-visit file (perv1, usual status); "cws" reads the
+# revisit file (perrv, current weekly status of the activity on the 7th day).
+# Statuses are grouped by label or activity code (derived.status_group); the
+# weight of persons whose status is neither is reported as unknown_status
+# instead of counting as out of the labour force. Any combination of state,
+# sector, gender and age band is one grouped pass over the rows.
+
+SOURCES = {"usual": "perv1", "cws": "perrv"}
+
+DIMENSION_COLUMNS = {"state": "State/Ut Code", "sector": "Sector", "gender": "Gender", "age_band": "age_band"}
+
+# status group and age band come from the derived-column cache (derived.py)
+PERSON_COLUMNS = ["State/Ut Code", "Sector", "Gender", "Age", "status_group", "age_band"] + WEIGHT_COLS
+
+
+def load_persons(status="usual", data_root=DATA_ROOT, states=None, sectors=None, age_bands=AGE_BANDS):
+    """Person rows with final_weight, status group and age band columns added."""
+    df = load_cleaned(SOURCES[status], PERSON_COLUMNS, data_root, states=states, sectors=sectors)
+    return prepare(df, age_bands)
+
+
+def prepare(df, age_bands=AGE_BANDS):
+    """Adds final_weight, and status group / age band unless already loaded (the cached ones use AGE_BANDS)."""
+    edges, labels = age_bands
+    return df.assign(
+        final_weight=final_weight(df),
+        status_group=df["status_group"] if "status_group" in df else status_groups(df),
+        age_band=df["age_band"] if "age_band" in df and age_bands == AGE_BANDS
+        else pd.cut(pd.to_numeric(df["Age"], errors="coerce"), edges, right=False, labels=labels),
+    )
+
+
+def labour_indicators(df, by=("state",), age=None):
+    """
+    LFPR, WPR and UR for every group of `by` (names from DIMENSION_COLUMNS, e.g.
+    ("state", "sector", "gender")), over persons aged age=(lo, hi) inclusive
+    (either end may be None). Returns one row per group with the weighted
+    persons, labour force, employed, unemployed and persons of unknown status
+    (left out of the LFPR / WPR denominators), the three rates (in %) and the
+    sample size.
+    """
+    if age is not None:
+        lo, hi = age
+        a = df["Age"]
+        df = df[(a >= lo if lo is not None else a.notna()) & (a <= hi if hi is not None else a.notna())]
+    by = list(by)
+    columns = [DIMENSION_COLUMNS.get(d, d) for d in by]
+    ids, keys = group_ids(df, columns if len(columns) > 1 else columns[0])
+    sel = ids >= 0
+    ids = ids[sel]
+    w = np.asarray(df["final_weight"], dtype=np.float64)[sel]
+    status = df["status_group"].to_numpy(dtype=object)[sel]
+    employed = np.isin(status, EMPLOYED)
+    unemployed = status == "unemployed"
+    unknown = status == "unknown"
+
+    n = len(keys)
+    persons = np.bincount(ids, weights=w, minlength=n)
+    emp = np.bincount(ids, weights=np.where(employed, w, 0.0), minlength=n)
+    unemp = np.bincount(ids, weights=np.where(unemployed, w, 0.0), minlength=n)
+    unknown_status = np.bincount(ids, weights=np.where(unknown, w, 0.0), minlength=n)
+    labour_force = emp + unemp
+    known = persons - unknown_status
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = pd.DataFrame({
+            "persons": persons,
+            "labour_force": labour_force,
+            "employed": emp,
+            "unemployed": unemp,
+            "unknown_status": unknown_status,
+            "lfpr": 100 * labour_force / known,
+            "wpr": 100 * emp / known,
+            "ur": 100 * unemp / labour_force,
+            "n": np.bincount(ids, minlength=n),
+        })
+    index = pd.MultiIndex.from_tuples(keys, names=list(by)) if len(by) > 1 else pd.Index(keys, name=by[0])
+    return out.set_axis(index).sort_index()
+
+
+def indicators(status="usual", by=("state",), age=None, data_root=DATA_ROOT, states=None, sectors=None):
+    """labour_indicators() straight from a person file (see SOURCES)."""
+    return labour_indicators(load_persons(status, data_root, states, sectors), by, age)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LFPR / WPR / UR by state, sector, gender and age band")
+    parser.add_argument("--status", choices=list(SOURCES), default="usual")
+    parser.add_argument("--by", nargs="+", default=["state"], help=f"any of {', '.join(DIMENSION_COLUMNS)}")
+    parser.add_argument("--age", nargs=2, type=int, metavar=("LO", "HI"), help="e.g. 15 29 for youth")
+    parser.add_argument("--min-age", type=int, help="persons of this age and above, e.g. 15")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--output", help="write the table as JSON records instead of printing it")
+    args = parser.parse_args()
+    unknown = set(args.by) - set(DIMENSION_COLUMNS)
+    if unknown:
+        parser.error(f"unknown dimension(s): {', '.join(sorted(unknown))}")
+
+    age = tuple(args.age) if args.age else ((args.min_age, None) if args.min_age is not None else None)
+    table = indicators(args.status, args.by, age, args.data_root)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(table.reset_index().to_dict("records"), f, ensure_ascii=False, indent=2)
+        print(f"✅ {len(table):,} groups → {args.output}")
+    else:
+        print(table.round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import argparse
+import json
+import math
+import os
+
+import pyreadstat
+
+from codebook import open_codebook
+from decoders import ROLLUP_COLUMNS, build_plan, decode_frame, input_columns
+from json_codec import get_codec
+from partitions import write_partitioned
+from store import (DATA_ROOT, FORMATS, apply_value_labels, cleaned_path, save_value_labels,
+                   value_labels_path, write_parquet)
+
+# Single-pass PLFS ingestion: .sav -> renamed -> decoded -> cleaned.
+# Replaces running sav_to_json_v1.py, json_reformating.py, decode_json.py and
+# cleaning_jsons.py one after another; only the cleaned file is written.
+#
+# With lazy labels (--lazy-labels) the .sav is read without apply_value_formats:
+# value-labelled columns keep their numeric codes and the label tables go to
+# <name>_cleaned.labels.json, resolved later by store.load_cleaned.
+
+CHUNK_SIZE = 50000
+
+# Decoders look these up by label (district by state name, household type by
+# sector), so they are labelled for decoding even when labels are lazy.
+DECODER_LABEL_KEYS = ["State/Ut Code", "Sector"]
+
+# Survey period of each record, for per-quarter / per-visit aggregates (incremental.py)
+PERIOD_KEYS = ["Quarter", "Visit"]
+
+# Sub-sample (1 or 2) and the weight inputs; the sub-sample identifies the
+# half-sample a record belongs to for sampling errors (variance.py)
+WEIGHT_KEYS = [
+    "Sub-sample",
+    "Sub-sample wise Multiplier",
+    "Ns count for sector x stratum x substratum x sub-sample",
+    "Ns count for sector x stratum x substratum",
+    "Count of contributing State x Sector x Stratum x SubStratum in 4 Quarters",
+]
+
+# Household of each record within its first-stage unit (the FSU itself goes out
+# under the dataset's fsu_key): household numbers restart in every hamlet group /
+# sub-block and second-stage stratum, so all three are needed. With the FSU and
+# the period they link persons to their household (linkage.py)
+HOUSEHOLD_ID_KEYS = ["Hamlet Group/Sub-Block No.", "Second Stage Stratum No.", "Sample Household Number"]
+
+# Person within the household, the same on the first visit and the revisits;
+# with the household keys it pairs perv1 and perrv records (transitions.py)
+PERSON_ID_KEYS = ["Person Serial No."]
+
+# Current weekly status: the same activity-status question on the first visit
+# and the revisits, so a person's statuses compare across visits (transitions.py)
+WEEKLY_STATUS_KEYS = ["Current Weekly Status (CWS)"]
+
+# NIC / NCO rollup columns (decoders.CODE_ROLLUPS), from the raw code columns
+# named by a person file's "code_columns"
+ROLLUP_KEYS = list(ROLLUP_COLUMNS)
+
+# === Per-file settings (mirrors the four scripts in each dataset folder) ===
+DATASETS = {
+    "hhv1": {
+        "level": "household",
+        "column_labels": "column_labels_hhv1.json",
+        "file_identification": "First Visit Household 7",
+        "fsu_key": "First Stage Unit(FSU):",
+        "unknown_district": "UNKNOWN_DISTRICT",
+        "required_keys": [
+            "State/Ut Code",
+            "District Name",
+            "NSS-Region",
+            "Household Size",
+            "Household Type",
+            "Religion",
+            "Sector",
+            "Social Group",
+            "Survey Code",
+            "Response Code",
+            "Household'S Usual Consumer Expenditure In A Month (Rs.)",
+            "First Stage Unit(FSU):",
+        ] + HOUSEHOLD_ID_KEYS + PERIOD_KEYS + WEIGHT_KEYS,
+        "rename_map": {},
+    },
+    "hhrv": {
+        "level": "household",
+        "column_labels": "column_labels_from_web.json",
+        "file_identification": "Revisit Household 7",
+        "fsu_key": "First Stage Unit(FSU):",
+        "unknown_district": "UNKNOWN_DISTRICT",
+        "required_keys": [
+            "State/Ut Code",
+            "District Name",
+            "NSS-Region",
+            "Sector",
+            "Household Size",
+            "Household Type",
+            "Religion",
+            "Social Group",
+            "Household'S Usual Consumer Expenditure In A Month(Rs.)",
+            "Survey Code",
+            "Response Code",
+            "First Stage Unit(FSU):",
+        ] + HOUSEHOLD_ID_KEYS + PERIOD_KEYS + WEIGHT_KEYS,
+        "rename_map": {},
+    },
+    "perv1": {
+        "level": "person",
+        "column_labels": "column_labels_from_web.json",
+        "file_identification": "First Visit Person level 7",
+        "fsu_key": "First Stage Unit (FSU)",
+        "unknown_district": "UNKNOWN_DISTRICT",
+        "nic_digits": None,
+        "code_columns": {"nic": "Industry Code (NIC)", "nco": "Occupation Code (NCO)"},
+        "required_keys": [
+            "State/Ut Code",
+            "District Name",
+            "NSS-Region",
+            "Gender",
+            "Age",
+            "Sector",
+            "Marital Status",
+            "General Educaion Level",
+            "Technical Educaion Level",
+            "No. of years in Formal Education",
+            "Whether received any Vocational/Technical Training",
+            "Status Code",
+            "Industry Code (NIC)",
+            "Occupation Code (NCO)",
+            "Earnings For Regular Salaried/Wage Activity",
+            "Earnings For Self Employed",
+            "First Stage Unit (FSU)",
+        ] + HOUSEHOLD_ID_KEYS + PERSON_ID_KEYS + WEEKLY_STATUS_KEYS + ROLLUP_KEYS + PERIOD_KEYS + WEIGHT_KEYS,
+        "rename_map": {},
+    },
+    "perrv": {
+        "level": "person",
+        "column_labels": "column_labels_from_web.json",
+        "file_identification": "Revisit Person level 7",
+        "fsu_key": "First Stage Unit (FSU)",
+        "unknown_district": None,
+        "nic_digits": 2,
+        "code_columns": {"nic": "Industry Code (NIC) for activity 1 on 7 th day", "nco": "Occupation Code (CWS)"},
+        "required_keys": [
+            "State/Ut Code",
+            "District Name",
+            "NSS-Region",
+            "Gender",
+            "Age",
+            "Sector",
+            "Occupation Code (CWS)",
+            "Marital Status",
+            "General Educaion Level",
+            "Technical Educaion Level",
+            "No. of years in Formal Education",
+            "Whether received any Vocational/Technical Training",
+            "Status of Current Attendance in Educational Institution",
+            "Status Code for activity 1 on 7 th day",
+            "Industry Code (NIC) for activity 1 on 7 th day",
+            "wage earning for activity 1 on 7 th day",
+            "total hours actually worked on 7th day",
+            "Earnings For Regular Salarid/Wage Activity",
+            "Earnings For Self Employed",
+            "First Stage Unit (FSU)",
+        ] + HOUSEHOLD_ID_KEYS + PERSON_ID_KEYS + WEEKLY_STATUS_KEYS + ROLLUP_KEYS + PERIOD_KEYS + WEIGHT_KEYS,
+        "rename_map": {
+            "Status Code for activity 1 on 7 th day": "Status Code",
+            "Industry Code (NIC) for activity 1 on 7 th day": "Industry Code (NIC)",
+            "wage earning for activity 1 on 7 th day": "wage earning for the activity",
+            "total hours actually worked on 7th day": "total hours actually worked on a day",
+            "Occupation Code (CWS)": "Occupation Code (NCO)"
+        },
+    },
+}
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_mappings(data_root=DATA_ROOT):
+    """
+    District / NSS / NIC / NCO lookups from the compiled codebook (codebook.py),
+    recompiled first if any mapping JSON changed. The tables answer .get() like
+    the dicts decode_json.py loads, so decoders.py uses either.
+    """
+    return open_codebook(data_root)
+
+
+def chunk_records(df):
+    """Turns a chunk into plain-python records (NaN -> None)."""
+    df = df.astype(object)
+    for record in df.to_dict("records"):
+        yield {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in record.items()}
+
+
+def output_columns(spec, required_keys=None):
+    return [spec["rename_map"].get(k, k) for k in (required_keys or spec["required_keys"])]
+
+
+def source_columns(sav_path, spec, column_mapping, required_keys):
+    """.sav variables that survive into the cleaned output (after renaming/decoding)."""
+    labels = set(input_columns(required_keys, spec))
+    _, meta = pyreadstat.read_sav(sav_path, metadataonly=True)
+    return [c for c in meta.column_names if column_mapping.get(c, c) in labels]
+
+
+def label_tables(meta, column_mapping):
+    """The .sav's value-label tables, keyed by (renamed) column: {column: {code: label}}."""
+    return {column_mapping.get(var, var): table for var, table in meta.variable_value_labels.items()}
+
+
+def output_label_tables(sav_path, spec, column_mapping, required_keys=None):
+    """Value-label tables of the cleaned output columns (what goes to <name>_cleaned.labels.json)."""
+    _, meta = pyreadstat.read_sav(sav_path, metadataonly=True)
+    keep = set(output_columns(spec, required_keys))
+    tables = {}
+    for col, table in label_tables(meta, column_mapping).items():
+        col = spec["rename_map"].get(col, col)
+        if col in keep:
+            tables[col] = table
+    return tables
+
+
+def iter_cleaned(sav_path, spec, column_mapping, mappings, chunksize=CHUNK_SIZE,
+                 required_keys=None, pushdown=True, labels=True):
+    """
+    Streams the cleaned data out of a .sav file, one DataFrame per chunk.
+    With `pushdown`, only the variables needed for `required_keys` (default:
+    the dataset's cleaning keys) are read from the .sav and decoded. With
+    labels=False, value-labelled columns keep their codes.
+    """
+    required_keys = list(required_keys or spec["required_keys"])
+    usecols = source_columns(sav_path, spec, column_mapping, required_keys) if pushdown else None
+    required_keys = set(required_keys)
+    plan = tables = None
+
+    reader = pyreadstat.read_file_in_chunks(
+        pyreadstat.read_sav, sav_path, chunksize=chunksize, apply_value_formats=labels, usecols=usecols
+    )
+    for df, meta in reader:
+        df = df.rename(columns=lambda c: column_mapping.get(c, c))
+        if plan is None:
+            plan = build_plan(df.columns, spec)
+            tables = {} if labels else label_tables(meta, column_mapping)
+        keys = [k for k in DECODER_LABEL_KEYS if k in tables and k in df.columns]
+        if keys:
+            labelled = df.assign(**{k: apply_value_labels(df[k], tables[k]) for k in keys})
+            decoded = decode_frame(labelled, plan, spec, mappings)
+            for k in keys:
+                if k in decoded.columns:
+                    decoded[k] = df[k]
+        else:
+            decoded = decode_frame(df, plan, spec, mappings)
+        decoded = decoded[[k for k in decoded.columns if k in required_keys]]
+        yield decoded.rename(columns=spec["rename_map"])
+
+
+def write_json_array(chunks, output_path, codec=None):
+    """Writes chunks as a JSON array, one compact record per line (json_codec.py)."""
+    codec = codec or get_codec()
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as fout:
+        fout.write("[\n")
+        for df in chunks:
+            for record in chunk_records(df):
+                if count:
+                    fout.write(",\n")
+                fout.write(codec.dumps(record))
+                count += 1
+            print(f"Processed {count:,} rows...")
+        fout.write("\n]")
+    return count
+
+
+def ingest(name, data_root=DATA_ROOT, chunksize=CHUNK_SIZE, mappings=None, fmt="json",
+           required_keys=None, pushdown=True, labels=True):
+    spec = DATASETS[name]
+    folder = os.path.join(data_root, name)
+    sav_path = os.path.join(folder, f"{name}.sav")
+    output_path = cleaned_path(name, data_root, fmt)
+
+    column_mapping = load_json(os.path.join(folder, spec["column_labels"]))
+    if mappings is None:
+        mappings = load_mappings(data_root)
+
+    labels_path = value_labels_path(name, data_root)
+    if labels:
+        if os.path.exists(labels_path):
+            os.remove(labels_path)  # left over from a lazy-label run
+    else:
+        save_value_labels(name, output_label_tables(sav_path, spec, column_mapping, required_keys), data_root)
+
+    chunks = iter_cleaned(sav_path, spec, column_mapping, mappings, chunksize, required_keys, pushdown, labels)
+    if fmt == "parquet":
+        columns = output_columns(spec, required_keys)
+        count = write_parquet((df.reindex(columns=columns) for df in chunks), output_path)
+    elif fmt == "partitioned":
+        count = write_partitioned(chunks, output_path)
+    else:
+        count = write_json_array(chunks, output_path)
+    print(f"✅ {name}: {count:,} rows from {os.path.basename(sav_path)} → {output_path}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-pass PLFS .sav → cleaned data ingestion")
+    parser.add_argument("datasets", nargs="*", help="any of hhv1, hhrv, perv1, perrv (default: all)")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=list(FORMATS), default="json",
+                        help="parquet writes typed, dictionary-encoded columns for store.load_cleaned; "
+                             "partitioned writes one byte range per (state, sector) with a manifest")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="read every .sav variable instead of only those behind the required keys")
+    parser.add_argument("--lazy-labels", action="store_true",
+                        help="keep value-labelled columns as codes; labels go to <name>_cleaned.labels.json")
+    args = parser.parse_args()
+    unknown = set(args.datasets) - set(DATASETS)
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+
+    mappings = load_mappings(args.data_root)
+    for name in args.datasets or list(DATASETS):
+        ingest(name, args.data_root, args.chunksize, mappings, args.format,
+               pushdown=not args.all_columns, labels=not args.lazy_labels)
+
+
+if __name__ == "__main__":
+    main()
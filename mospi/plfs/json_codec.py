@@ -0,0 +1,114 @@
+import io
+import json
+import os
+
+# One JSON layer for every PLFS stage, so the parser / serializer can be swapped
+# in one place (PLFS_JSON_CODEC=<name> or get_codec(<name>)).
+#
+#   stdlib  json.load / json.dumps (whole-file reads)
+#   stream  ijson streaming reads with native floats (C yajl2 backend when
+#           ijson has it, no Decimal -> float pass), json.dumps writes
+#   fast    ijson streaming reads + orjson writes (needs `pip install orjson`)
+#
+# Writers produce compact output, one array item per line.
+
+ENV_VAR = "PLFS_JSON_CODEC"
+
+
+def _default(obj):
+    # Decimal, numpy scalars, Timestamps: anything the encoders do not know
+    if hasattr(obj, "item"):
+        return obj.item()
+    try:
+        return float(obj)
+    except (TypeError, ValueError):
+        return str(obj)
+
+
+class StdlibCodec:
+    name = "stdlib"
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def load(self, fin):
+        return json.load(fin)
+
+    def iter_items(self, fin):
+        """Items of a top-level JSON array (whole file parsed first)."""
+        data = json.load(fin)
+        return iter(data if isinstance(data, list) else [data])
+
+    def dumps(self, obj):
+        return json.dumps(obj, ensure_ascii=False, default=_default)
+
+    def dump_array(self, items, fout):
+        """Writes items as a JSON array, one item per line; returns the item count."""
+        count = 0
+        fout.write("[\n")
+        for item in items:
+            if count:
+                fout.write(",\n")
+            fout.write(self.dumps(item))
+            count += 1
+        fout.write("\n]")
+        return count
+
+
+class StreamCodec(StdlibCodec):
+    name = "stream"
+
+    def iter_items(self, fin):
+        import ijson
+
+        if isinstance(fin, io.TextIOBase):
+            if not hasattr(fin, "buffer"):  # io.StringIO: text with no bytes underneath
+                return super().iter_items(fin)
+            fin = fin.buffer  # ijson's C backend reads bytes
+        return ijson.items(fin, "item", use_float=True)
+
+
+class FastCodec(StreamCodec):
+    name = "fast"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def loads(self, text):
+        return self._orjson.loads(text)
+
+    def load(self, fin):
+        return self._orjson.loads(fin.read())
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj, default=_default, option=self._options).decode("utf-8")
+
+
+CODECS = {"stdlib": StdlibCodec, "stream": StreamCodec, "fast": FastCodec}
+
+
+def available_codecs():
+    names = []
+    for name, cls in CODECS.items():
+        try:
+            cls()
+            if name != "stdlib":
+                import ijson  # noqa: F401
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_codec(name=None):
+    """Codec by name, else $PLFS_JSON_CODEC, else the fastest one installed."""
+    name = name or os.environ.get(ENV_VAR)
+    if name:
+        return CODECS[name]()
+    for candidate in ("fast", "stream"):
+        if candidate in available_codecs():
+            return CODECS[candidate]()
+    return StdlibCodec()
@@ -0,0 +1,267 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from cube import EMPLOYED
+from metrics import EXPENDITURE, RENAMES, Metric, MetricSet, compile_plan, dataset_columns, valid_households
+from store import DATA_ROOT, load_cleaned
+from weighted import WEIGHT_COLS
+
+# Person <-> household record linkage.
+#
+# A person belongs to the household with the same composite key
+#
+#   FSU, Hamlet Group/Sub-Block No., Second Stage Stratum No.,
+#   Sample Household Number, Quarter, Visit
+#
+# (first visit: perv1 -> hhv1, revisit: perrv -> hhrv; ingest.py keeps the key
+# columns). Each key part is factorized over both files together and the codes
+# are packed into one int64 per record (mixed radix). The households are sorted
+# once by that key and every person finds its household with a binary search,
+# so the join is a few numpy passes over integer arrays: no Python object per
+# row and no pandas merge. Household columns are then gathered onto the persons
+# by row position, and person counts scattered onto the households with a
+# bincount, which is what per-capita expenditure and household labour stats need:
+#
+#   python linkage.py --visit first --output linked_statewise.json
+
+VISITS = {"first": ("hhv1", "perv1"), "revisit": ("hhrv", "perrv")}
+FSU_COLUMNS = {"household": "First Stage Unit(FSU):", "person": "First Stage Unit (FSU)"}
+HOUSEHOLD_ID_KEYS = ["Hamlet Group/Sub-Block No.", "Second Stage Stratum No.",
+                     "Sample Household Number"]  # ingest.HOUSEHOLD_ID_KEYS
+PERIOD_KEYS = ["Quarter", "Visit"]
+KEY_BITS = 62
+NO_HOUSEHOLD = -1
+
+HOUSEHOLD_COLUMNS = [
+    "State/Ut Code", "Sector", "Survey Code", "Response Code", "Household Size", "Religion", "Social Group",
+    EXPENDITURE,
+] + WEIGHT_COLS
+PERSON_COLUMNS = ["State/Ut Code", "Sector", "Age", "status_group"] + WEIGHT_COLS
+# household columns carried onto each linked person
+LINKED_COLUMNS = ["Household Size", "Religion", "Social Group", EXPENDITURE]
+
+
+def key_columns(level):
+    return [FSU_COLUMNS[level]] + HOUSEHOLD_ID_KEYS + PERIOD_KEYS
+
+
+def _values(series):
+    if pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return series.astype(object).to_numpy()
+
+
+def part_codes(left, right):
+    """Codes of two key columns over their common values (-1 = missing), and the number of values."""
+    if isinstance(left.dtype, pd.CategoricalDtype) and isinstance(right.dtype, pd.CategoricalDtype):
+        # recode the categories only, then look the row codes up
+        split = len(left.cat.categories)
+        common, uniques = pd.factorize(left.cat.categories.append(right.cat.categories))
+        codes = [np.where(s.cat.codes.to_numpy() >= 0, lookup[s.cat.codes.to_numpy()], -1)
+                 for s, lookup in ((left, common[:split]), (right, common[split:]))]
+        return codes[0], codes[1], len(uniques)
+    a, b = _values(left), _values(right)
+    if a.dtype != b.dtype:
+        a, b = a.astype(object), b.astype(object)
+    codes, uniques = pd.factorize(np.concatenate([a, b]))
+    return codes[:len(a)], codes[len(a):], len(uniques)
+
+
+def composite_keys(left, right, left_columns, right_columns):
+    """
+    One int64 per row of each frame for a composite key, -1 where any part is
+    missing. Parts are combined in mixed radix; when the next part would
+    overflow KEY_BITS, the keys so far are first recoded densely.
+    """
+    keys = [np.zeros(len(left), np.int64), np.zeros(len(right), np.int64)]
+    missing = [np.zeros(len(left), bool), np.zeros(len(right), bool)]
+    radix = 1
+    for lcol, rcol in zip(left_columns, right_columns):
+        *codes, n = part_codes(left[lcol], right[rcol])
+        n = max(n, 1)
+        if radix * n >= 1 << KEY_BITS:
+            dense, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+            keys, radix = [inverse[:len(left)].astype(np.int64), inverse[len(left):].astype(np.int64)], len(dense)
+        for i, part in enumerate(codes):
+            keys[i] = keys[i] * n + np.maximum(part, 0)
+            missing[i] |= part < 0
+        radix *= n
+    return tuple(np.where(m, -1, k) for k, m in zip(keys, missing))
+
+
+def join_index(keys, lookup):
+    """
+    For each of `keys`, the position of the same key in `lookup` (-1 when absent
+    or missing): one argsort of `lookup` and one binary search. Raises
+    ValueError when `lookup` holds a key twice.
+    """
+    order = np.argsort(lookup, kind="stable")
+    ordered = lookup[order]
+    duplicated = (ordered[1:] == ordered[:-1]) & (ordered[1:] >= 0)
+    if duplicated.any():
+        raise ValueError(f"{int(duplicated.sum()):,} household key(s) occur more than once; the key "
+                         f"({', '.join(key_columns('household'))}) does not identify a household -- "
+                         f"add the missing part to HOUSEHOLD_ID_KEYS")
+    if not len(ordered):
+        return np.full(len(keys), NO_HOUSEHOLD, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ordered, keys), len(ordered) - 1)
+    found = (ordered[pos] == keys) & (keys >= 0)
+    return np.where(found, order[pos], NO_HOUSEHOLD)
+
+
+def link(persons, households):
+    """Row position in `households` of each person's household (NO_HOUSEHOLD when it has none)."""
+    person_keys, household_keys = composite_keys(persons, households, key_columns("person"),
+                                                 key_columns("household"))
+    return join_index(person_keys, household_keys)
+
+
+def take(series, index):
+    """series[index] by position, missing wherever index is NO_HOUSEHOLD."""
+    linked = index >= 0
+    rows = np.where(linked, index, 0)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        codes = codes[rows] if len(codes) else np.zeros(len(index), codes.dtype)
+        return pd.Categorical.from_codes(np.where(linked, codes, -1), series.cat.categories)
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(linked, values[rows], np.nan) if len(values) else np.full(len(index), np.nan)
+    values = series.to_numpy(dtype=object)
+    out = values[rows] if len(values) else np.empty(len(index), dtype=object)
+    out[~linked] = None
+    return out
+
+
+def household_counts(index, n_households, flags):
+    """{name: per-household count of linked persons with the flag} for flags {name: bool mask}, plus "members"."""
+    linked = index >= 0
+    rows = index[linked]
+    counts = {"members": np.bincount(rows, minlength=n_households)}
+    for name, flag in flags.items():
+        counts[name] = np.bincount(rows, weights=np.asarray(flag, dtype=np.float64)[linked], minlength=n_households)
+    return counts
+
+
+def load_linked(visit="first", data_root=DATA_ROOT, states=None, sectors=None):
+    """
+    (persons, households) of one visit, valid households only (metrics.valid_households),
+    persons with a "household_row" column: their household's row in `households` or NO_HOUSEHOLD.
+    """
+    household_name, person_name = VISITS[visit]
+    frames = []
+    for name, columns in ((household_name, HOUSEHOLD_COLUMNS + key_columns("household")),
+                          (person_name, PERSON_COLUMNS + key_columns("person"))):
+        frames.append(load_cleaned(name, dataset_columns(name, columns), data_root, states=states,
+                                   sectors=sectors).rename(columns=RENAMES.get(name, {})))
+    households, persons = frames
+    households = households[valid_households(households)].reset_index(drop=True)
+    persons["household_row"] = link(persons, households)
+    return persons, households
+
+
+def linked_persons(persons, households, columns=LINKED_COLUMNS):
+    """`persons` with their household's `columns` (missing for persons without one)."""
+    return persons.assign(**{col: take(households[col], persons["household_row"].to_numpy()) for col in columns})
+
+
+def linked_households(households, persons):
+    """`households` with counts of their linked members: members, workers, unemployed, labour_force."""
+    status = persons["status_group"]
+    flags = {
+        "workers": status.isin(EMPLOYED),
+        "unemployed": status == "unemployed",
+        "labour_force": status.isin(EMPLOYED + ["unemployed"]),
+    }
+    return households.assign(**household_counts(persons["household_row"].to_numpy(), len(households), flags))
+
+
+PER_CAPITA = "per_capita_expenditure"
+
+
+def per_capita_expenditure(df):
+    """Monthly household expenditure over household size (missing where the size is not positive)."""
+    size = pd.to_numeric(df["Household Size"], errors="coerce")
+    return pd.to_numeric(df[EXPENDITURE], errors="coerce") / size.where(size > 0)
+
+
+# person-weighted: the expenditure a person's household spends per member
+LINKED_PERSON_METRICS = MetricSet(
+    [
+        Metric("linked_population", "total", filter="linked"),
+        Metric("linked_share", "share", filter="linked", empty=0.0),
+        Metric("avg_per_capita_expenditure", "mean", PER_CAPITA),
+        Metric("median_per_capita_expenditure", "quantile", PER_CAPITA, q=0.5),
+        Metric("per_capita_expenditure_distribution", "describe", PER_CAPITA),
+        Metric("avg_per_capita_expenditure_employed", "mean", PER_CAPITA, filter="employed"),
+        Metric("avg_per_capita_expenditure_unemployed", "mean", PER_CAPITA, filter="unemployed"),
+    ],
+    derived={PER_CAPITA: per_capita_expenditure},
+    filters={
+        "linked": lambda df: df["household_row"] >= 0,
+        "employed": lambda df: df["status_group"].isin(EMPLOYED),
+        "unemployed": lambda df: df["status_group"] == "unemployed",
+    },
+)
+
+# household-weighted, over households with at least one linked member
+HOUSEHOLD_LABOUR_METRICS = MetricSet(
+    [
+        Metric("households", "total"),
+        Metric("avg_members", "mean", "members"),
+        Metric("avg_workers", "mean", "workers"),
+        Metric("avg_labour_force", "mean", "labour_force"),
+        Metric("no_worker_share", "share", filter="no_worker", empty=0.0),
+        Metric("unemployed_member_share", "share", filter="has_unemployed", empty=0.0),
+        Metric("avg_per_capita_expenditure", "mean", PER_CAPITA),
+        Metric("avg_per_capita_expenditure_no_worker", "mean", PER_CAPITA, filter="no_worker"),
+    ],
+    derived={PER_CAPITA: per_capita_expenditure},
+    filters={
+        "has_members": lambda df: df["members"] > 0,
+        "no_worker": lambda df: df["workers"] == 0,
+        "has_unemployed": lambda df: df["unemployed"] > 0,
+    },
+    where="has_members",
+)
+
+linked_person_plan = compile_plan(LINKED_PERSON_METRICS)
+household_labour_plan = compile_plan(HOUSEHOLD_LABOUR_METRICS)
+
+
+def linked_state_data(persons, households):
+    """{state: {sector: {"persons": {...}, "households": {...}}}} from load_linked's frames."""
+    persons = linked_persons(persons, households)
+    households = linked_households(households, persons)
+    out = {}
+    for sector in pd.unique(pd.concat([households["Sector"], persons["Sector"]], ignore_index=True).dropna()):
+        for part, plan, df in (("persons", linked_person_plan, persons),
+                               ("households", household_labour_plan, households)):
+            for state, values in plan.run(df[df["Sector"] == sector]).items():
+                out.setdefault(state, {}).setdefault(sector, {})[part] = values
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-capita expenditure and household labour stats "
+                                                 "from person records linked to their household")
+    parser.add_argument("--visit", choices=list(VISITS), default="first")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--output", default="linked_statewise.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    persons, households = load_linked(args.visit, args.data_root)
+    linked = int((persons["household_row"] >= 0).sum())
+    with open(args.output, "w") as f:
+        json.dump(linked_state_data(persons, households), f, indent=2)
+    print(f"✅ {linked:,} of {len(persons):,} persons linked to {len(households):,} households "
+          f"→ {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
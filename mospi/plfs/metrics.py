@@ -0,0 +1,392 @@
+import numpy as np
+import pandas as pd
+
+from codebook import code_labels
+from cube import EMPLOYED
+from decoders import CODE_ROLLUPS, code_keys
+from derived import age_bands, status_groups, vocational_training
+from weighted import (WEIGHT_COLS, final_weight, group_ids, grouped_sums, weighted_describe,
+                      weighted_distributions, weighted_quantiles)
+
+# Declarative per-group metrics.
+#
+# A MetricSet names, for one kind of record, the grouping, the derived columns
+# and row filters, and the metrics to publish:
+#
+#   Metric(name, kind, column, filter=..., within=..., weight=..., <output options>)
+#
+#   total         sum of weights (of `column` values, when given)
+#   mean          weighted mean of `column`
+#   share         weight of rows passing `filter` over weight of rows passing `within`
+#   distribution  top_n category shares of `column` (+ "other"); codes="nic"/"nco" re-keys code keys by label
+#   describe      count / mean / std / min / percentiles / max of `column`
+#   quantile      weighted q-quantile of `column`
+#   group         {part name: value} of the nested `parts`
+#
+# compile_plan() turns a MetricSet into one Plan for a DataFrame: derived columns
+# and filters (and each AND of filters) are evaluated once, every total / mean /
+# share is a column of one grouped bincount, and distributions and quantiles
+# share one group index, with a quantile taken from a describe of the same
+# column and filter when there is one. streaming.MetricAggregator maps the same
+# MetricSet onto a StreamAggregator, so every statewise build publishes the
+# same metrics. Adding a metric adds a column to an existing pass, not a scan.
+# `by` may also be several columns (regional.py: state and district / NSS
+# region); run(..., min_sample=) then flags the groups with few records.
+
+WEIGHT = "final_weight"
+PERCENTILES = (.1, .25, .5, .75, .9)
+KINDS = ("total", "mean", "share", "distribution", "describe", "quantile", "group")
+
+def filter_names(names):
+    """A filter reference (None, a name or several names, ANDed) as a sorted tuple."""
+    if not names:
+        return ()
+    return tuple(sorted({names} if isinstance(names, str) else set(names)))
+
+
+def percentile_label(q):
+    return f"{q * 100:g}%"
+
+
+class Metric:
+    def __init__(self, name, kind, column=None, filter=None, within=None, weight=WEIGHT, empty=np.nan, top_n=5,
+                 roundup_dig=2, percentiles=PERCENTILES, q=0.5, codes=None, parts=()):
+        if kind not in KINDS:
+            raise ValueError(f"unknown metric kind {kind!r} (kinds: {', '.join(KINDS)})")
+        self.name = name
+        self.kind = kind
+        self.column = column
+        self.filter = filter_names(filter)
+        self.within = filter_names(within)
+        self.weight = weight
+        self.empty = empty
+        self.top_n = top_n
+        self.roundup_dig = roundup_dig
+        self.percentiles = tuple(percentiles)
+        self.q = q
+        self.codes = codes
+        self.parts = list(parts)
+
+    @property
+    def values_key(self):
+        """(column, filter, weight): the rows and weights a total / mean / describe / quantile reduces."""
+        return self.column, self.filter, self.weight
+
+
+class MetricSet:
+    """
+    metrics  list of Metric
+    by       grouping column
+    derived  {column: function(df) -> values}, added before anything else (unless already loaded)
+    filters  {name: function(df) -> bool mask}
+    where    filter name(s) every metric is restricted to
+    """
+
+    def __init__(self, metrics, by="State/Ut Code", derived=None, filters=None, where=None):
+        self.metrics = list(metrics)
+        self.by = by
+        self.derived = {WEIGHT: final_weight, **(derived or {})}
+        self.filters = filters or {}
+        self.where = filter_names(where)
+        unknown = {f for m in self.flat() for f in m.filter + m.within} | set(self.where)
+        unknown -= set(self.filters)
+        if unknown:
+            raise KeyError(f"undefined filter(s): {', '.join(sorted(unknown))}")
+
+    def flat(self):
+        """Every metric, nested group parts included."""
+        stack, out = list(self.metrics), []
+        while stack:
+            metric = stack.pop(0)
+            out.append(metric)
+            stack[:0] = metric.parts
+        return out
+
+
+class Plan:
+    """A MetricSet compiled for in-memory frames: the deduplicated reductions behind its metrics."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.sums = {}           # (column, filter, weight) -> slot of the grouped bincount
+        self.distributions = {}  # (column, filter, weight, top_n, roundup_dig) -> None
+        self.describes = {}      # (column, filter, weight) -> percentiles
+        self.quantiles = {}      # (column, filter, weight) -> quantiles not covered by a describe
+        self.samples = {}        # (column, filter, labels) -> slot of the sample-size bincount
+        for metric in spec.flat():
+            if metric.kind != "group":
+                self.samples.setdefault(self.sample_key(metric), len(self.samples))
+            if metric.kind in ("total", "mean"):
+                self.sums.setdefault(metric.values_key, len(self.sums))
+            elif metric.kind == "share":
+                for names in (filter_names(metric.filter + metric.within), metric.within):
+                    self.sums.setdefault((None, names, metric.weight), len(self.sums))
+            elif metric.kind == "distribution":
+                self.distributions[metric.column, metric.filter, metric.weight, metric.top_n, metric.roundup_dig] = None
+            elif metric.kind == "describe":
+                self.describes[metric.values_key] = tuple(sorted(set(self.describes.get(metric.values_key, ()))
+                                                                 | set(metric.percentiles)))
+        for metric in spec.flat():
+            if metric.kind == "quantile" and metric.q not in self.describes.get(metric.values_key, ()):
+                self.quantiles[metric.values_key] = tuple(sorted(set(self.quantiles.get(metric.values_key, ()))
+                                                                 | {metric.q}))
+
+    @staticmethod
+    def sample_key(metric):
+        """(column, filter, labels): the records a metric rests on (a share's: those of its `within`)."""
+        if metric.kind == "share":
+            return None, metric.within, False
+        return metric.column, metric.filter, metric.kind == "distribution"
+
+    def run(self, df, codebook=None, min_sample=None):
+        """
+        {group: {metric name: value}} for every group with rows in df. With
+        min_sample, each group also gets "sample": its records, and whether
+        they, or those behind any metric, number fewer than min_sample.
+        """
+        spec = self.spec
+        # derived columns already loaded (e.g. from the derived.py cache) are used as they are
+        df = df.assign(**{name: func(df) for name, func in spec.derived.items() if name not in df})
+        masks = {}
+
+        def mask(names):
+            if not names:
+                return None
+            if names not in masks:
+                if len(names) == 1:
+                    masks[names] = np.asarray(spec.filters[names[0]](df), dtype=bool)
+                else:
+                    masks[names] = np.logical_and.reduce([mask((n,)) for n in names])
+            return masks[names]
+
+        if spec.where:
+            df = df[mask(spec.where)].reset_index(drop=True)
+            masks.clear()
+        ids, keys = group_ids(df, spec.by)
+        n = len(keys)
+
+        values, weights = {}, {}
+
+        def column(name):
+            if name not in values:
+                values[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            return values[name]
+
+        def weight(name):
+            if name not in weights:
+                weights[name] = np.ones(len(df)) if name is None else np.asarray(df[name], dtype=np.float64)
+            return weights[name]
+
+        # every total / mean / share: weighted sums (S) and present weights (W) in one bincount
+        k = len(self.sums)
+        matrix = np.zeros((len(df), 2 * k))
+        for (col, names, w_name), slot in self.sums.items():
+            x = np.ones(len(df)) if col is None else column(col)
+            present = ~np.isnan(x)
+            if names:
+                present &= mask(names)
+            w = weight(w_name)
+            matrix[:, slot] = np.where(present, w * np.where(present, x, 0.0), 0.0)
+            matrix[:, k + slot] = np.where(present, w, 0.0)
+        sums = grouped_sums(ids, n, matrix)
+
+        def subset(names, w_name):
+            m = mask(names)
+            if m is None:
+                return df, weight(w_name), (ids, keys)
+            return df[m], weight(w_name)[m], (ids[m], keys)
+
+        dists = {}
+        for key in self.distributions:
+            col, names, w_name, top_n, roundup_dig = key
+            sub, w, groups = subset(names, w_name)
+            dists[key] = weighted_distributions(sub, spec.by, col, w, top_n, roundup_dig, groups)
+        describes = {}
+        for (col, names, w_name), percentiles in self.describes.items():
+            sub, w, groups = subset(names, w_name)
+            describes[col, names, w_name] = weighted_describe(sub, spec.by, col, w, percentiles, groups)
+        quantiles = {}
+        for (col, names, w_name), qs in self.quantiles.items():
+            sub, w, groups = subset(names, w_name)
+            quantiles[col, names, w_name] = {key: dict(zip(qs, v)) for key, v in
+                                             weighted_quantiles(sub, spec.by, col, w, qs, groups).items()}
+
+        def value(metric, i, key):
+            if metric.kind == "group":
+                return {part.name: value(part, i, key) for part in metric.parts}
+            if metric.kind in ("total", "mean"):
+                slot = self.sums[metric.values_key]
+                s, w = sums[i, slot], sums[i, k + slot]
+                if metric.kind == "total":
+                    return float(s)
+                return float(s / w) if w > 0 else metric.empty
+            if metric.kind == "share":
+                num = sums[i, k + self.sums[None, filter_names(metric.filter + metric.within), metric.weight]]
+                den = sums[i, k + self.sums[None, metric.within, metric.weight]]
+                return float(num / den) if den > 0 else metric.empty
+            if metric.kind == "distribution":
+                dist = dists[metric.column, metric.filter, metric.weight, metric.top_n, metric.roundup_dig].get(key, {})
+                return code_labels(dist, codebook[metric.codes], metric.roundup_dig) if metric.codes else dist
+            if metric.kind == "describe":
+                stats = describes[metric.values_key].get(key, {})
+                return select_describe(stats, metric.percentiles)
+            # quantile
+            if metric.q in self.describes.get(metric.values_key, ()):
+                return describes[metric.values_key].get(key, {}).get(percentile_label(metric.q), metric.empty)
+            return float(quantiles[metric.values_key].get(key, {}).get(metric.q, metric.empty))
+
+        counts = np.bincount(ids[ids >= 0], minlength=n)
+        out = {key: {m.name: value(m, i, key) for m in spec.metrics} for i, key in enumerate(keys) if counts[i]}
+        if min_sample is None:
+            return out
+
+        # records behind every metric: one more grouped bincount, of presence indicators
+        present = np.zeros((len(df), len(self.samples)))
+        for (col, names, labels), slot in self.samples.items():
+            if col is None:
+                p = np.ones(len(df), dtype=bool)
+            elif labels:
+                p = df[col].notna().to_numpy()
+            else:
+                p = ~np.isnan(column(col))
+            present[:, slot] = p if not names else p & mask(names)
+        samples = grouped_sums(ids, n, present)
+
+        def sample_size(metric, i):
+            if metric.kind == "group":
+                return min((sample_size(part, i) for part in metric.parts), default=counts[i])
+            return samples[i, self.samples[self.sample_key(metric)]]
+
+        for i, key in enumerate(keys):
+            if counts[i]:
+                out[key]["sample"] = {
+                    "records": int(counts[i]),
+                    "small_sample": bool(counts[i] < min_sample),
+                    "small_sample_metrics": [m.name for m in spec.metrics if sample_size(m, i) < min_sample],
+                }
+        return out
+
+
+def select_describe(stats, percentiles):
+    """A describe dict cut down to these percentiles (a shared describe may hold more)."""
+    if not stats:
+        return {}
+    keep = ["count", "mean", "std", "min"] + [percentile_label(q) for q in percentiles] + ["max"]
+    return {k: stats[k] for k in keep if k in stats}
+
+
+def compile_plan(spec):
+    return Plan(spec)
+
+
+# === statewise metrics (statewise_v3.py, streaming.py, parallel.py, incremental.py) ===
+
+EXPENDITURE = "Household'S Usual Consumer Expenditure In A Month (Rs.)"
+REGULAR_WAGE = "Earnings For Regular Salaried/Wage Activity"
+SELF_EMPLOYED = "Earnings For Self Employed"
+
+
+HOUSEHOLD_COLUMNS = [
+    "State/Ut Code", "Sector", "Survey Code", "Response Code", "Household Size", "Household Type",
+    "Religion", "Social Group", EXPENDITURE,
+] + WEIGHT_COLS
+PERSON_COLUMNS = [
+    "State/Ut Code", "Sector", "Gender", "Age", "Marital Status", "General Educaion Level",
+    "Technical Educaion Level", "No. of years in Formal Education",
+    "Whether received any Vocational/Technical Training", "Status Code", "NIC Division", "NCO Group",
+    REGULAR_WAGE, SELF_EMPLOYED,
+] + WEIGHT_COLS
+
+# the revisit files spell two of these columns differently (see */cleaning_jsons.py)
+RENAMES = {
+    "hhrv": {"Household'S Usual Consumer Expenditure In A Month(Rs.)": EXPENDITURE},
+    "perrv": {"Earnings For Regular Salarid/Wage Activity": REGULAR_WAGE},
+}
+
+# each file feeds one sector
+HOUSEHOLD_SOURCES = {"urban": "hhv1", "rural": "hhrv"}
+PERSON_SOURCES = {"urban": "perrv", "rural": "perv1"}
+
+
+def dataset_columns(name, columns):
+    """`columns` as dataset `name` spells them (RENAMES undone), for reading it; rename the frame back after."""
+    back = {v: k for k, v in RENAMES.get(name, {}).items()}
+    return [back.get(c, c) for c in columns]
+
+
+def valid_households(df):
+    return ((df["Survey Code"] == "household surveyed: original")
+            & df["Response Code"].str.contains("co-operative and capable", case=False, na=False))
+
+
+def rollup_keys(column):
+    """Derived column: the code keys of an ingest rollup column (e.g. "NIC Division" -> '01')."""
+    table = next(t for t, rollup in CODE_ROLLUPS.items() if column in rollup["levels"])
+    digits = CODE_ROLLUPS[table]["levels"][column]
+    return lambda df: code_keys(df[column], digits)
+
+
+HOUSEHOLD_METRICS = MetricSet(
+    [
+        Metric("total_households", "total"),
+        Metric("avg_household_size", "mean", "Household Size"),
+        Metric("household_type_distribution", "distribution", "Household Type", top_n=100, roundup_dig=3),
+        Metric("religion_distribution", "distribution", "Religion", top_n=100),
+        Metric("social_group_distribution", "distribution", "Social Group", top_n=100),
+        Metric("avg_monthly_expenditure", "mean", EXPENDITURE),
+        Metric("median_monthly_expenditure", "quantile", EXPENDITURE, q=0.5),
+        Metric("expenditure_distribution", "describe", EXPENDITURE),
+    ],
+    filters={"valid_household": valid_households},
+    where="valid_household",
+)
+
+PERSON_METRICS = MetricSet(
+    [
+        Metric("gender_ratio", "distribution", "Gender"),
+        Metric("age_distribution", "group", parts=[
+            Metric("0-14", "share", filter="age_0_14"),
+            Metric("15-29", "share", filter="age_15_29"),
+            Metric("30-59", "share", filter="age_30_59"),
+            Metric("60+", "share", filter="age_60_plus"),
+        ]),
+        Metric("marital_status_distribution", "distribution", "Marital Status"),
+        Metric("education_distribution", "distribution", "General Educaion Level"),
+        Metric("technical_education_distribution", "distribution", "Technical Educaion Level"),
+        Metric("avg_years_formal_education", "mean", "No. of years in Formal Education"),
+        Metric("vocational_training_percentage", "distribution", "vocational_training"),
+        # rolled up before the top-5 cut: NCO group, NIC division
+        Metric("occupation_distribution", "distribution", "nco_group", codes="nco"),
+        Metric("industry_distribution", "distribution", "nic_division", codes="nic"),
+        Metric("avg_regular_wage_earning", "mean", REGULAR_WAGE),
+        Metric("median_regular_wage_earning", "quantile", REGULAR_WAGE, q=0.5),
+        Metric("regular_wage_distribution", "describe", REGULAR_WAGE),
+        Metric("avg_self_employed_earning", "mean", SELF_EMPLOYED),
+        Metric("median_self_employed_earning", "quantile", SELF_EMPLOYED, q=0.5),
+        Metric("self_employed_earning_distribution", "describe", SELF_EMPLOYED),
+        # over persons with a known status; the weight of the others is published beside them
+        Metric("wpr", "share", filter="employed", within="known_status", empty=0.0),
+        Metric("lfpr", "share", filter="labour_force", within="known_status", empty=0.0),
+        Metric("ur", "share", filter="unemployed", within="labour_force", empty=0.0),
+        Metric("unknown_status_population", "total", filter="unknown_status"),
+        Metric("total_population", "total"),
+    ],
+    derived={
+        "status_group": status_groups,
+        "age_band": age_bands,
+        "vocational_training": vocational_training,
+        "nco_group": rollup_keys("NCO Group"),
+        "nic_division": rollup_keys("NIC Division"),
+    },
+    filters={
+        "age_0_14": lambda df: df["age_band"] == "0-14",
+        "age_15_29": lambda df: df["age_band"] == "15-29",
+        "age_30_59": lambda df: df["age_band"] == "30-59",
+        "age_60_plus": lambda df: df["age_band"] == "60+",
+        "employed": lambda df: df["status_group"].isin(EMPLOYED),
+        "unemployed": lambda df: df["status_group"] == "unemployed",
+        "labour_force": lambda df: df["status_group"].isin(EMPLOYED + ["unemployed"]),
+        "known_status": lambda df: df["status_group"] != "unknown",
+        "unknown_status": lambda df: df["status_group"] == "unknown",
+    },
+)
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from derived import cached_columns
+from store import DATA_ROOT, load_cleaned
+from metrics import HOUSEHOLD_COLUMNS, HOUSEHOLD_SOURCES, PERSON_COLUMNS, PERSON_SOURCES, RENAMES, dataset_columns
+from streaming import SKETCH_CAPACITY, statewise_aggregator, statewise_results
+
+# Parallel statewise aggregation over shared-memory columns.
+#
+# Each (dataset, sector) frame is loaded once and moved into shared memory
+# column by column, sorted by state -- float64 values, or int32 codes plus the
+# category list, as in column_store.py. A column leaves the frame as soon as it
+# is copied, and the frame is gone before the workers start. Work units are
+# (dataset, sector, state range) row slices; a worker attaches to the blocks
+# for the unit, wraps its slice in zero-copy numpy views, runs the
+# streaming.py aggregator over it and detaches again. A
+# state never spans two units, so the returned group states simply union into
+# the per-(level, sector) results, and statewise_results() builds the same
+# final_state_data as statewise_v3.py.
+
+CODE_DTYPE = np.int32
+VALUE_DTYPE = np.float64
+
+TASKS = {
+    "household": (HOUSEHOLD_SOURCES, HOUSEHOLD_COLUMNS),
+    "person": (PERSON_SOURCES, cached_columns(PERSON_COLUMNS)),
+}
+
+
+class SharedFrame:
+    """
+    A DataFrame's columns in shared memory, rows in `order` (as they are by
+    default); `spec` is all a worker needs to attach. The columns are moved:
+    each is dropped from `df` once copied, so a frame and its shared copy do
+    not both exist whole, and `df` is left empty.
+    """
+
+    def __init__(self, df, order=None):
+        self.blocks = []
+        self.spec = {"n_rows": len(df), "columns": {}}
+        for col in list(df.columns):
+            values = df.pop(col)
+            if order is not None:
+                values = values.take(order)
+            if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+                array, categories = values.to_numpy(dtype=VALUE_DTYPE, na_value=np.nan), None
+            else:
+                codes, uniques = pd.factorize(values)
+                array, categories = codes.astype(CODE_DTYPE), list(uniques)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.spec["columns"][col] = {"block": block.name, "dtype": array.dtype.str, "categories": categories}
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach(spec, blocks, start, end):
+    """
+    Rows [start, end) of a SharedFrame as a DataFrame of views (categoricals
+    over the shared codes); `blocks` are the attached {name: SharedMemory}.
+    """
+    columns = {}
+    for col, meta in spec["columns"].items():
+        array = np.ndarray((spec["n_rows"],), dtype=meta["dtype"], buffer=blocks[meta["block"]].buf)[start:end]
+        if meta["categories"] is None:
+            columns[col] = pd.Series(array, copy=False)
+        else:
+            columns[col] = pd.Series(pd.Categorical.from_codes(array, meta["categories"]))
+    return pd.DataFrame(columns, copy=False)
+
+
+def aggregate_slice(level, spec, start, end, capacity=SKETCH_CAPACITY):
+    """Worker: the level's aggregator over one state range; returns its group states."""
+    blocks = {meta["block"]: shared_memory.SharedMemory(name=meta["block"]) for meta in spec["columns"].values()}
+    try:
+        # the views die with the frame here, so the blocks can be closed below
+        return statewise_aggregator(level, capacity).update(attach(spec, blocks, start, end)).groups
+    finally:
+        for block in blocks.values():
+            block.close()
+
+
+def state_ranges(states, n_chunks):
+    """Splits state-sorted rows into at most n_chunks (start, end) ranges on state boundaries."""
+    codes, _ = pd.factorize(states)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]))
+    targets = np.linspace(0, len(codes), n_chunks + 1)[1:-1]
+    cuts = np.unique(bounds[np.searchsorted(bounds, targets)])
+    edges = np.unique(np.concatenate(([0], cuts, [len(codes)])))
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def load_shared(name, columns, sector, n_chunks, data_root=DATA_ROOT):
+    """(SharedFrame sorted by state, its state ranges for n_chunks units); the loaded frame is released."""
+    df = load_cleaned(name, dataset_columns(name, columns), data_root, sectors=[sector]).rename(
+        columns=RENAMES.get(name, {}))
+    # stable, so rows keep their file order within a state (first-seen category order)
+    order = np.argsort(pd.factorize(df["State/Ut Code"])[0], kind="stable")
+    ranges = state_ranges(df["State/Ut Code"].take(order), n_chunks)
+    return SharedFrame(df, order), ranges
+
+
+def parallel_aggregators(data_root=DATA_ROOT, workers=None, capacity=SKETCH_CAPACITY):
+    """{(level, sector): aggregator} like streaming.stream_aggregators, over a process pool."""
+    workers = workers or os.cpu_count() or 1
+    frames, futures, aggs = [], [], {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for level, (sources, columns) in TASKS.items():
+                for sector, name in sources.items():
+                    shared, ranges = load_shared(name, columns, sector, workers, data_root)
+                    frames.append(shared)
+                    aggs[level, sector] = statewise_aggregator(level, capacity)
+                    for start, end in ranges:
+                        futures.append(((level, sector), pool.submit(aggregate_slice, level, shared.spec, start, end,
+                                                                     capacity)))
+            for key, future in futures:
+                aggs[key].groups.update(future.result())
+    finally:
+        for shared in frames:
+            shared.close()
+    return aggs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statewise PLFS aggregates over a process pool")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--sketch-capacity", type=int, default=SKETCH_CAPACITY)
+    parser.add_argument("--output", default="statewise_plfs_weighted.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    aggs = parallel_aggregators(args.data_root, args.workers, args.sketch_capacity)
+    with open(args.output, "w") as f:
+        json.dump(statewise_results(aggs, args.data_root), f, indent=2)
+    print(f"Done! Statewise PLFS data (weighted, filtered, parallel) written to {args.output} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
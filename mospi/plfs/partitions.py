@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from json_codec import get_codec
+from store import DATA_ROOT, cleaned_path, column_kind, expand_labels
+
+# Cleaned PLFS data partitioned by state and sector (ingest.py --format partitioned):
+#
+#   <name>_cleaned.parts.jsonl   one compact JSON record per line, grouped so each
+#                                (state, sector) partition is one contiguous byte range
+#   <name>_cleaned.parts.json    manifest: partition key values, row count, byte offset
+#                                and length of every partition, and each column's type
+#                                ("numeric" / "string", taken over the whole file)
+#
+# A reader seeks straight to the partitions it needs (a single state is about
+# 1/36th of the file) and parses them concurrently; pyarrow's JSON reader
+# releases the GIL, so threads are enough. Without pyarrow the records go
+# through json_codec.py. Every partition is read with the manifest's column
+# types, so a column all null (or all integer) in one partition comes back
+# with the same dtype whichever partitions are selected.
+
+PARTITION_KEYS = ["State/Ut Code", "Sector"]
+
+
+def manifest_path(name, data_root=DATA_ROOT):
+    return os.path.join(data_root, name, f"{name}_cleaned.parts.json")
+
+
+def has_partitions(name, data_root=DATA_ROOT):
+    return os.path.exists(manifest_path(name, data_root))
+
+
+def load_manifest(name, data_root=DATA_ROOT):
+    with open(manifest_path(name, data_root), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def python_value(v):
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    return v.item() if hasattr(v, "item") else v
+
+
+def write_partitioned(frames, output_path, keys=PARTITION_KEYS, codec=None):
+    """
+    Writes an iterable of same-column DataFrames as partitioned JSON lines plus
+    its manifest. Rows are spilled to one temporary file per partition while
+    streaming, then the spills are concatenated in key order. Each column is
+    typed from its non-null values in every chunk (all-null columns are
+    strings); a column holding both numbers and text gets no type.
+    """
+    codec = codec or get_codec()
+    out_dir = os.path.dirname(output_path) or "."
+    spill_dir = tempfile.mkdtemp(prefix=".parts-", dir=out_dir)
+    spills, columns, count, kinds = {}, None, 0, {}
+    try:
+        for df in frames:
+            if columns is None:
+                columns = list(df.columns)
+                keys = [k for k in keys if k in columns]
+            for col in columns:
+                kind = column_kind(df[col])
+                if kind == "numeric" and pd.api.types.is_bool_dtype(df[col].dropna().infer_objects()):
+                    kind = "mixed"  # JSON true / false: left to the reader to infer
+                if kind is not None:
+                    kinds[col] = kind if kinds.get(col, kind) == kind else "mixed"
+            records = df.astype(object).where(df.notna(), None)
+            rows = records.to_dict("records")
+            groups = records.groupby(keys, dropna=False, sort=False).indices if keys else {(): range(len(rows))}
+            for key, index in groups.items():
+                key = tuple(python_value(v) for v in (key if isinstance(key, tuple) else (key,)))
+                if key not in spills:
+                    spills[key] = [open(os.path.join(spill_dir, f"{len(spills)}.jsonl"), "w", encoding="utf-8"), 0]
+                spills[key][0].write("".join(codec.dumps(rows[i]) + "\n" for i in index))
+                spills[key][1] += len(index)
+            count += len(df)
+            print(f"Processed {count:,} rows...")
+
+        for handle, _ in spills.values():
+            handle.close()
+
+        partitions, offset = [], 0
+        with open(output_path, "wb") as out:
+            for key in sorted(spills, key=lambda k: tuple(str(v) for v in k)):
+                handle, rows = spills[key]
+                with open(handle.name, "rb") as f:
+                    shutil.copyfileobj(f, out)
+                size = out.tell() - offset
+                partitions.append({"values": list(key), "rows": rows, "offset": offset, "bytes": size})
+                offset += size
+    finally:
+        for handle, _ in spills.values():
+            handle.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    schema = {col: kinds.get(col, "string") for col in columns or [] if kinds.get(col) != "mixed"}
+    manifest = {"keys": keys or [], "columns": columns or [], "schema": schema, "n_rows": count,
+                "partitions": partitions}
+    with open(output_path[:-len(".jsonl")] + ".json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return count
+
+
+def select_partitions(manifest, filters=None, tables=None):
+    """
+    Partitions whose key values pass `filters` ({key column: allowed values}).
+    Labels are accepted for lazily labelled keys (see store.expand_labels).
+    """
+    wanted = {}
+    for key, values in (filters or {}).items():
+        if key not in manifest["keys"]:
+            raise KeyError(f"not a partition key: {key!r} (keys: {manifest['keys']})")
+        wanted[manifest["keys"].index(key)] = expand_labels(values, (tables or {}).get(key, {}))
+    return [p for p in manifest["partitions"] if all(p["values"][i] in vals for i, vals in wanted.items())]
+
+
+def partition_rows(name, data_root=DATA_ROOT, filters=None, tables=None):
+    """Row positions, in whole-file partition order, of the rows load_partitions returns for `filters`."""
+    manifest = load_manifest(name, data_root)
+    starts, start = {}, 0
+    for p in manifest["partitions"]:
+        starts[p["offset"]] = start
+        start += p["rows"]
+    parts = select_partitions(manifest, filters, tables)
+    ranges = [np.arange(starts[p["offset"]], starts[p["offset"]] + p["rows"]) for p in parts]
+    return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+
+def read_partition(data_path, partition, columns=None, codec=None, schema=None):
+    """
+    One partition as a DataFrame; `schema` is the manifest's {column: "numeric"
+    / "string"} (manifests written before it have none: types are inferred).
+    """
+    with open(data_path, "rb") as f:
+        f.seek(partition["offset"])
+        data = f.read(partition["bytes"])
+    schema = schema or {}
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pa_json
+    except ImportError:
+        codec = codec or get_codec()
+        df = pd.DataFrame.from_records([codec.loads(line) for line in data.splitlines()],
+                                       columns=list(columns) if columns else None)
+        numeric = [c for c in df.columns if schema.get(c) == "numeric"]
+        return df.astype({c: np.float64 for c in numeric}) if numeric else df
+
+    fields = [pa.field(c, pa.float64() if kind == "numeric" else pa.string()) for c, kind in schema.items()]
+    options = pa_json.ParseOptions(explicit_schema=pa.schema(fields), unexpected_field_behavior="infer")
+    table = pa_json.read_json(pa.BufferReader(data), parse_options=options)
+    return table.select(list(columns)).to_pandas() if columns else table.to_pandas()
+
+
+def load_partitions(name, columns=None, data_root=DATA_ROOT, filters=None, tables=None, workers=None):
+    """Reads the selected partitions of a dataset (all by default) concurrently into one DataFrame."""
+    data_path = cleaned_path(name, data_root, "partitioned")
+    manifest = load_manifest(name, data_root)
+    parts = select_partitions(manifest, filters, tables)
+    if not parts:
+        return pd.DataFrame(columns=list(columns or manifest["columns"]))
+
+    workers = workers or min(len(parts), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(lambda p: read_partition(data_path, p, columns, schema=manifest.get("schema")), parts))
+    return pd.concat(frames, ignore_index=True).infer_objects()
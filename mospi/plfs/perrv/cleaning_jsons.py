@@ -1,7 +1,8 @@
-import ijson
-import json
 import os
-from decimal import Decimal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
 
 # === Input & Output paths ===
 input_file = r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\perrv\perrv_labeled_final.json"  
@@ -12,6 +13,8 @@ output_file = r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\per
 # === Keys to keep ===
 required_keys = {
     "State/Ut Code",
+    "District Name",
+    "NSS-Region",
     "Gender",
     "Age",
     "Sector",
@@ -27,6 +30,15 @@ required_keys = {
     "total hours actually worked on 7th day",
     "Earnings For Regular Salarid/Wage Activity",
     "Earnings For Self Employed",
+    "First Stage Unit (FSU)",
+    "Hamlet Group/Sub-Block No.",
+    "Second Stage Stratum No.",
+    "Sample Household Number",
+    "Person Serial No.",
+    "Current Weekly Status (CWS)",
+    "Quarter",
+    "Visit",
+    "Sub-sample",
     "Sub-sample wise Multiplier",
     "Ns count for sector x stratum x substratum x sub-sample",
     "Ns count for sector x stratum x substratum",
@@ -43,24 +55,19 @@ rename_map = {
     "Occupation Code (CWS)" : "Occupation Code (NCO)"
 }
 
-# === Handle Decimal safely ===
-def safe_json_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError(f"Type {type(obj)} not serializable")
+# === Stream processing (json_codec.py: native floats, one compact record per line) ===
+codec = get_codec()
 
-# === Stream processing with pretty printing ===
 with open(input_file, "r", encoding="utf-8") as fin, open(output_file, "w", encoding="utf-8") as fout:
     fout.write("[\n")
     first = True
-    for record in ijson.items(fin, "item"):
+    for record in codec.iter_items(fin):
         filtered = {k: v for k, v in record.items() if k in required_keys}
         renamed = {rename_map.get(k, k): v for k, v in filtered.items()}
 
         if not first:
             fout.write(",\n")
-        # write this record as pretty JSON (each field on its own line)
-        fout.write(json.dumps(renamed, ensure_ascii=False, indent=4, default=safe_json_default))
+        fout.write(codec.dumps(renamed))
         first = False
     fout.write("\n]")
 
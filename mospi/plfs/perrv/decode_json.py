@@ -1,6 +1,15 @@
+import argparse
+import codecs
+import itertools
 import json
 import os
-import ijson
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codec import get_codec  # noqa: E402
 
 filename = "perrv_labeled_renamed.json"
 data_folder = r"C:/Users/nishn/OneDrive/Desktop/BTP/Data BTP/Data/mospi/plfs/perrv"
@@ -9,93 +18,229 @@ final_filename = "perrv_labeled_final.json"
 initial_file_path = os.path.join(data_folder, filename)
 destination_path = os.path.join(data_folder, final_filename)
 
-# Load the smaller mapping files (safe to load fully)
-with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\district_mapping.json", "r", encoding="utf-8") as f:
-    district_mapping = json.load(f)
-
-with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\nss_regions.json", "r", encoding="utf-8") as f:
-    nss_mappings = json.load(f)
-
-with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\industry_codes.json", "r", encoding="utf-8") as f:
-    nic_2digit_mapping = json.load(f)
-
-with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\occupation_codes.json", "r", encoding="utf-8") as f:
-    occupation_codes_mapping = json.load(f)
-
-from decimal import Decimal
-
-def convert_decimal(obj):
-    if isinstance(obj, list):
-        return [convert_decimal(x) for x in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    else:
-        return obj
+# --- JSON codec (json_codec.py): streaming reads with native floats, compact writes ---
+codec = get_codec()
 
+# --- Parallel mode: the input is cut into byte ranges on record boundaries ---
+RANGE_BYTES = 64 * 1024 * 1024
+# decoded ranges in flight per worker: bounds the memory held by results not yet written
+RANGES_PER_WORKER = 2
+# a candidate split point; the record after it is parsed to make sure it is not
+# a "},{" inside a string value
+RECORD_BOUNDARY = re.compile(rb"\}\s*,\s*\{")
+BOUNDARY_DECODER = json.JSONDecoder()
 
-# Stream process and write incrementally
-with open(initial_file_path, "r", encoding="utf-8") as infile, \
-     open(destination_path, "w", encoding="utf-8") as outfile:
+# --- Mapping tables (loaded once in the main process, handed to each worker) ---
+district_mapping = nss_mappings = nic_2digit_mapping = occupation_codes_mapping = None
 
-    outfile.write("[")  # start JSON array
-    first = True
 
-    for row in ijson.items(infile, "item"):  # stream each JSON object
-        decoded_row = {}
-        state_name = row.get("State/Ut Code", "").upper()
+def load_mappings():
+    with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\district_mapping.json", "r", encoding="utf-8") as f:
+        district = json.load(f)
 
-        for k, v in row.items():
-            if k == "District Code":
-                district_code = str(v).zfill(2)
-                district_name = district_mapping.get(state_name, {}).get(district_code)
-                decoded_row["District Name"] = district_name if district_name else None
+    with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\nss_regions.json", "r", encoding="utf-8") as f:
+        nss = json.load(f)
 
-            elif k == "NSS-Region":
-                nss_code = str(v).zfill(2)
-                decoded_row["NSS-Region"] = nss_mappings.get(nss_code, {})
+    with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\industry_codes.json", "r", encoding="utf-8") as f:
+        nic = json.load(f)
 
-            elif "Industry Code (NIC) for activity" in k:
-                code = str(v)[:2].zfill(2)
-                decoded_row[k] = nic_2digit_mapping.get(code, None)
+    with open(r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs\occupation_codes.json", "r", encoding="utf-8") as f:
+        nco = json.load(f)
 
-            elif "Industry Code (CWS)" in k:
-                code = str(v)[:2].zfill(2)
-                decoded_row[k] = nic_2digit_mapping.get(code, None)
+    return district, nss, nic, nco
 
-            elif "Occupation Code (CWS)" in k:
-                code = str(v).zfill(2)
-                decoded_row[k] = occupation_codes_mapping.get(code, None)
 
-            elif k == "Quarter":
-                quarter_map = {"Q1": "Quarter 1", "Q2": "Quarter 2", "Q3": "Quarter 3", "Q4": "Quarter 4"}
-                decoded_row["Quarter"] = quarter_map.get(v, v)
+def set_mappings(district, nss, nic, nco):
+    global district_mapping, nss_mappings, nic_2digit_mapping, occupation_codes_mapping
+    district_mapping, nss_mappings, nic_2digit_mapping, occupation_codes_mapping = district, nss, nic, nco
 
-            elif k == "Visit":
-                visit_map = {"V1": "Visit 1", "V2": "Visit 2", "V3": "Visit 3", "V4": "Visit 4"}
-                decoded_row["Visit"] = visit_map.get(v, v)
 
-            elif k == "FSU":
-                decoded_row["First Stage Unit (FSU)"] = v
+def decode_row(row):
+    decoded_row = {}
+    state_name = row.get("State/Ut Code", "").upper()
 
-            elif k == "File Identification":
-                decoded_row[k] = "Revisit Person level 7"
-
-            elif row.get(k) == "":
-                decoded_row[k] = None
-
-            else:
-                decoded_row[k] = v
-
-        # Write each object incrementally
-        if not first:
-            outfile.write(",\n")
-        decoded_row = convert_decimal(decoded_row)
-        json.dump(decoded_row, outfile, ensure_ascii=False, indent=4)
-
-        first = False
-
-    outfile.write("]")  # close JSON array
+    for k, v in row.items():
+        if k == "District Code":
+            district_code = str(v).zfill(2)
+            district_name = district_mapping.get(state_name, {}).get(district_code)
+            decoded_row["District Name"] = district_name if district_name else None
+
+        elif k == "NSS-Region":
+            nss_code = str(v).zfill(2)
+            decoded_row["NSS-Region"] = nss_mappings.get(nss_code, {})
+
+        elif "Industry Code (NIC) for activity" in k:
+            code = str(v)[:2].zfill(2)
+            decoded_row[k] = nic_2digit_mapping.get(code, None)
+
+        elif "Industry Code (CWS)" in k:
+            code = str(v)[:2].zfill(2)
+            decoded_row[k] = nic_2digit_mapping.get(code, None)
+
+        elif "Occupation Code (CWS)" in k:
+            code = str(v).zfill(2)
+            decoded_row[k] = occupation_codes_mapping.get(code, None)
+
+        elif k == "Quarter":
+            quarter_map = {"Q1": "Quarter 1", "Q2": "Quarter 2", "Q3": "Quarter 3", "Q4": "Quarter 4"}
+            decoded_row["Quarter"] = quarter_map.get(v, v)
+
+        elif k == "Visit":
+            visit_map = {"V1": "Visit 1", "V2": "Visit 2", "V3": "Visit 3", "V4": "Visit 4"}
+            decoded_row["Visit"] = visit_map.get(v, v)
+
+        elif k == "FSU":
+            decoded_row["First Stage Unit (FSU)"] = v
+
+        elif k == "File Identification":
+            decoded_row[k] = "Revisit Person level 7"
+
+        elif row.get(k) == "":
+            decoded_row[k] = None
+        else:
+            decoded_row[k] = v
+
+    return decoded_row
+
+
+# --- Serial mode: stream & decode ---
+def decode_serial():
+    with open(initial_file_path, "r", encoding="utf-8") as infile, \
+         open(destination_path, "w", encoding="utf-8") as outfile:
+
+        outfile.write("[")
+        first = True
+        count = 0
+
+        for row in codec.iter_items(infile):
+            decoded_row = decode_row(row)
+
+            # Stream write safely
+            if not first:
+                outfile.write(",\n")
+            outfile.write(codec.dumps(decoded_row))
+            first = False
+
+            count += 1
+            if count % 10000 == 0:
+                print(f"Processed {count:,} rows...")
+
+        outfile.write("]")
+
+    return count
+
+
+# --- Parallel mode: split into row ranges, decode in a process pool, merge in order ---
+def record_at(f, pos):
+    """True when a record starts at byte pos: a non-empty JSON object followed by ',' or the closing ']'."""
+    f.seek(pos)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    while True:
+        data = f.read(1024 * 1024)
+        text += decoder.decode(data, final=not data)
+        try:
+            record, end = BOUNDARY_DECODER.raw_decode(text)
+        except json.JSONDecodeError as e:
+            # cut short by the read (read on) or not JSON from here (inside a string value)
+            if data and (e.pos >= len(text.rstrip()) or e.msg.startswith("Unterminated string")):
+                continue
+            return False
+        after = text[end:].lstrip()
+        if data and not after:
+            continue
+        return isinstance(record, dict) and bool(record) and after[:1] in (",", "]")
+
+
+def next_record(f, pos):
+    """Byte offset of the first record start after pos (None when there is none)."""
+    while True:
+        f.seek(pos)
+        window = f.read(1024 * 1024)
+        match = RECORD_BOUNDARY.search(window)
+        while match is None and window:
+            more = f.read(1024 * 1024)
+            if not more:
+                break
+            window += more
+            match = RECORD_BOUNDARY.search(window)
+        if match is None:
+            return None
+        start = pos + match.end() - 1
+        if record_at(f, start):
+            return start
+        pos = start  # a "},{" inside a string: look past it
+
+
+def split_ranges(path, range_bytes=RANGE_BYTES):
+    """Byte ranges of the top-level array, each starting at a record's '{' (none for an empty array)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(4096)
+        start = head.find(b"{")
+        if start < 0:
+            return []
+        bounds = [start]
+        pos = start + range_bytes
+        while pos < size:
+            start = next_record(f, pos)
+            if start is None:
+                break
+            bounds.append(start)
+            pos = start + range_bytes
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def decode_range(byte_range):
+    start, end = byte_range
+    with open(initial_file_path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8").rstrip()
+    text = text.rstrip("]").rstrip().rstrip(",")
+    rows = codec.loads("[" + text + "]")
+    parts = [codec.dumps(decode_row(row)) for row in rows]
+    return len(parts), ",\n".join(parts)
+
+
+def decode_parallel(workers):
+    ranges = iter(split_ranges(initial_file_path))
+    mappings = (district_mapping, nss_mappings, nic_2digit_mapping, occupation_codes_mapping)
+
+    with open(destination_path, "w", encoding="utf-8") as outfile, \
+         ProcessPoolExecutor(max_workers=workers, initializer=set_mappings, initargs=mappings) as pool:
+
+        outfile.write("[")
+        count = 0
+        # a window of RANGES_PER_WORKER * workers futures, written in submission
+        # order (so the output matches the serial run); each one written makes
+        # room for the next range
+        pending = deque(pool.submit(decode_range, r) for r in itertools.islice(ranges, RANGES_PER_WORKER * workers))
+        while pending:
+            n, text = pending.popleft().result()
+            for r in itertools.islice(ranges, 1):
+                pending.append(pool.submit(decode_range, r))
+            if not n:
+                continue
+            if count:
+                outfile.write(",\n")
+            outfile.write(text)
+            count += n
+            print(f"Processed {count:,} rows...")
+        outfile.write("]")
+
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode perrv codes to labels")
+    parser.add_argument("--workers", type=int, default=1, help="process-pool size; 1 = serial streaming decode")
+    args = parser.parse_args()
+
+    set_mappings(*load_mappings())
+    if args.workers > 1:
+        count = decode_parallel(args.workers)
+    else:
+        count = decode_serial()
 
-print(f"✅ Successfully processed large JSON in streaming mode → {final_filename}")
+    print(f"✅ Successfully processed {count:,} rows from {filename} → {final_filename}")
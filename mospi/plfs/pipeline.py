@@ -0,0 +1,307 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cube import cube_path
+from ingest import DATASETS
+from partitions import manifest_path
+from store import DATA_ROOT, FORMATS, cleaned_path, value_labels_path
+
+# Stage runner for the PLFS and RTI pipelines.
+#
+#   <name>.sav --ingest--> <name>_cleaned --column store--> statewise_plfs_weighted.json
+#                                                     \--> cube/person_cube.parquet
+#   RTI/pdfs/*.pdf --outputextraction--> processed_results_all_files.json
+#
+# Every stage is fingerprinted from its command, its code files and the
+# content of its inputs (including the outputs of the stages it depends on and
+# the mapping files). A stage only runs when that fingerprint differs from the
+# last successful run, and stages whose dependencies are done run concurrently
+# (the four PLFS datasets in parallel).
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+RTI_PDF_DIR = r"C:\Users\nishn\OneDrive\Desktop\BTP\BTP\RTI\pdfs"
+
+STATE_FILE = ".pipeline_state.json"
+
+MAPPING_FILES = ["district_mapping.json", "nss_regions.json", "industry_codes.json", "occupation_codes.json"]
+
+
+class Stage:
+    def __init__(self, name, command, cwd, code=(), inputs=(), outputs=(), deps=()):
+        self.name = name
+        self.command = list(command)
+        self.cwd = cwd
+        self.code = list(code)
+        # files, or (directory, suffix) pairs meaning every matching file inside
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+
+
+def script(*parts):
+    return os.path.join(SCRIPT_DIR, *parts)
+
+
+def build_stages(data_root=DATA_ROOT, fmt="json", rti_dir=RTI_PDF_DIR, lazy_labels=False, streaming=False,
+                 parallel=False):
+    python = sys.executable
+    mapping_paths = [os.path.join(data_root, m) for m in MAPPING_FILES]
+    stages = {}
+    label_files = []
+
+    for name, spec in DATASETS.items():
+        folder = os.path.join(data_root, name)
+        outputs = [cleaned_path(name, data_root, fmt)]
+        if fmt == "partitioned":
+            outputs.append(manifest_path(name, data_root))
+        if lazy_labels:
+            outputs.append(value_labels_path(name, data_root))
+            label_files.append(value_labels_path(name, data_root))
+        stages[f"ingest:{name}"] = Stage(
+            f"ingest:{name}",
+            [python, script("ingest.py"), name, "--data-root", data_root, "--format", fmt]
+            + (["--lazy-labels"] if lazy_labels else []),
+            SCRIPT_DIR,
+            code=[script("ingest.py"), script("decoders.py"), script("codebook.py"), script("store.py"),
+                  script("json_codec.py"), script("partitions.py")],
+            inputs=[os.path.join(folder, f"{name}.sav"), os.path.join(folder, spec["column_labels"])] + mapping_paths,
+            outputs=outputs,
+        )
+        stages[f"store:{name}"] = Stage(
+            f"store:{name}",
+            [python, script("column_store.py"), name, "--data-root", data_root],
+            SCRIPT_DIR,
+            code=[script("column_store.py"), script("store.py"), script("json_codec.py"), script("partitions.py")],
+            # each dataset's store is self-contained (its own dictionary.json), so the
+            # stores build in parallel and one rebuilt never changes another's outputs
+            outputs=[os.path.join(data_root, "column_store", name, "manifest.json"),
+                     (os.path.join(data_root, "column_store", name), ".bin"),
+                     os.path.join(data_root, "column_store", name, "dictionary.json")],
+            deps=[f"ingest:{name}"],
+        )
+
+    # metrics.py declares every published metric, derived.py the status groups and age bands
+    # (store.cleaned_source: every mode reads the column store when there is a current one)
+    statewise_code = [script("store.py"), script("column_store.py"), script("codebook.py"), script("partitions.py"),
+                      script("json_codec.py"), script("weighted.py"), script("cube.py"), script("decoders.py"),
+                      script("metrics.py"), script("derived.py")]
+    if streaming:
+        # streams the cleaned copies chunk by chunk (streaming.py); no column store build needed
+        command = [python, script("streaming.py"), "--data-root", data_root]
+        statewise_code += [script("streaming.py")]
+        statewise_deps = [f"ingest:{name}" for name in DATASETS]
+    elif parallel:
+        # streaming.py's aggregators over shared-memory columns on every core (parallel.py)
+        command = [python, script("parallel.py"), "--data-root", data_root]
+        statewise_code += [script("parallel.py"), script("streaming.py")]
+        statewise_deps = [f"store:{name}" for name in DATASETS]
+    else:
+        command = [python, script("statewise_v3.py"), "--data-root", data_root]
+        statewise_code += [script("statewise_v3.py")]
+        statewise_deps = [f"store:{name}" for name in DATASETS]
+    stages["statewise"] = Stage(
+        "statewise",
+        command,
+        SCRIPT_DIR,
+        code=statewise_code,
+        inputs=[os.path.join(data_root, "industry_codes.json"), os.path.join(data_root, "occupation_codes.json")]
+        + label_files,
+        outputs=[script("statewise_plfs_weighted.json")],
+        deps=statewise_deps,
+    )
+
+    stages["cube"] = Stage(
+        "cube",
+        [python, script("cube.py"), "--data-root", data_root],
+        SCRIPT_DIR,
+        code=[script("cube.py"), script("weighted.py"), script("decoders.py"), script("store.py"),
+              script("column_store.py"), script("codebook.py"), script("partitions.py"), script("json_codec.py"),
+              script("derived.py")],
+        inputs=mapping_paths + label_files,
+        outputs=[cube_path(data_root)],
+        deps=[f"store:{name}" for name in ("perv1", "perrv")],
+    )
+
+    stages["rti"] = Stage(
+        "rti",
+        [python, os.path.join(REPO_ROOT, "RTI", "outputextraction.py")],
+        os.path.join(REPO_ROOT, "RTI"),
+        code=[os.path.join(REPO_ROOT, "RTI", "outputextraction.py")],
+        inputs=[(rti_dir, ".pdf")],
+        outputs=[os.path.join(rti_dir, "processed_results_all_files.json")],
+    )
+    return stages
+
+
+class Runner:
+    def __init__(self, stages, state_path, jobs=4, force=(), dry_run=False):
+        self.stages = stages
+        self.state_path = state_path
+        self.jobs = jobs
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.lock = threading.Lock()
+        self.state = {"fingerprints": {}, "files": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save_state(self):
+        with self.lock:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.state_path)
+
+    def file_digest(self, path):
+        """sha256 of a file; reused while its size and mtime are unchanged."""
+        st = os.stat(path)
+        key = f"{st.st_size}:{st.st_mtime_ns}"
+        with self.lock:
+            cached = self.state["files"].get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        with self.lock:
+            self.state["files"][path] = [key, h.hexdigest()]
+        return h.hexdigest()
+
+    def digest_paths(self, paths):
+        out = {}
+        for path in paths:
+            if isinstance(path, tuple):
+                folder, suffix = path
+                names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+                for fname in names:
+                    if fname.lower().endswith(suffix):
+                        full = os.path.join(folder, fname)
+                        out[full] = self.file_digest(full)
+                if not names:
+                    out[folder] = "missing"
+            elif os.path.exists(path):
+                out[path] = self.file_digest(path)
+            else:
+                out[path] = "missing"
+        return out
+
+    def fingerprint(self, stage):
+        dep_outputs = [p for dep in stage.deps for p in self.stages[dep].outputs]
+        payload = {
+            "command": stage.command,
+            "code": self.digest_paths(stage.code),
+            "inputs": self.digest_paths(stage.inputs + dep_outputs),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_current(self, stage, fp):
+        return (stage.name not in self.force
+                and self.state["fingerprints"].get(stage.name) == fp
+                and all(os.path.exists(p[0] if isinstance(p, tuple) else p) for p in stage.outputs))
+
+    def execute(self, stage):
+        fp = self.fingerprint(stage)
+        if self.is_current(stage, fp):
+            return "up to date"
+        if self.dry_run:
+            return "would run"
+        print(f"▶️  {stage.name}: {' '.join(stage.command)}")
+        result = subprocess.run(stage.command, cwd=stage.cwd)
+        if result.returncode != 0:
+            raise RuntimeError(f"{stage.name} exited with code {result.returncode}")
+        with self.lock:
+            self.state["fingerprints"][stage.name] = fp
+        self.save_state()
+        return "ran"
+
+    def selected(self, targets):
+        todo, stack = set(), list(targets or self.stages)
+        while stack:
+            name = stack.pop()
+            if name not in todo:
+                todo.add(name)
+                stack.extend(self.stages[name].deps)
+        return todo
+
+    def run(self, targets=None):
+        pending = self.selected(targets)
+        status, running = {}, {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for name in sorted(pending):
+                    deps = self.stages[name].deps
+                    if any(status.get(d) in ("failed", "skipped") for d in deps):
+                        status[name] = "skipped"
+                        pending.discard(name)
+                    elif any(status.get(d) == "would run" for d in deps) and all(d in status for d in deps):
+                        # a dry run cannot fingerprint outputs that have not been rebuilt yet
+                        status[name] = "would run"
+                        pending.discard(name)
+                    elif all(d in status for d in deps):
+                        running[pool.submit(self.execute, self.stages[name])] = name
+                        pending.discard(name)
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                    except Exception as e:
+                        print(f"❌ {name}: {e}")
+                        status[name] = "failed"
+                    print(f"{'✅' if status[name] != 'failed' else '❌'} {name}: {status[name]}")
+
+        self.save_state()
+        return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PLFS / RTI stages that are out of date")
+    parser.add_argument("targets", nargs="*", help="stage names (default: all), e.g. statewise ingest:perv1 rti")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--format", choices=list(FORMATS), default="json")
+    parser.add_argument("--lazy-labels", action="store_true", help="ingest value-labelled columns as codes")
+    parser.add_argument("--streaming", action="store_true",
+                        help="aggregate statewise in bounded memory (streaming.py) instead of statewise_v3.py")
+    parser.add_argument("--parallel", action="store_true",
+                        help="aggregate statewise over a process pool (parallel.py) instead of statewise_v3.py")
+    parser.add_argument("--rti-dir", default=RTI_PDF_DIR)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--force", nargs="*", default=[], help="stages to rerun regardless of fingerprint")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--list", action="store_true", help="print the stage graph and exit")
+    args = parser.parse_args()
+    if args.streaming and args.parallel:
+        parser.error("--streaming and --parallel are alternatives")
+
+    stages = build_stages(args.data_root, args.format, args.rti_dir, args.lazy_labels, args.streaming,
+                          args.parallel)
+    if args.list:
+        for stage in stages.values():
+            print(f"{stage.name}  <-  {', '.join(stage.deps) or '-'}")
+        return
+
+    unknown = set(args.targets + args.force) - set(stages)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    runner = Runner(stages, os.path.join(args.data_root, STATE_FILE), args.jobs, args.force, args.dry_run)
+    status = runner.run(args.targets)
+    if "failed" in status.values():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import json
+import time
+
+from codebook import open_codebook
+from derived import cached_columns
+from metrics import (HOUSEHOLD_COLUMNS, HOUSEHOLD_METRICS, HOUSEHOLD_SOURCES, PERSON_COLUMNS, PERSON_METRICS,
+                     PERSON_SOURCES, RENAMES, MetricSet, compile_plan, dataset_columns)
+from store import DATA_ROOT, load_cleaned
+
+# District and NSS-region estimates.
+#
+# The statewise metric sets of metrics.py, grouped by (state, district) or
+# (state, NSS region) instead of state, with each sector read from the same
+# file as in statewise_v3.py (metrics.HOUSEHOLD_SOURCES / PERSON_SOURCES). Every
+# reduction of metrics.Plan is a grouped bincount or a segment operation over
+# rows sorted once (weighted.segment_cumsum), so ~700 districts cost about what
+# the states do; only building the output grows with the number of groups.
+#
+# Each cell carries "sample": its records, and a small-sample flag for the cell
+# and for each metric whose records (a share's denominator) number fewer than
+# MIN_SAMPLE -- such estimates are too unstable to publish as they are.
+#
+#   python regional.py --level district --output districtwise_plfs_weighted.json
+
+LEVELS = {"district": "District Name", "region": "NSS-Region"}
+MIN_SAMPLE = 30
+
+
+def regional_metrics(spec, column):
+    """`spec` grouped by (state, `column`)."""
+    return MetricSet(spec.metrics, by=["State/Ut Code", column], derived=spec.derived, filters=spec.filters,
+                     where=spec.where)
+
+
+def load_sector(name, columns, sector, data_root=DATA_ROOT, states=None):
+    return load_cleaned(name, dataset_columns(name, columns), data_root, states=states,
+                        sectors=[sector]).rename(columns=RENAMES.get(name, {}))
+
+
+def regional_data(level="district", data_root=DATA_ROOT, min_sample=MIN_SAMPLE, states=None):
+    """{state: {district or region: {sector: {"households": {...}, "persons": {...}}}}}."""
+    column = LEVELS[level]
+    codebook = open_codebook(data_root)
+    out = {}
+    for part, sources, columns, spec in (
+            ("households", HOUSEHOLD_SOURCES, HOUSEHOLD_COLUMNS, HOUSEHOLD_METRICS),
+            ("persons", PERSON_SOURCES, cached_columns(PERSON_COLUMNS), PERSON_METRICS)):
+        plan = compile_plan(regional_metrics(spec, column))
+        for sector, name in sources.items():
+            df = load_sector(name, columns + [column], sector, data_root, states)
+            for (state, area), values in plan.run(df, codebook, min_sample).items():
+                out.setdefault(state, {}).setdefault(area, {}).setdefault(sector, {})[part] = values
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="District / NSS-region PLFS estimates with small-sample flags")
+    parser.add_argument("--level", choices=list(LEVELS), default="district")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--states", nargs="*", help="only these states (default: all)")
+    parser.add_argument("--min-sample", type=int, default=MIN_SAMPLE,
+                        help="records below which a cell or metric is flagged")
+    parser.add_argument("--output", default="regional_plfs_weighted.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = regional_data(args.level, args.data_root, args.min_sample, args.states)
+    with open(args.output, "w") as f:
+        json.dump(data, f, indent=2)
+    cells = [cell for areas in data.values() for sectors in areas.values() for parts in sectors.values()
+             for cell in parts.values()]
+    small = sum(cell["sample"]["small_sample"] for cell in cells)
+    print(f"✅ {sum(len(areas) for areas in data.values()):,} {args.level}s, {small:,} of {len(cells):,} cells "
+          f"below {args.min_sample} records → {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
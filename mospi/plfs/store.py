@@ -0,0 +1,319 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Cleaned PLFS data on disk: `<name>_cleaned.json` (row records),
+# `<name>_cleaned.parquet` (typed columns, strings dictionary-encoded) or
+# `<name>_cleaned.parts.jsonl` (partitioned by state and sector, see partitions.py).
+#
+# When ingested with lazy labels, value-labelled columns hold the raw .sav codes
+# and `<name>_cleaned.labels.json` holds the value-label tables; load_cleaned
+# resolves them (or not, with labels=False).
+
+DATA_ROOT = r"C:\Users\nishn\OneDrive\Desktop\BTP\Data BTP\Data\mospi\plfs"
+
+FORMATS = {"json": ".json", "parquet": ".parquet", "partitioned": ".parts.jsonl"}
+
+
+def cleaned_path(name, data_root=DATA_ROOT, fmt="json"):
+    return os.path.join(data_root, name, f"{name}_cleaned{FORMATS[fmt]}")
+
+
+def value_labels_path(name, data_root=DATA_ROOT):
+    return os.path.join(data_root, name, f"{name}_cleaned.labels.json")
+
+
+def save_value_labels(name, tables, data_root=DATA_ROOT):
+    """tables: {column: {code: label}}; stored as [code, label] pairs so numeric codes stay numeric."""
+    with open(value_labels_path(name, data_root), "w", encoding="utf-8") as f:
+        json.dump({col: [[code, label] for code, label in table.items()] for col, table in tables.items()},
+                  f, ensure_ascii=False, indent=2)
+
+
+def load_value_labels(name, data_root=DATA_ROOT):
+    """Value-label tables of a lazily labelled dataset ({} when the data holds labels already)."""
+    path = value_labels_path(name, data_root)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {col: {code: label for code, label in pairs} for col, pairs in json.load(f).items()}
+
+
+def apply_value_labels(series, table):
+    """
+    Codes -> labels as a categorical, one lookup per distinct code. Codes without
+    a label keep their value, as with pyreadstat's apply_value_formats.
+    """
+    cat = pd.Categorical(series)
+    values = np.empty(len(cat.categories) + 1, dtype=object)
+    values[:-1] = [table.get(c, c) for c in cat.categories.tolist()]
+    values[-1] = None
+    return pd.Series(pd.Categorical(values[cat.codes]), index=series.index)
+
+
+def expand_labels(values, table):
+    """Filter values plus the codes whose label is among them (so labels match lazily labelled data)."""
+    values = set(values)
+    return values | {code for code, label in table.items() if label in values}
+
+
+def label_frame(df, tables, columns=None):
+    """Resolves the value labels of `columns` (default: every labelled column in df)."""
+    columns = [c for c in (columns or df.columns) if c in tables and c in df.columns]
+    if not columns:
+        return df
+    return df.assign(**{c: apply_value_labels(df[c], tables[c]) for c in columns})
+
+
+def column_kind(values):
+    """"numeric" or "string" from a column's non-null values, None when it has none yet."""
+    values = values.dropna()
+    if not len(values):
+        return None
+    return "numeric" if pd.api.types.is_numeric_dtype(values.infer_objects()) else "string"
+
+
+def arrow_schema(columns, kinds):
+    """Numeric columns -> float64, everything else (all-null ones too) -> dictionary<int32, string>."""
+    import pyarrow as pa
+
+    return pa.schema([pa.field(col, pa.float64()) if kinds.get(col) == "numeric"
+                      else pa.field(col, pa.dictionary(pa.int32(), pa.string())) for col in columns])
+
+
+def to_arrow_table(df, schema):
+    """`df` as `schema`; raises ValueError for a value a numeric column cannot hold (never NaN in its place)."""
+    import pyarrow as pa
+
+    arrays = []
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_dictionary(field.type):
+            values = col.astype(object).where(col.notna(), None).map(lambda v: v if v is None else str(v))
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            values = pd.to_numeric(col, errors="coerce")
+            lost = values.isna() & col.notna()
+            if lost.any():
+                raise ValueError(f"column {field.name!r} was typed numeric from its earlier values, "
+                                 f"but holds {col[lost].iloc[0]!r}")
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(frames, output_path):
+    """
+    Writes an iterable of same-column DataFrames as one Parquet file (one row
+    group each). Each column is typed from its first non-null values in any
+    chunk: until every column has some, the chunks are spilled to a temporary
+    folder, and columns still all-null at the end are strings. A later value
+    that does not fit its column's type raises ValueError (and no file is left).
+    """
+    import pyarrow.parquet as pq
+
+    writer, schema, count, kinds, spilled = None, None, 0, {}, []
+    spill_dir = tempfile.mkdtemp(prefix=".parquet-", dir=os.path.dirname(output_path) or ".")
+
+    def flush(columns):
+        # the schema is settled: open the file and write the spilled chunks
+        nonlocal writer, schema
+        schema = arrow_schema(columns, kinds)
+        writer = pq.ParquetWriter(output_path, schema, compression="zstd")
+        for path in spilled:
+            writer.write_table(to_arrow_table(pd.read_pickle(path), schema))
+        spilled.clear()
+
+    try:
+        for df in frames:
+            count += len(df)
+            if writer is not None:
+                writer.write_table(to_arrow_table(df, schema))
+                continue
+            for col in df.columns:
+                kinds[col] = kinds.get(col) or column_kind(df[col])
+            spilled.append(os.path.join(spill_dir, f"{len(spilled)}.pkl"))
+            df.to_pickle(spilled[-1])
+            if all(kinds.values()):
+                flush(df.columns)
+        if writer is None and spilled:
+            flush(list(kinds))
+    except Exception:
+        if writer is not None:
+            writer.close()
+            os.remove(output_path)
+        raise
+    else:
+        if writer is not None:
+            writer.close()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return count
+
+
+def load_cleaned(name, columns=None, data_root=DATA_ROOT, labels=True, states=None, sectors=None):
+    """
+    Loads a cleaned dataset as a DataFrame, reading only `columns` when given.
+    Prefers the memory-mapped column store (column_store.py), then the Parquet
+    copy (categoricals come back as pandas `category`), then the partitioned
+    copy (partitions.py), and falls back to the JSON array written by
+    cleaning_jsons.py / ingest.py.
+
+    `states` / `sectors` keep only those rows of the same copy (cleaned_source)
+    an unfiltered load reads; when that is the partitioned copy only the
+    matching partitions are read at all.
+
+    Lazily labelled columns come back as label categoricals, or as the raw
+    codes with labels=False (see load_value_labels / label_frame).
+
+    Derived columns (derived.DERIVED_COLUMNS, e.g. "status_group") come from
+    their cache as categoricals, computed on first use.
+    """
+    from derived import DERIVED_COLUMNS, load_derived
+    from partitions import PARTITION_KEYS, load_partitions, partition_rows
+
+    derived = [c for c in columns or () if c in DERIVED_COLUMNS]
+    if derived:
+        # something must still be read to know the rows
+        columns = [c for c in columns if c not in DERIVED_COLUMNS] or PARTITION_KEYS[:1]
+    tables = load_value_labels(name, data_root)
+    filters = {k: v for k, v in zip(PARTITION_KEYS, (states, sectors)) if v is not None}
+    rows = None
+    source = cleaned_source(name, data_root)
+    require_columns(name, columns, source, data_root)
+    if filters and source == "partitioned":
+        df = load_partitions(name, columns, data_root, filters, tables)
+        if derived:
+            rows = partition_rows(name, data_root, filters, tables)
+    elif filters:
+        extra = [k for k in filters if columns and k not in columns]
+        df = read_source(name, source, list(columns) + extra if extra else columns, data_root)
+        mask = np.ones(len(df), dtype=bool)
+        for key, values in filters.items():
+            mask &= df[key].isin(expand_labels(values, tables.get(key, {}))).to_numpy()
+        df = df[mask].drop(columns=extra).reset_index(drop=True)
+        rows = np.flatnonzero(mask)
+    else:
+        df = read_source(name, source, columns, data_root)
+    df = label_frame(df, tables) if labels else df
+    if derived:
+        df = df.assign(**load_derived(name, derived, source, rows, data_root))
+    return df
+
+
+def cleaned_source(name, data_root=DATA_ROOT):
+    """
+    The copy load_cleaned reads a whole dataset from: column_store, parquet,
+    partitioned or json. A column store older than the copy it was built from
+    is rebuilt first.
+    """
+    from column_store import ColumnStore, build_column_store, is_current
+
+    if ColumnStore.exists(name, data_root):
+        if not is_current(name, data_root):
+            build_column_store(name, data_root)
+        return "column_store"
+    return file_source(name, data_root)
+
+
+def file_source(name, data_root=DATA_ROOT):
+    """The file copy of a dataset, parquet, partitioned or json (what a column store is built from)."""
+    from partitions import has_partitions
+
+    if os.path.exists(cleaned_path(name, data_root, "parquet")):
+        return "parquet"
+    if has_partitions(name, data_root):
+        return "partitioned"
+    return "json"
+
+
+def source_files(name, source, data_root=DATA_ROOT):
+    """The files a source copy is read from (anything computed from it depends on these)."""
+    from column_store import store_root
+    from partitions import manifest_path
+
+    files = {
+        "column_store": [os.path.join(store_root(data_root), name, "manifest.json")],
+        "parquet": [cleaned_path(name, data_root, "parquet")],
+        "partitioned": [cleaned_path(name, data_root, "partitioned"), manifest_path(name, data_root)],
+        "json": [cleaned_path(name, data_root, "json")],
+    }[source]
+    return files + [value_labels_path(name, data_root)]
+
+
+def source_signature(name, source, data_root=DATA_ROOT):
+    """Size and modification time of the files a source copy is read from."""
+    out = {}
+    for path in source_files(name, source, data_root):
+        if os.path.exists(path):
+            st = os.stat(path)
+            out[os.path.basename(path)] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def read_source(name, source, columns=None, data_root=DATA_ROOT):
+    """Reads `columns` of one source copy (see cleaned_source), unfiltered and unlabelled."""
+    from column_store import ColumnStore
+    from partitions import load_partitions
+
+    if source == "column_store":
+        return ColumnStore(name, data_root).frame(columns)
+    if source == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(cleaned_path(name, data_root, "parquet"), columns=list(columns) if columns else None)
+        return table.to_pandas()
+    if source == "partitioned":
+        return load_partitions(name, columns, data_root)
+    return read_json_frame(cleaned_path(name, data_root, "json"), columns)
+
+
+def copy_columns(name, source, data_root=DATA_ROOT):
+    """Column names of one source copy, from its schema / manifest / first record (None for an empty JSON array)."""
+    from column_store import ColumnStore
+    from partitions import load_manifest
+
+    if source == "column_store":
+        return list(ColumnStore(name, data_root).columns)
+    if source == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(cleaned_path(name, data_root, "parquet")).names
+    if source == "partitioned":
+        return load_manifest(name, data_root)["columns"]
+    from json_codec import get_codec
+
+    with open(cleaned_path(name, data_root, "json"), "r", encoding="utf-8") as fin:
+        first = next(iter(get_codec().iter_items(fin)), None)
+    return None if first is None else list(first)
+
+
+def require_columns(name, columns, source, data_root=DATA_ROOT):
+    """Raises KeyError, before any rows are read, when a source copy lacks some of `columns`."""
+    available = copy_columns(name, source, data_root) if columns else None
+    if available is None:
+        return
+    missing = [c for c in columns if c not in set(available)]
+    if missing:
+        from decoders import ROLLUP_COLUMNS
+
+        legacy = (" (the legacy */cleaning_jsons.py scripts do not write the NIC / NCO rollups)"
+                  if any(c in ROLLUP_COLUMNS for c in missing) else "")
+        raise KeyError(f"{name} ({source} copy) has no column(s) {missing}: re-run ingest.py {name}{legacy}")
+
+
+def read_json_frame(path, columns=None, codec=None):
+    """Reads a JSON array of records through json_codec.py, keeping only `columns`."""
+    from json_codec import get_codec
+
+    codec = codec or get_codec()
+    with open(path, "r", encoding="utf-8") as fin:
+        records = codec.iter_items(fin)
+        if columns:
+            columns = list(columns)
+            records = ({k: r.get(k) for k in columns} for r in records)
+        df = pd.DataFrame.from_records(records, columns=columns)
+    return df.infer_objects()
@@ -0,0 +1,534 @@
+import argparse
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from codebook import code_labels, open_codebook
+from json_codec import get_codec
+from metrics import (HOUSEHOLD_COLUMNS, HOUSEHOLD_METRICS, HOUSEHOLD_SOURCES, PERCENTILES, PERSON_COLUMNS,
+                     PERSON_METRICS, PERSON_SOURCES, RENAMES, compile_plan, dataset_columns, filter_names,
+                     percentile_label, select_describe)
+from store import (DATA_ROOT, cleaned_path, cleaned_source, expand_labels, label_frame, load_value_labels,
+                   require_columns)
+from weighted import final_weight, group_ids, group_segments
+
+# Out-of-core statewise aggregation.
+#
+# Cleaned records are read CHUNK_SIZE at a time -- Parquet row batches, the
+# partitions' byte ranges, or the JSON array through the ijson path of
+# json_codec.py -- and folded into per-group state that can be merged:
+#
+#   n, w        records and summed weight
+#   moments     per measure: count, weight, weighted mean and M2, min, max
+#   histograms  per categorical column: {category: weight}
+#   sketches    per measure: weighted quantile sketch (QuantileSketch)
+#
+# Memory is bounded by the number of groups (and categories), not rows.
+# MetricAggregator compiles a metrics.py MetricSet onto this state, so
+# `python streaming.py` writes the same statewise_plfs_weighted.json as
+# statewise_v3.py without ever holding a whole dataset.
+
+CHUNK_SIZE = 50000
+SKETCH_CAPACITY = 2000
+
+
+def _parquet_chunks(path, columns, chunk_size):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def _json_records(path, codec):
+    with open(path, "r", encoding="utf-8") as fin:
+        yield from codec.iter_items(fin)
+
+
+def _partition_records(path, parts, codec):
+    with open(path, "rb") as f:
+        for part in parts:
+            f.seek(part["offset"])
+            remaining = part["bytes"]
+            while remaining > 0:
+                line = f.readline()
+                remaining -= len(line)
+                if line.strip():
+                    yield codec.loads(line)
+
+
+def _record_chunks(records, columns, chunk_size):
+    while True:
+        batch = list(itertools.islice(records, chunk_size))
+        if not batch:
+            return
+        if columns:
+            batch = [{k: r.get(k) for k in columns} for r in batch]
+        yield pd.DataFrame.from_records(batch, columns=columns).infer_objects()
+
+
+def iter_chunks(name, columns=None, data_root=DATA_ROOT, states=None, sectors=None, chunk_size=CHUNK_SIZE,
+                codec=None, path=None):
+    """
+    A cleaned dataset as DataFrames of at most chunk_size rows, with the same
+    copy (store.cleaned_source), column selection, state / sector filters and
+    value labels as store.load_cleaned. The column store is sliced, the Parquet
+    copy read batch by batch, a partitioned copy only over the selected
+    partitions, the JSON array item by item.
+
+    `path` reads another cleaned file of the dataset instead (e.g. one
+    quarter's rows), by its extension.
+    """
+    from column_store import ColumnStore
+    from partitions import PARTITION_KEYS, load_manifest, select_partitions
+
+    codec = codec or get_codec()
+    tables = load_value_labels(name, data_root)
+    filters = {k: v for k, v in zip(PARTITION_KEYS, (states, sectors)) if v is not None}
+    extra = [k for k in filters if columns and k not in columns]
+    columns = list(columns) + extra if columns else None
+
+    source = None if path is not None else cleaned_source(name, data_root)
+    if source is not None:
+        require_columns(name, columns, source, data_root)
+    if path is not None:
+        if path.endswith(".parquet"):
+            chunks = _parquet_chunks(path, columns, chunk_size)
+        elif path.endswith(".jsonl"):
+            part = {"offset": 0, "bytes": os.path.getsize(path)}
+            chunks = _record_chunks(_partition_records(path, [part], codec), columns, chunk_size)
+        else:
+            chunks = _record_chunks(_json_records(path, codec), columns, chunk_size)
+    elif source == "column_store":
+        store = ColumnStore(name, data_root)
+        chunks = (store.frame(columns, slice(start, start + chunk_size))
+                  for start in range(0, store.n_rows, chunk_size))
+    elif source == "parquet":
+        chunks = _parquet_chunks(cleaned_path(name, data_root, "parquet"), columns, chunk_size)
+    elif source == "partitioned":
+        parts = select_partitions(load_manifest(name, data_root), filters, tables)
+        records = _partition_records(cleaned_path(name, data_root, "partitioned"), parts, codec)
+        chunks = _record_chunks(records, columns, chunk_size)
+    else:
+        chunks = _record_chunks(_json_records(cleaned_path(name, data_root, "json"), codec), columns, chunk_size)
+
+    for df in chunks:
+        if filters:
+            mask = np.ones(len(df), dtype=bool)
+            for key, values in filters.items():
+                mask &= df[key].isin(expand_labels(values, tables.get(key, {}))).to_numpy()
+            df = df[mask].drop(columns=extra).reset_index(drop=True)
+        if len(df):
+            yield label_frame(df, tables)
+
+
+class QuantileSketch:
+    """
+    Mergeable weighted quantile sketch: sorted (value, weight) centroids, at
+    most `capacity` of them. Exact (same rule as weighted.weighted_quantiles)
+    while a group has no more than `capacity` distinct values; past that,
+    neighbouring values are merged into equal-weight centroids at their
+    weighted mean, as in a t-digest.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY, values=(), weights=()):
+        self.capacity = capacity
+        self.values = np.asarray(values, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self._pending, self._n_pending = [], 0
+
+    def add(self, values, weights):
+        keep = weights > 0
+        self._pending.append((values[keep], weights[keep]))
+        self._n_pending += int(keep.sum())
+        if self._n_pending > self.capacity:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self.add(other.values, other.weights)
+        return self
+
+    def _compress(self):
+        if not self._pending:
+            return
+        values = np.concatenate([self.values] + [v for v, _ in self._pending])
+        weights = np.concatenate([self.weights] + [w for _, w in self._pending])
+        self._pending, self._n_pending = [], 0
+        values, inverse = np.unique(values, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=weights, minlength=len(values))
+        if len(values) > self.capacity:
+            cum = np.cumsum(weights)
+            bins = np.minimum(((cum - weights / 2) / cum[-1] * self.capacity).astype(np.int64), self.capacity - 1)
+            w = np.bincount(bins, weights=weights, minlength=self.capacity)
+            wx = np.bincount(bins, weights=weights * values, minlength=self.capacity)
+            used = w > 0
+            values, weights = wx[used] / w[used], w[used]
+        self.values, self.weights = values, weights
+
+    def quantiles(self, qs):
+        """First value whose cumulative weight reaches q x total, for each q."""
+        self._compress()
+        if not len(self.values):
+            return np.full(len(qs), np.nan)
+        cum = np.cumsum(self.weights)
+        idx = np.minimum(np.searchsorted(cum, np.asarray(qs, dtype=np.float64) * cum[-1]), len(cum) - 1)
+        return self.values[idx]
+
+    def to_dict(self):
+        self._compress()
+        return {"capacity": self.capacity, "values": self.values.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["capacity"], d["values"], d["weights"])
+
+
+EMPTY_MOMENTS = [0.0, 0.0, np.nan, 0.0, np.inf, -np.inf]  # count, weight, mean, M2, min, max
+
+
+def merge_moments(a, b):
+    """Combines two [count, weight, mean, M2, min, max] (Chan et al. parallel update)."""
+    count, w = a[0] + b[0], a[1] + b[1]
+    if not b[1]:
+        mean, m2 = a[2], a[3]
+    elif not a[1]:
+        mean, m2 = b[2], b[3]
+    else:
+        delta = b[2] - a[2]
+        mean = a[2] + delta * b[1] / w
+        m2 = a[3] + b[3] + delta * delta * a[1] * b[1] / w
+    return [count, w, mean, m2, min(a[4], b[4]), max(a[5], b[5])]
+
+
+class GroupState:
+    """Mergeable aggregation state of one group."""
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.n = 0
+        self.w = 0.0
+        self.moments = {}
+        self.histograms = {}
+        self.sketches = {}
+
+    def add_moments(self, name, moments):
+        self.moments[name] = merge_moments(self.moments.get(name, EMPTY_MOMENTS), moments)
+
+    def add_histogram(self, name, category, weight):
+        hist = self.histograms.setdefault(name, {})
+        hist[category] = hist.get(category, 0.0) + weight
+
+    def sketch(self, name):
+        if name not in self.sketches:
+            self.sketches[name] = QuantileSketch(self.capacity)
+        return self.sketches[name]
+
+    def merge(self, other):
+        self.n += other.n
+        self.w += other.w
+        for name, moments in other.moments.items():
+            self.add_moments(name, moments)
+        for name, hist in other.histograms.items():
+            for category, weight in hist.items():
+                self.add_histogram(name, category, weight)
+        for name, sketch in other.sketches.items():
+            self.sketch(name).merge(sketch)
+        return self
+
+    def mean(self, name):
+        return float(self.moments.get(name, EMPTY_MOMENTS)[2])
+
+    def weight(self, name):
+        """Summed weight of the rows where the measure is present."""
+        return float(self.moments.get(name, EMPTY_MOMENTS)[1])
+
+    def total(self, name):
+        count, w, mean = self.moments.get(name, EMPTY_MOMENTS)[:3]
+        return float(w * mean) if w else 0.0
+
+    def describe(self, name, percentiles=PERCENTILES):
+        """Same keys as weighted.weighted_describe ({} when the measure was never present)."""
+        count, w, mean, m2, lo, hi = self.moments.get(name, EMPTY_MOMENTS)
+        if not count:
+            return {}
+        stats = {"count": float(count), "mean": float(mean), "std": float(np.sqrt(m2 / w)) if w else np.nan,
+                 "min": float(lo)}
+        quantiles = self.sketch(name).quantiles(percentiles)
+        stats.update({f"{p * 100:g}%": float(x) for p, x in zip(percentiles, quantiles)})
+        stats["max"] = float(hi)
+        return stats
+
+    def distribution(self, name, top_n=5, roundup_dig=2):
+        """Same output as weighted.weighted_distributions for this group."""
+        hist = self.histograms.get(name, {})
+        if not hist:
+            return {}
+        total = sum(hist.values())
+        ranked = sorted(hist.items(), key=lambda kv: -kv[1])  # stable: ties keep first-seen order
+        dist = {k: round(float(x) / total, roundup_dig) for k, x in ranked[:top_n]}
+        other = sum(x for _, x in ranked[top_n:])
+        if other > 0:
+            dist["other"] = round(float(other) / total, roundup_dig)
+        return dist
+
+    def to_dict(self):
+        return {
+            "n": self.n,
+            "w": self.w,
+            "moments": {k: [float(x) for x in m] for k, m in self.moments.items()},
+            "histograms": self.histograms,
+            "sketches": {k: s.to_dict() for k, s in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d, capacity=SKETCH_CAPACITY):
+        state = cls(capacity)
+        state.n, state.w = d["n"], d["w"]
+        state.moments = {k: list(m) for k, m in d["moments"].items()}
+        state.histograms = {k: dict(h) for k, h in d["histograms"].items()}
+        state.sketches = {k: QuantileSketch.from_dict(s) for k, s in d["sketches"].items()}
+        return state
+
+
+def _column(chunk, spec):
+    return spec(chunk) if callable(spec) else chunk[spec]
+
+
+class StreamAggregator:
+    """
+    Folds chunks into {group key: GroupState}.
+
+      by          grouping column
+      measures    {name: column or function(chunk) -> values}: weighted moments
+      quantiles   measure names that also keep a QuantileSketch
+      categories  {name: column or function(chunk) -> Series}: weighted histograms
+      derived     {column: function(chunk) -> values}, added to each chunk first (unless already there)
+      where       function(chunk) -> row mask, applied next
+      weights     function(chunk) -> per-row weights (default final_weight)
+
+    Each update is a handful of grouped numpy reductions over the chunk plus
+    one small merge per group present in it.
+    """
+
+    def __init__(self, by, measures=None, quantiles=(), categories=None, where=None, weights=final_weight,
+                 capacity=SKETCH_CAPACITY, derived=None):
+        self.by = by
+        self.measures = measures or {}
+        self.quantiles = list(quantiles)
+        self.categories = categories or {}
+        self.derived = derived or {}
+        self.where = where
+        self.weights = weights
+        self.capacity = capacity
+        self.groups = {}
+
+    def update(self, chunk):
+        if self.derived:
+            chunk = chunk.copy()
+            for name, func in self.derived.items():
+                if name not in chunk:
+                    chunk[name] = func(chunk)
+        if self.where is not None:
+            chunk = chunk[np.asarray(self.where(chunk), dtype=bool)]
+        if not len(chunk):
+            return self
+        ids, keys = group_ids(chunk, self.by)
+        w = np.asarray(self.weights(chunk), dtype=np.float64)
+        sel = ids >= 0
+        ids, w, chunk = ids[sel], w[sel], chunk[sel]
+        n = len(keys)
+        states = [self.groups.setdefault(k, GroupState(self.capacity)) for k in keys]
+
+        counts = np.bincount(ids, minlength=n)
+        totals = np.bincount(ids, weights=w, minlength=n)
+        for i, state in enumerate(states):
+            state.n += int(counts[i])
+            state.w += float(totals[i])
+
+        for name, spec in self.measures.items():
+            x = pd.to_numeric(pd.Series(_column(chunk, spec)), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(x)
+            g, v, ws = ids[present], x[present], w[present]
+            count = np.bincount(g, minlength=n)
+            weight = np.bincount(g, weights=ws, minlength=n)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.bincount(g, weights=ws * v, minlength=n) / weight
+                m2 = np.bincount(g, weights=ws * (v - mean[g]) ** 2, minlength=n)
+            lo = np.full(n, np.inf)
+            hi = np.full(n, -np.inf)
+            np.minimum.at(lo, g, v)
+            np.maximum.at(hi, g, v)
+            for i in np.flatnonzero(count):
+                states[i].add_moments(name, [float(count[i]), float(weight[i]), float(mean[i]) if weight[i] else np.nan,
+                                             float(m2[i]) if weight[i] else 0.0, float(lo[i]), float(hi[i])])
+            if name in self.quantiles:
+                order = np.lexsort((v, g))
+                g, v, ws = g[order], v[order], ws[order]
+                for start, end in (group_segments(g) if len(g) else []):
+                    states[g[start]].sketch(name).add(v[start:end], ws[start:end])
+
+        for name, spec in self.categories.items():
+            c_ids, c_keys = pd.factorize(_column(chunk, spec))
+            labels = np.array([str(v) for v in c_keys], dtype=object)
+            present = c_ids >= 0
+            sums = pd.Series(w[present]).groupby([ids[present], labels[c_ids[present]]], sort=False).sum()
+            for (g, category), weight in sums.items():
+                states[g].add_histogram(name, category, float(weight))
+        return self
+
+    def merge(self, other):
+        for key, state in other.groups.items():
+            self.groups.setdefault(key, GroupState(self.capacity)).merge(state)
+        return self
+
+    def run(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def state_dict(self):
+        """The groups' state as plain JSON-able data (the spec itself is code and is not saved)."""
+        return {str(key): state.to_dict() for key, state in self.groups.items()}
+
+    def load_state(self, groups):
+        for key, d in groups.items():
+            self.groups.setdefault(key, GroupState(self.capacity)).merge(GroupState.from_dict(d, self.capacity))
+        return self
+
+
+# === statewise_v3.py, streamed ===
+
+STATEWISE_METRICS = {"household": HOUSEHOLD_METRICS, "person": PERSON_METRICS}
+
+
+def _values_name(col, names):
+    return f"{col or '*'}[{'&'.join(names)}]"
+
+
+class MetricAggregator(StreamAggregator):
+    """
+    A StreamAggregator compiled from a metrics.MetricSet: filters become
+    boolean columns computed once per chunk, each distinct (column, filter) a
+    measure (with a quantile sketch where a describe or quantile needs one)
+    or a histogram. results() gives what metrics.Plan.run() gives in memory.
+    """
+
+    def __init__(self, spec, capacity=SKETCH_CAPACITY):
+        weights = {m.weight for m in spec.flat() if m.kind != "group"}
+        if len(weights) != 1 or None in weights:
+            raise ValueError("a streamed MetricSet needs one weight column for every metric")
+        self.spec = spec
+        self.plan = compile_plan(spec)
+        weight = weights.pop()
+
+        derived = dict(spec.derived)
+        derived.update({f"filter:{name}": func for name, func in spec.filters.items()})
+
+        def mask(chunk, names):
+            return np.logical_and.reduce([chunk[f"filter:{n}"].to_numpy(dtype=bool) for n in names])
+
+        def values(col, names):
+            def func(chunk):
+                x = np.ones(len(chunk)) if col is None else pd.to_numeric(chunk[col], errors="coerce")
+                return np.where(mask(chunk, names), x, np.nan) if names else x
+            return func
+
+        def categories(col, names):
+            return lambda chunk: chunk[col].where(mask(chunk, names)) if names else chunk[col]
+
+        keys = list(self.plan.sums) + list(self.plan.describes) + list(self.plan.quantiles)
+        measures = {_values_name(col, names): values(col, names) for col, names, _ in dict.fromkeys(keys)}
+        sketched = [_values_name(col, names) for col, names, _ in list(self.plan.describes) + list(self.plan.quantiles)]
+        hists = {_values_name(col, names): categories(col, names) for col, names, *_ in self.plan.distributions}
+        where = (lambda chunk: mask(chunk, spec.where)) if spec.where else None
+        super().__init__(spec.by, measures, sketched, hists, where, lambda chunk: chunk[weight], capacity, derived)
+
+    def value(self, metric, state, codebook=None):
+        if metric.kind == "group":
+            return {part.name: self.value(part, state, codebook) for part in metric.parts}
+        name = _values_name(metric.column, metric.filter)
+        if metric.kind == "total":
+            return state.weight(name) if metric.column is None else state.total(name)
+        if metric.kind == "mean":
+            return state.mean(name) if state.weight(name) > 0 else metric.empty
+        if metric.kind == "share":
+            num = state.weight(_values_name(None, filter_names(metric.filter + metric.within)))
+            den = state.weight(_values_name(None, metric.within))
+            return num / den if den > 0 else metric.empty
+        if metric.kind == "distribution":
+            dist = state.distribution(name, metric.top_n, metric.roundup_dig)
+            return code_labels(dist, codebook[metric.codes], metric.roundup_dig) if metric.codes else dist
+        percentiles = self.plan.describes.get(metric.values_key, ())
+        if metric.kind == "describe":
+            return select_describe(state.describe(name, percentiles), metric.percentiles)
+        # quantile
+        if metric.q in percentiles:
+            return state.describe(name, percentiles).get(percentile_label(metric.q), metric.empty)
+        return float(state.sketch(name).quantiles([metric.q])[0])
+
+    def results(self, codebook=None):
+        """{group: {metric name: value}}, as metrics.Plan.run()."""
+        return {key: {m.name: self.value(m, state, codebook) for m in self.spec.metrics}
+                for key, state in self.groups.items()}
+
+
+def statewise_aggregator(level, capacity=SKETCH_CAPACITY):
+    """The streamed aggregator for the household or person statewise metrics."""
+    return MetricAggregator(STATEWISE_METRICS[level], capacity)
+
+
+def source_chunks(name, columns, sector, data_root=DATA_ROOT, chunk_size=CHUNK_SIZE, codec=None, path=None):
+    for chunk in iter_chunks(name, dataset_columns(name, columns), data_root, sectors=[sector],
+                             chunk_size=chunk_size, codec=codec, path=path):
+        yield chunk.rename(columns=RENAMES.get(name, {}))
+
+
+def stream_aggregators(data_root=DATA_ROOT, chunk_size=CHUNK_SIZE, codec=None, capacity=SKETCH_CAPACITY):
+    """{(level, sector): StreamAggregator} over the four cleaned files, one chunk in memory at a time."""
+    aggs = {}
+    for sector, name in HOUSEHOLD_SOURCES.items():
+        aggs["household", sector] = statewise_aggregator("household", capacity).run(
+            source_chunks(name, HOUSEHOLD_COLUMNS, sector, data_root, chunk_size, codec))
+    for sector, name in PERSON_SOURCES.items():
+        aggs["person", sector] = statewise_aggregator("person", capacity).run(
+            source_chunks(name, PERSON_COLUMNS, sector, data_root, chunk_size, codec))
+    return aggs
+
+
+def statewise_results(aggs, data_root=DATA_ROOT):
+    """final_state_data of statewise_v3.py from the streamed state."""
+    codebook = open_codebook(data_root)
+    parts = {key: agg.results(codebook) for key, agg in aggs.items()}
+    states = set().union(*(p.keys() for p in parts.values()))
+    return {
+        state: {
+            sector: {**parts.get(("household", sector), {}).get(state, {}),
+                     **parts.get(("person", sector), {}).get(state, {})}
+            for sector in ("urban", "rural")
+        }
+        for state in states
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statewise PLFS aggregates, streamed in bounded memory")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sketch-capacity", type=int, default=SKETCH_CAPACITY,
+                        help="centroids per quantile sketch; medians are exact up to this many distinct values")
+    parser.add_argument("--codec", help="json_codec name for JSON input (default: fastest installed)")
+    parser.add_argument("--output", default="statewise_plfs_weighted.json")
+    args = parser.parse_args()
+
+    codec = get_codec(args.codec)
+    aggs = stream_aggregators(args.data_root, args.chunk_size, codec, args.sketch_capacity)
+    with open(args.output, "w") as f:
+        json.dump(statewise_results(aggs, args.data_root), f, indent=2)
+    print(f"Done! Statewise PLFS data (weighted, filtered, streamed) written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
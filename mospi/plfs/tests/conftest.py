@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# the PLFS scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_data_root  # noqa: E402
+
+
+@pytest.fixture
+def data_root(tmp_path):
+    """A small synthetic data root: the four cleaned JSON files and the mapping files."""
+    return build_data_root(str(tmp_path))
@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+
+from cube import STATUS_GROUPS
+
+# Synthetic cleaned PLFS files for the tests: the columns ingest.py writes, with
+# households of hhv1 / hhrv and their members in perv1 / perrv, and the mapping
+# files codebook.py compiles.
+
+STATES = ["Kerala", "Bihar", "Gujarat"]
+SECTORS = ["rural", "urban"]
+STATUSES = list(STATUS_GROUPS) + ["status not recorded"]  # the last one groups as "unknown"
+SURVEYED = "household surveyed: original"
+RESPONSE = "co-operative and capable"
+NIC_DIVISIONS = ["01", "10", "41", "47", "85"]
+NCO_GROUPS = ["111", "251", "522", "611", "931"]
+# current weekly status codes (cube.STATUS_CODES), 0 for a code outside the list
+WEEKLY_STATUSES = [11.0, 31.0, 51.0, 62.0, 81.0, 91.0, 92.0, 99.0, 0.0]
+
+EXPENDITURE = {"hhv1": "Household'S Usual Consumer Expenditure In A Month (Rs.)",
+               "hhrv": "Household'S Usual Consumer Expenditure In A Month(Rs.)"}
+REGULAR_WAGE = {"perv1": "Earnings For Regular Salaried/Wage Activity",
+                "perrv": "Earnings For Regular Salarid/Wage Activity"}
+FSU = {"household": "First Stage Unit(FSU):", "person": "First Stage Unit (FSU)"}
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def weights(rng):
+    nss = float(rng.integers(1, 3))
+    return {
+        "Sub-sample": float(rng.integers(1, 3)),
+        "Sub-sample wise Multiplier": float(rng.integers(500, 5000)),
+        "Ns count for sector x stratum x substratum x sub-sample": nss,
+        "Ns count for sector x stratum x substratum": 2.0,
+        "Count of contributing State x Sector x Stratum x SubStratum in 4 Quarters": float(rng.integers(1, 5)),
+    }
+
+
+def households(rng, name, n):
+    out = []
+    for i in range(n):
+        state, sector = STATES[i % len(STATES)], SECTORS[(i // len(STATES)) % 2]
+        out.append({
+            "State/Ut Code": state, "Sector": sector,
+            "District Name": f"{state}-D{i % 4}", "NSS-Region": f"Region {i % 2 + 1}",
+            "Quarter": f"Quarter {i // 6 % 2 + 1}", "Visit": "Visit 1" if name == "hhv1" else "Visit 2",
+            # household numbers restart in each hamlet group: two households per FSU and number
+            FSU["household"]: float(10000 + i // 6), "Hamlet Group/Sub-Block No.": float(i // 3 % 2 + 1),
+            "Second Stage Stratum No.": 1.0, "Sample Household Number": float(i % 3 + 1),
+            **weights(rng),
+            "Household Size": float(rng.integers(1, 7)),
+            "Household Type": str(rng.choice(["self-employed", "regular wage", "casual labour"])),
+            "Religion": str(rng.choice(["hinduism", "islam", "christianity"])),
+            "Social Group": str(rng.choice(["scheduled tribe", "scheduled caste", "others"])),
+            "Survey Code": SURVEYED if rng.random() < .9 else "casualty",
+            "Response Code": RESPONSE if rng.random() < .9 else "busy",
+            EXPENDITURE[name]: float(rng.integers(2000, 40000)),
+        })
+    return out
+
+
+def persons(rng, name, homes):
+    out = []
+    for home in homes:
+        for p in range(int(rng.integers(1, 5))):
+            nic, nco = str(rng.choice(NIC_DIVISIONS)), str(rng.choice(NCO_GROUPS))
+            out.append({
+                **{k: home[k] for k in ("State/Ut Code", "Sector", "District Name", "NSS-Region", "Quarter", "Visit",
+                                        "Hamlet Group/Sub-Block No.", "Second Stage Stratum No.",
+                                        "Sample Household Number")},
+                FSU["person"]: home[FSU["household"]], "Person Serial No.": float(p + 1),
+                **weights(rng),
+                "Gender": str(rng.choice(["male", "female"])),
+                "Age": float(rng.integers(0, 90)),
+                "Marital Status": str(rng.choice(["never married", "currently married"])),
+                "General Educaion Level": str(rng.choice(["edu 1", "edu 2", "edu 3"])),
+                "Technical Educaion Level": "no technical education",
+                "No. of years in Formal Education": float(rng.integers(0, 16)),
+                "Whether received any Vocational/Technical Training": str(rng.choice(["yes, formal", "no"])),
+                "Status Code": str(rng.choice(STATUSES)),
+                "Current Weekly Status (CWS)": float(rng.choice(WEEKLY_STATUSES)),
+                "NIC Division": float(nic), "NIC Group": float(nic + "1"), "NIC Section": "A",
+                "NCO Division": float(nco[0]), "NCO Sub-division": float(nco[:2]), "NCO Group": float(nco),
+                REGULAR_WAGE[name]: float(rng.integers(3000, 50000)) if rng.random() < .4 else None,
+                "Earnings For Self Employed": float(rng.integers(1000, 30000)) if rng.random() < .3 else None,
+            })
+    return out
+
+
+def build_data_root(root, n_households=48, seed=0):
+    rng = np.random.default_rng(seed)
+    for hh, per in (("hhv1", "perv1"), ("hhrv", "perrv")):
+        homes = households(rng, hh, n_households)
+        write_json(os.path.join(root, hh, f"{hh}_cleaned.json"), homes)
+        write_json(os.path.join(root, per, f"{per}_cleaned.json"), persons(rng, per, homes))
+    write_json(os.path.join(root, "district_mapping.json"),
+               {s.upper(): {f"{d:02d}": f"{s}-D{d}" for d in range(4)} for s in STATES})
+    write_json(os.path.join(root, "nss_regions.json"), {"01": "Region 1", "02": "Region 2"})
+    write_json(os.path.join(root, "industry_codes.json"), {c: f"industry {c}" for c in NIC_DIVISIONS})
+    write_json(os.path.join(root, "occupation_codes.json"), {c: f"occupation {c}" for c in NCO_GROUPS})
+    return root
+
+
+def assert_close(a, b, rel=1e-9, path=""):
+    """Nested results equal up to floating-point summation order."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        assert set(a) == set(b), f"{path}: keys {sorted(set(a) ^ set(b))}"
+        for k in a:
+            assert_close(a[k], b[k], rel, f"{path}/{k}")
+    elif isinstance(a, float) and isinstance(b, float):
+        assert (np.isnan(a) and np.isnan(b)) or np.isclose(a, b, rtol=rel, atol=1e-12), f"{path}: {a} != {b}"
+    else:
+        assert a == b, f"{path}: {a!r} != {b!r}"
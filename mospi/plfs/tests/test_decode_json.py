@@ -0,0 +1,36 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+PLFS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(f"{name}_decode_json", os.path.join(PLFS_DIR, name, "decode_json.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("name", ["perv1", "perrv"])
+def test_ranges_split_on_records_not_on_braces_in_strings(name, tmp_path):
+    script = load_script(name)
+    records = [{"State/Ut Code": "Kerala", "Age": float(i), "Remarks": "moved },{ back" if i % 2 else "},{}"}
+               for i in range(200)]
+    path = str(tmp_path / "rows.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n" + ",\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n]")
+
+    ranges = script.split_ranges(path, range_bytes=97)
+    assert len(ranges) > 10
+    script.initial_file_path = path
+    script.set_mappings({}, {}, {}, {})
+    decoded = []
+    for byte_range in ranges:
+        n, text = script.decode_range(byte_range)
+        rows = json.loads("[" + text + "]")
+        assert n == len(rows)
+        decoded += rows
+    assert decoded == records
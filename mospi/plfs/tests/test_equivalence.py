@@ -0,0 +1,67 @@
+import json
+
+import pandas as pd
+
+import incremental
+from codebook import open_codebook
+from metrics import (HOUSEHOLD_COLUMNS, HOUSEHOLD_METRICS, HOUSEHOLD_SOURCES, PERSON_COLUMNS, PERSON_METRICS,
+                     PERSON_SOURCES, RENAMES, WEIGHT_COLS, compile_plan, dataset_columns)
+from parallel import parallel_aggregators
+from partitions import write_partitioned
+from store import cleaned_path, cleaned_source, load_cleaned, write_parquet
+from streaming import stream_aggregators, statewise_results
+from synthetic import assert_close
+
+CHUNK = 7
+KEEP = ["State/Ut Code", "Sector", "Quarter", "Visit"] + WEIGHT_COLS
+
+
+def read_records(name, data_root):
+    with open(cleaned_path(name, data_root, "json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def null_leading_chunk(records):
+    """Every measured column null over the first CHUNK records (one whole chunk)."""
+    for record in records[:CHUNK]:
+        record.update({k: None for k in record if k not in KEEP})
+    return records
+
+
+def frames(records, size):
+    return [pd.DataFrame(records[i:i + size]) for i in range(0, len(records), size)]
+
+
+def in_memory(data_root):
+    """statewise_v3.py's final_state_data: metrics.Plan.run over whole frames."""
+    codebook = open_codebook(data_root)
+    parts = {}
+    for level, sources, columns, spec in (("household", HOUSEHOLD_SOURCES, HOUSEHOLD_COLUMNS, HOUSEHOLD_METRICS),
+                                          ("person", PERSON_SOURCES, PERSON_COLUMNS, PERSON_METRICS)):
+        for sector, name in sources.items():
+            df = load_cleaned(name, dataset_columns(name, columns), data_root, sectors=[sector])
+            parts[level, sector] = compile_plan(spec).run(df.rename(columns=RENAMES.get(name, {})), codebook)
+    states = set().union(*parts.values())
+    return {state: {sector: {**parts.get(("household", sector), {}).get(state, {}),
+                             **parts.get(("person", sector), {}).get(state, {})}
+                    for sector in ("urban", "rural")}
+            for state in states}
+
+
+def test_every_engine_gives_the_in_memory_results(data_root):
+    # perv1: a Parquet copy written in chunks, the first all null
+    write_parquet(frames(null_leading_chunk(read_records("perv1", data_root)), CHUNK),
+                  cleaned_path("perv1", data_root, "parquet"))
+    # hhv1: a partitioned copy written from several frames
+    write_partitioned(frames(read_records("hhv1", data_root), 10), cleaned_path("hhv1", data_root, "partitioned"))
+    # perrv: the JSON copy, also with an all-null first chunk
+    records = null_leading_chunk(read_records("perrv", data_root))
+    with open(cleaned_path("perrv", data_root, "json"), "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    assert [cleaned_source(n, data_root) for n in ("perv1", "hhv1", "perrv")] == ["parquet", "partitioned", "json"]
+
+    expected = in_memory(data_root)
+    assert_close(statewise_results(stream_aggregators(data_root, chunk_size=CHUNK), data_root), expected)
+    assert_close(statewise_results(parallel_aggregators(data_root, workers=2), data_root), expected)
+    incremental.update(data_root=data_root, chunk_size=CHUNK)
+    assert_close(incremental.report(data_root), expected)
@@ -0,0 +1,49 @@
+import json
+import os
+
+import incremental
+from codebook import open_codebook
+from store import cleaned_path
+from streaming import stream_aggregators, statewise_results
+from synthetic import assert_close
+
+
+def test_update_reads_only_changed_files_and_refreshes_their_periods(data_root):
+    first = incremental.update(data_root=data_root)
+    assert all(first.values())
+    assert incremental.update(data_root=data_root) == {name: {} for name in incremental.SOURCES}
+
+    path = cleaned_path("perv1", data_root, "json")
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    for record in records:
+        if record["Quarter"] == "Quarter 1":
+            record["Sub-sample wise Multiplier"] *= 3
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+
+    again = incremental.update(data_root=data_root)
+    assert set(again["perv1"]) == {period for period in first["perv1"] if period.startswith("Quarter 1")}
+    assert not any(periods for name, periods in again.items() if name != "perv1")
+    assert_close(incremental.report(data_root), statewise_results(stream_aggregators(data_root), data_root))
+
+
+def test_update_drops_periods_gone_from_the_file_and_keeps_unchanged_ones(data_root):
+    first = incremental.update(["perv1"], data_root)
+    stored = incremental.stored_periods("perv1", data_root)
+    assert any(p.startswith("Quarter 2") for p in stored)
+    kept = {period: os.path.getmtime(path) for period, path in stored.items() if period.startswith("Quarter 1")}
+
+    path = cleaned_path("perv1", data_root, "json")
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([r for r in records if r["Quarter"] != "Quarter 2"], f)
+
+    assert incremental.update(["perv1"], data_root) == {"perv1": {}}
+    stored = incremental.stored_periods("perv1", data_root)
+    assert set(stored) == set(kept) and set(first["perv1"]) > set(stored)
+    assert incremental.update(["perv1"], data_root) == {"perv1": {}}
+    codebook = open_codebook(data_root)
+    assert_close(incremental.merged("perv1", data_root).results(codebook),
+                 stream_aggregators(data_root)[incremental.SOURCES["perv1"]].results(codebook))
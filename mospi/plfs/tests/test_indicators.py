@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from codebook import open_codebook
+from cube import EMPLOYED
+from derived import cached_columns
+from indicators import labour_indicators
+from metrics import PERSON_COLUMNS, PERSON_METRICS, compile_plan
+from store import load_cleaned
+
+
+def test_unknown_status_is_left_out_of_lfpr_and_wpr():
+    df = pd.DataFrame({
+        "State/Ut Code": ["Kerala"] * 4,
+        "status_group": ["regular_wage", "unemployed", "not_in_labour_force", "unknown"],
+        "final_weight": [1.0, 1.0, 2.0, 4.0],
+        "Age": [30.0] * 4,
+    })
+    row = labour_indicators(df).loc["Kerala"]
+    assert row["unknown_status"] == 4.0 and row["persons"] == 8.0
+    assert np.isclose(row["wpr"], 25.0) and np.isclose(row["lfpr"], 50.0) and np.isclose(row["ur"], 50.0)
+
+
+def test_person_metrics_publish_unknown_status_weight(data_root):
+    df = load_cleaned("perv1", cached_columns(PERSON_COLUMNS), data_root)
+    results = compile_plan(PERSON_METRICS).run(df, open_codebook(data_root))
+    df = df.assign(w=PERSON_METRICS.derived["final_weight"](df))
+    status = df["status_group"].astype(object)
+    assert (status == "unknown").any()
+    for state, values in results.items():
+        rows = df[df["State/Ut Code"] == state]
+        known = rows["w"][status[rows.index] != "unknown"].sum()
+        assert np.isclose(values["unknown_status_population"], rows["w"][status[rows.index] == "unknown"].sum())
+        assert np.isclose(values["wpr"], rows["w"][status[rows.index].isin(EMPLOYED)].sum() / known)
@@ -0,0 +1,21 @@
+import io
+
+import pytest
+
+from json_codec import available_codecs, get_codec
+
+
+@pytest.mark.parametrize("name", available_codecs())
+def test_iter_items_reads_text_bytes_and_string_streams(name, tmp_path):
+    codec = get_codec(name)
+    items = [{"Age": 31.5, "Sector": "rural"}, {"Age": None, "Sector": "urbān"}]
+    path = tmp_path / "items.json"
+    with open(path, "w", encoding="utf-8") as f:
+        codec.dump_array(items, f)
+    text = path.read_text(encoding="utf-8")
+
+    with open(path, "r", encoding="utf-8") as f:
+        assert list(codec.iter_items(f)) == items
+    with open(path, "rb") as f:
+        assert list(codec.iter_items(f)) == items
+    assert list(codec.iter_items(io.StringIO(text))) == items
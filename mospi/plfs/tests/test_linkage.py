@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from linkage import FSU_COLUMNS, HOUSEHOLD_ID_KEYS, link, load_linked
+
+
+def test_households_sharing_fsu_and_number_stay_apart():
+    households = pd.DataFrame({
+        FSU_COLUMNS["household"]: [10001.0, 10001.0],
+        "Hamlet Group/Sub-Block No.": [1.0, 2.0],
+        "Second Stage Stratum No.": [1.0, 1.0],
+        "Sample Household Number": [4.0, 4.0],
+        "Quarter": ["Quarter 1"] * 2, "Visit": ["Visit 1"] * 2,
+    })
+    persons = households.rename(columns={FSU_COLUMNS["household"]: FSU_COLUMNS["person"]}).iloc[[1, 0, 1]]
+    assert list(link(persons.reset_index(drop=True), households)) == [1, 0, 1]
+
+
+def test_load_linked_matches_the_full_household_id(data_root):
+    persons, households = load_linked("first", data_root)
+    linked = persons[persons["household_row"] >= 0]
+    assert len(linked)
+    home = households.iloc[linked["household_row"].to_numpy()]
+    for col in HOUSEHOLD_ID_KEYS + ["Quarter", "Visit"]:
+        assert np.array_equal(home[col].to_numpy(), linked[col].to_numpy())
+    assert np.array_equal(home[FSU_COLUMNS["household"]].to_numpy(), linked[FSU_COLUMNS["person"]].to_numpy())
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+from parallel import SharedFrame, attach
+
+
+def test_shared_frame_moves_the_columns_in_order():
+    df = pd.DataFrame({"State/Ut Code": pd.Categorical(["Bihar", "Kerala", "Bihar"]), "Age": [30.0, None, 7.0]})
+    order = np.array([0, 2, 1])
+    expected = df.iloc[order].reset_index(drop=True)
+    shared = SharedFrame(df, order)
+    try:
+        assert df.empty
+        blocks = {meta["block"]: shared_memory.SharedMemory(name=meta["block"])
+                  for meta in shared.spec["columns"].values()}
+        view = attach(shared.spec, blocks, 1, 3)
+        assert list(view["State/Ut Code"].astype(str)) == ["Bihar", "Kerala"]
+        assert np.array_equal(view["Age"].to_numpy(), expected["Age"].to_numpy()[1:3], equal_nan=True)
+        del view
+        for block in blocks.values():
+            block.close()
+    finally:
+        shared.close()
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from column_store import build_column_store
+from ingest import DATASETS
+from pipeline import Runner, build_stages
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True}, {"parallel": True}])
+def test_statewise_fingerprint_covers_the_metric_definitions(tmp_path, mode):
+    stages = build_stages(str(tmp_path), **mode)
+    code = {os.path.basename(p) for p in stages["statewise"].code}
+    assert {"metrics.py", "derived.py", "store.py", "column_store.py"} <= code
+    command = stages["statewise"].command
+    assert command[command.index("--data-root") + 1] == str(tmp_path)
+    assert "derived.py" in {os.path.basename(p) for p in stages["cube"].code}
+
+
+def test_store_stages_stay_current_after_building_each_other(data_root, tmp_path):
+    stages = build_stages(data_root)
+    runner = Runner(stages, str(tmp_path / "state.json"))
+    recorded = {}
+    for name in DATASETS:
+        # what a run records for the stage, just before running it
+        recorded[name] = runner.fingerprint(stages[f"store:{name}"])
+        build_column_store(name, data_root)
+    for name in DATASETS:
+        assert stages[f"store:{name}"].deps == [f"ingest:{name}"]
+        assert runner.fingerprint(stages[f"store:{name}"]) == recorded[name]
@@ -0,0 +1,125 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from column_store import build_column_store, is_current
+from store import cleaned_path, cleaned_source, load_cleaned, write_parquet
+from streaming import iter_chunks
+
+
+def test_column_store_is_rebuilt_when_its_source_changes(data_root):
+    build_column_store("hhv1", data_root)
+    assert cleaned_source("hhv1", data_root) == "column_store" and is_current("hhv1", data_root)
+
+    path = cleaned_path("hhv1", data_root, "json")
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    for record in records:
+        record["Religion"] = "zoroastrianism"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records[:-1], f)
+    assert not is_current("hhv1", data_root)
+
+    df = load_cleaned("hhv1", ["Religion"], data_root)
+    assert len(df) == len(records) - 1 and set(df["Religion"]) == {"zoroastrianism"}
+    assert is_current("hhv1", data_root)
+
+
+def test_column_store_without_its_source_is_kept(data_root):
+    build_column_store("hhv1", data_root)
+    n = len(load_cleaned("hhv1", ["Religion"], data_root))
+    os.remove(cleaned_path("hhv1", data_root, "json"))
+    assert is_current("hhv1", data_root)
+    assert len(load_cleaned("hhv1", ["Religion"], data_root)) == n
+
+
+def test_filtered_loads_read_the_same_copy_as_unfiltered_ones(data_root, monkeypatch):
+    import partitions
+
+    frame = load_cleaned("hhv1", data_root=data_root)
+    partitions.write_partitioned([frame], cleaned_path("hhv1", data_root, "partitioned"))
+    build_column_store("hhv1", data_root)
+    assert cleaned_source("hhv1", data_root) == "column_store"
+
+    def no_partitions(*args, **kwargs):
+        raise AssertionError("read the partitioned copy instead of the column store")
+
+    monkeypatch.setattr(partitions, "load_partitions", no_partitions)
+    df = load_cleaned("hhv1", ["Religion"], data_root, states=["Kerala"], sectors=["urban"])
+    everything = load_cleaned("hhv1", ["State/Ut Code", "Sector", "Religion"], data_root)
+    kept = everything[(everything["State/Ut Code"] == "Kerala") & (everything["Sector"] == "urban")]
+    assert len(df) and list(df["Religion"].astype(str)) == list(kept["Religion"].astype(str))
+
+
+def test_legacy_copy_without_rollups_fails_before_reading(data_root):
+    path = cleaned_path("perv1", data_root, "json")
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{k: v for k, v in r.items() if k not in ("NIC Division", "NCO Group")} for r in records], f)
+    for read in (lambda: load_cleaned("perv1", ["Age", "NIC Division"], data_root),
+                 lambda: next(iter_chunks("perv1", ["Age", "NCO Group"], data_root))):
+        with pytest.raises(KeyError, match="re-run ingest.py perv1"):
+            read()
+
+
+def test_parquet_types_a_column_from_its_first_non_null_chunk(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    frames = [pd.DataFrame({"Age": [None, None], "Sector": ["rural", None]}),
+              pd.DataFrame({"Age": [31.0, None], "Sector": ["urban", "rural"]}),
+              pd.DataFrame({"Age": [None, 7.0], "Sector": [None, None]})]
+    path = str(tmp_path / "people.parquet")
+    assert write_parquet(iter(frames), path) == 6
+    schema = pq.read_schema(path)
+    assert schema.field("Age").type == pa.float64() and pa.types.is_dictionary(schema.field("Sector").type)
+    assert pq.read_table(path).column("Age").to_pylist() == [None, None, 31.0, None, None, 7.0]
+    assert os.listdir(tmp_path) == ["people.parquet"]
+
+
+def test_parquet_refuses_text_in_a_numeric_column(tmp_path):
+    frames = [pd.DataFrame({"Age": [31.0]}), pd.DataFrame({"Age": ["thirty"]})]
+    path = str(tmp_path / "people.parquet")
+    with pytest.raises(ValueError, match="thirty"):
+        write_parquet(iter(frames), path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_chunks_come_from_the_column_store_like_whole_loads(data_root, monkeypatch):
+    import streaming
+
+    build_column_store("hhv1", data_root)
+
+    def no_files(*args, **kwargs):
+        raise AssertionError("read a file copy instead of the column store")
+
+    monkeypatch.setattr(streaming, "_json_records", no_files)
+    monkeypatch.setattr(streaming, "_parquet_chunks", no_files)
+    chunks = list(iter_chunks("hhv1", ["State/Ut Code", "Religion"], data_root, chunk_size=5))
+    whole = load_cleaned("hhv1", ["State/Ut Code", "Religion"], data_root)
+    assert len(chunks) > 1
+    streamed = pd.concat(chunks, ignore_index=True)
+    for col in whole.columns:
+        assert list(streamed[col].astype(str)) == list(whole[col].astype(str))
+
+
+def test_partitions_keep_the_file_wide_column_types(tmp_path):
+    from partitions import load_manifest, load_partitions, write_partitioned
+
+    frames = [pd.DataFrame({"State/Ut Code": ["Kerala", "Bihar"], "Sector": ["rural", "rural"],
+                            "Age": [None, 31], "Note": [None, "moved"]}),
+              pd.DataFrame({"State/Ut Code": ["Bihar"], "Sector": ["rural"], "Age": [7], "Note": [None]})]
+    path = cleaned_path("perv1", str(tmp_path), "partitioned")
+    os.makedirs(os.path.dirname(path))
+    write_partitioned(iter(frames), path)
+    assert load_manifest("perv1", str(tmp_path))["schema"]["Age"] == "numeric"
+
+    dtypes = []
+    for states in (["Kerala"], ["Bihar"], None):
+        filters = {"State/Ut Code": states} if states else None
+        df = load_partitions("perv1", ["Age", "Note"], str(tmp_path), filters)
+        dtypes.append(tuple(df.dtypes))
+    assert dtypes[0][0] == "float64" and dtypes[0] == dtypes[1] == dtypes[2]
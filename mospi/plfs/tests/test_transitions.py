@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived import status_group
+from transitions import (LABOUR_STATUSES, PERSON_KEYS, UNKNOWN, WEEKLY_STATUS, transition_matrices,
+                         transition_weights)
+from weighted import final_weight
+
+
+@pytest.mark.parametrize("value, group", [
+    ("worked as regular salaried/wage employee", "regular_wage"),
+    ("had work in h.h. enterprise but did not work due to sickness", "self_employed"),
+    (51, "casual_labour"), (81.0, "unemployed"), ("99", "not_in_labour_force"),
+    (0, "unknown"), ("no such status", "unknown"), (None, "unknown"),
+])
+def test_status_group_of_labels_and_codes(value, group):
+    assert status_group(value) == group
+
+
+def test_weekly_status_on_both_visits_with_unknown_weight_per_cell(data_root):
+    first, revisit = (pd.read_json(os.path.join(data_root, name, f"{name}_cleaned.json"))
+                      for name in ("perv1", "perrv"))
+    pairs = revisit.assign(weight=final_weight(revisit)).merge(first, on=PERSON_KEYS, suffixes=("", "_first"))
+    unknown = (pairs[WEEKLY_STATUS] == 0) | (pairs[f"{WEEKLY_STATUS}_first"] == 0)
+    assert unknown.any() and (~unknown).any()
+
+    weights, counts, labels, totals = transition_weights(data_root, chunk_size=7, n_buckets=4)
+    assert totals["paired"] == len(pairs)
+    assert totals["unknown_status"] == int(unknown.sum())
+    assert weights[..., UNKNOWN, :UNKNOWN].sum() == weights[..., :UNKNOWN, UNKNOWN].sum() == 0
+
+    matrices = transition_matrices(weights, counts, labels)
+    cells = [cell for sectors in matrices.values() for visits in sectors.values() for cell in visits.values()]
+    assert sum(c["unknown_status"]["pairs"] for c in cells) == int(unknown.sum())
+    assert np.isclose(sum(c["unknown_status"]["weight"] for c in cells), pairs["weight"][unknown].sum())
+    assert np.isclose(sum(c["weight"] for c in cells), pairs["weight"][~unknown].sum())
+    for cell in cells:
+        assert set(cell["matrix"]) == set(LABOUR_STATUSES)
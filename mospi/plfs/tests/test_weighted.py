@@ -0,0 +1,14 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from weighted import weighted_distributions
+
+
+@pytest.mark.parametrize("n_groups", [1, 40])  # dense (group, category) table / np.unique path
+def test_tied_categories_keep_first_seen_order(n_groups):
+    rng = np.random.default_rng(0)
+    seen = {g: [f"{g}-{v}" for v in rng.permutation(list("abcdefgh"))] for g in range(n_groups)}
+    df = pd.DataFrame([{"g": g, "v": v, "w": 1.0} for _ in range(2) for g, values in seen.items() for v in values])
+    out = weighted_distributions(df, "g", "v", "w", top_n=8)
+    assert {g: list(shares) for g, shares in out.items()} == seen
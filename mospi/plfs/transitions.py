@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from cube import EMPLOYED
+from derived import status_groups
+from store import DATA_ROOT
+from streaming import CHUNK_SIZE, iter_chunks
+from weighted import WEIGHT_COLS, final_weight
+
+# Labour-status transitions of the urban panel, first visit -> revisit.
+#
+# A person of perv1 comes back in perrv under the same FSU, hamlet group /
+# sub-block, second-stage stratum, Sample Household Number and Person Serial
+# No. (ingest.py keeps them), once per revisit. The
+# two files are paired with a streaming sort-merge that never holds either one:
+#
+#   1. each file is read CHUNK_SIZE rows at a time (streaming.iter_chunks) and
+#      cut down to fixed-width records -- packed int64 person key, state /
+#      sector / visit / status codes, final weight -- which are spilled to
+#      disk in N_BUCKETS files by key, so a person's first visit and revisits
+#      land in the same bucket pair;
+#   2. bucket by bucket, the first-visit records are sorted by key and every
+#      revisit record finds its first visit with a binary search; the pairs'
+#      weights are summed into (state, sector, visit, from, to) cells.
+#
+# Memory is one chunk, then one bucket pair. State and sector are the first
+# visit's, the weight the revisit record's. Both sides use the current weekly
+# status (WEEKLY_STATUS, the same question on every visit; perrv's "Status Code"
+# is the day-7 activity and perv1's the usual principal status, which do not
+# compare), grouped by label or code (derived.status_group) and collapsed to
+# LABOUR_STATUSES. Pairs whose status is neither are kept in an extra "unknown"
+# slot, so each cell reports the weight it lost to them.
+#
+#   python transitions.py --output panel_transitions.json
+
+SOURCES = {"first": "perv1", "revisit": "perrv"}
+PERSON_KEYS = ["First Stage Unit (FSU)", "Hamlet Group/Sub-Block No.", "Second Stage Stratum No.",
+               "Sample Household Number", "Person Serial No."]
+# values each key part may take below the FSU; the FSU takes the rest of the int64
+KEY_RADIX = {"Hamlet Group/Sub-Block No.": 10, "Second Stage Stratum No.": 10, "Sample Household Number": 1000,
+             "Person Serial No.": 1000}
+WEEKLY_STATUS = "Current Weekly Status (CWS)"  # ingest.WEEKLY_STATUS_KEYS
+COLUMNS = ["State/Ut Code", "Sector", "Visit", WEEKLY_STATUS] + PERSON_KEYS + WEIGHT_COLS
+N_BUCKETS = 64
+
+LABOUR_STATUSES = ["employed", "unemployed", "not_in_labour_force"]
+UNKNOWN = len(LABOUR_STATUSES)  # status slot of the pairs with an unknown status on either side
+RECORD = np.dtype([("key", np.int64), ("state", np.int32), ("sector", np.int32), ("visit", np.int32),
+                   ("status", np.int8), ("weight", np.float64)])
+
+
+def labour_status(df):
+    """Index into LABOUR_STATUSES per row, UNKNOWN for an unknown status."""
+    group = status_groups(df, WEEKLY_STATUS)
+    codes = np.full(len(df), UNKNOWN, dtype=np.int8)
+    codes[group.isin(EMPLOYED).to_numpy()] = 0
+    codes[(group == "unemployed").to_numpy()] = 1
+    codes[(group == "not_in_labour_force").to_numpy()] = 2
+    return codes
+
+
+def person_keys(df):
+    """Packed int64 person key per row, -1 where a part is missing, fractional or out of range."""
+    key = np.zeros(len(df))
+    valid = np.ones(len(df), dtype=bool)
+    for col in PERSON_KEYS:
+        radix = KEY_RADIX.get(col, 1)
+        part = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        valid &= np.isfinite(part) & (part >= 0) & (part == np.floor(part))
+        if col in KEY_RADIX:
+            valid &= part < radix
+        key = key * radix + np.where(valid, part, 0)
+    valid &= key < 2 ** 53  # exact in float64
+    return np.where(valid, key, -1).astype(np.int64)
+
+
+class Vocabulary:
+    """Stable integer codes for the labels seen across chunks."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, series):
+        ids, uniques = pd.factorize(series)
+        lookup = np.array([self.codes.setdefault(u, len(self.codes)) for u in uniques] + [-1], dtype=np.int32)
+        return lookup[ids]  # id -1 (missing) picks the last slot
+
+    @property
+    def labels(self):
+        return list(self.codes)
+
+
+def spill(name, folder, vocab, data_root=DATA_ROOT, chunk_size=CHUNK_SIZE, n_buckets=N_BUCKETS):
+    """Writes a dataset's records into <folder>/<name>_<bucket>.bin by key; returns (records, without key)."""
+    files = [open(os.path.join(folder, f"{name}_{b}.bin"), "wb") for b in range(n_buckets)]
+    rows = dropped = 0
+    try:
+        for chunk in iter_chunks(name, COLUMNS, data_root, chunk_size=chunk_size):
+            records = np.empty(len(chunk), dtype=RECORD)
+            records["key"] = person_keys(chunk)
+            for field, col in (("state", "State/Ut Code"), ("sector", "Sector"), ("visit", "Visit")):
+                records[field] = vocab[field].encode(chunk[col])
+            records["status"] = labour_status(chunk)
+            records["weight"] = final_weight(chunk)
+            keep = records["key"] >= 0
+            rows += len(records)
+            dropped += int((~keep).sum())
+            records = records[keep]
+            bucket = records["key"] % n_buckets
+            order = np.argsort(bucket, kind="stable")
+            bounds = np.searchsorted(bucket[order], np.arange(n_buckets + 1))
+            for b in range(n_buckets):
+                if bounds[b + 1] > bounds[b]:
+                    files[b].write(records[order[bounds[b]:bounds[b + 1]]].tobytes())
+    finally:
+        for f in files:
+            f.close()
+    return rows, dropped
+
+
+def merge_bucket(first, revisit):
+    """Position in `first` of each revisit record's first visit (-1 when none); `first` keys must be unique."""
+    order = np.argsort(first["key"], kind="stable")
+    keys = first["key"][order]
+    duplicated = keys[1:] == keys[:-1]
+    if duplicated.any():
+        raise ValueError(f"{int(duplicated.sum()):,} first-visit person key(s) occur more than once; "
+                         f"({', '.join(PERSON_KEYS)}) does not identify a person")
+    if not len(keys):
+        return np.full(len(revisit), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(keys, revisit["key"]), len(keys) - 1)
+    return np.where(keys[pos] == revisit["key"], order[pos], -1)
+
+
+def transition_weights(data_root=DATA_ROOT, chunk_size=CHUNK_SIZE, n_buckets=N_BUCKETS, workdir=None):
+    """
+    (weights, pairs, vocab, counts): weights and pair counts per
+    (state, sector, visit, from status, to status), with status UNKNOWN for
+    either side unknown, the labels behind those codes, and row / pairing counts.
+    """
+    vocab = {field: Vocabulary() for field in ("state", "sector", "visit")}
+    folder = tempfile.mkdtemp(prefix="plfs_panel_", dir=workdir)
+    try:
+        counts = {}
+        for side, name in SOURCES.items():
+            counts[f"{side}_rows"], counts[f"{side}_without_key"] = spill(name, folder, vocab, data_root, chunk_size,
+                                                                          n_buckets)
+        k = len(LABOUR_STATUSES) + 1
+        shape = (len(vocab["state"].labels), len(vocab["sector"].labels), len(vocab["visit"].labels), k, k)
+        size = int(np.prod(shape))
+        weights, pairs = np.zeros(size), np.zeros(size, dtype=np.int64)
+        counts["paired"] = counts["unknown_status"] = counts["unplaced"] = 0
+        for b in range(n_buckets):
+            first, revisit = (np.fromfile(os.path.join(folder, f"{name}_{b}.bin"), dtype=RECORD)
+                              for name in SOURCES.values())
+            match = merge_bucket(first, revisit)
+            paired = match >= 0
+            origin, revisit = first[match[paired]], revisit[paired]
+            counts["paired"] += int(paired.sum())
+            placed = (origin["state"] >= 0) & (origin["sector"] >= 0) & (revisit["visit"] >= 0)
+            counts["unplaced"] += int((~placed).sum())
+            origin, revisit = origin[placed], revisit[placed]
+            unknown = (origin["status"] == UNKNOWN) | (revisit["status"] == UNKNOWN)
+            counts["unknown_status"] += int(unknown.sum())
+            cells = np.ravel_multi_index((origin["state"], origin["sector"], revisit["visit"],
+                                          np.where(unknown, UNKNOWN, origin["status"]),
+                                          np.where(unknown, UNKNOWN, revisit["status"])), shape)
+            weights += np.bincount(cells, weights=revisit["weight"], minlength=size)
+            pairs += np.bincount(cells, minlength=size)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return weights.reshape(shape), pairs.reshape(shape), {f: v.labels for f, v in vocab.items()}, counts
+
+
+def transition_matrices(weights, pairs, labels):
+    """
+    {state: {sector: {visit: {"pairs", "weight", "matrix", "transitions", "unknown_status"}}}}:
+    the weighted from -> to matrix of the pairs with a known status on both
+    visits, its rows as shares of the from-status weight, and the pairs and
+    weight left out for an unknown status.
+    """
+    k = len(LABOUR_STATUSES)
+    out = {}
+    for s, state in enumerate(labels["state"]):
+        for t, sector in enumerate(labels["sector"]):
+            for v, visit in enumerate(labels["visit"]):
+                cell, n = weights[s, t, v], pairs[s, t, v]
+                if not n.sum():
+                    continue
+                unknown = {"pairs": int(n.sum() - n[:k, :k].sum()), "weight": float(cell.sum() - cell[:k, :k].sum())}
+                cell, n = cell[:k, :k], n[:k, :k]
+                totals = cell.sum(axis=1)
+                out.setdefault(state, {}).setdefault(sector, {})[visit] = {
+                    "pairs": int(n.sum()),
+                    "weight": float(cell.sum()),
+                    "matrix": {a: {b: float(cell[i, j]) for j, b in enumerate(LABOUR_STATUSES)}
+                               for i, a in enumerate(LABOUR_STATUSES)},
+                    "transitions": {a: {b: (float(cell[i, j] / totals[i]) if totals[i] else None)
+                                        for j, b in enumerate(LABOUR_STATUSES)}
+                                    for i, a in enumerate(LABOUR_STATUSES)},
+                    "unknown_status": unknown,
+                }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weighted labour-status transitions, first visit -> revisit")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--buckets", type=int, default=N_BUCKETS, help="spill files per dataset")
+    parser.add_argument("--workdir", help="folder for the spill files (default: system temp)")
+    parser.add_argument("--output", default="panel_transitions.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    weights, pairs, labels, counts = transition_weights(args.data_root, args.chunk_size, args.buckets, args.workdir)
+    with open(args.output, "w") as f:
+        json.dump(transition_matrices(weights, pairs, labels), f, indent=2)
+    print(f"✅ {counts['paired']:,} of {counts['revisit_rows']:,} revisit records paired with their first visit "
+          f"({counts['unknown_status']:,} without a known status, {counts['unplaced']:,} without a state, "
+          f"sector or visit) → {args.output} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
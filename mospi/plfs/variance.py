@@ -0,0 +1,226 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from cube import AGE_BANDS, EMPLOYED
+from indicators import DIMENSION_COLUMNS, prepare
+from store import DATA_ROOT, load_cleaned
+from weighted import (MULTIPLIER_COL, NO_QTR_COL, NSC_COL, NSS_COL, SUBSAMPLE_COL, WEIGHT_COLS, final_weight,
+                      group_ids, group_segments, grouped_sums, segment_cumsum, segment_searchsorted)
+
+# Sampling errors from the PLFS sub-sample design.
+#
+# PLFS first-stage units are drawn as two independent, interpenetrating
+# sub-samples. Each sub-sample alone gives an estimate (weight: Sub-sample wise
+# Multiplier / 100 over the quarters) and the published estimate combines the
+# two. For any estimator with sub-sample estimates t1 .. tR (R = 2):
+#
+#   var = sum((tr - mean(t))^2) / (R (R - 1))      = (t1 - t2)^2 / 4 for R = 2
+#
+# In strata where only one sub-sample was surveyed (Ns count x sub-sample ==
+# Ns count) final_weight keeps multiplier / 100, so those records go into both
+# sub-sample estimates: the sub-sample weights then average back to
+# final_weight exactly, and such strata add no variance.
+#
+# The estimate itself is always the full-sample one (final_weight). Every
+# estimator carries a (rows x (1 + R)) weight matrix -- final_weight, then one
+# column per sub-sample -- through a single grouped reduction, so all groups and
+# all replicates come out of the same pass.
+
+Z_95 = 1.959963984540054
+
+DESIGN_COLUMNS = [SUBSAMPLE_COL] + WEIGHT_COLS
+
+
+def design_weights(df):
+    """Weight matrix: column 0 is final_weight, column 1 + r the weight of sub-sample r's estimate."""
+    if SUBSAMPLE_COL not in df:
+        raise KeyError(f"{SUBSAMPLE_COL!r} is not in the data: re-run ingest.py, which now keeps it with the weights")
+    ss_ids, ss_keys = pd.factorize(df[SUBSAMPLE_COL], sort=True)
+    half = (df[MULTIPLIER_COL] / 100 / df[NO_QTR_COL]).to_numpy(dtype=np.float64)
+    single = (df[NSS_COL] == df[NSC_COL]).to_numpy()
+    member = single[:, None] | (ss_ids[:, None] == np.arange(len(ss_keys)))
+    return np.column_stack([final_weight(df), np.where(member, half[:, None], 0.0)])
+
+
+def error_table(theta, keys, by, n, z=Z_95):
+    """
+    Estimate, standard error, z-interval, relative standard error (%) and
+    sample size per group, from (groups x (1 + R)) full-sample and sub-sample
+    estimates.
+    """
+    estimate, reps = theta[:, 0], theta[:, 1:]
+    r = reps.shape[1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if r > 1:
+            se = np.sqrt(((reps - reps.mean(axis=1, keepdims=True)) ** 2).sum(axis=1) / (r * (r - 1)))
+        else:
+            se = np.full(len(estimate), np.nan)
+        out = pd.DataFrame({
+            "estimate": estimate,
+            "se": se,
+            "ci_low": estimate - z * se,
+            "ci_high": estimate + z * se,
+            "rse": 100 * se / np.abs(estimate),
+            "n": n,
+        })
+    if isinstance(by, str):
+        index = pd.Index(keys, name=by)
+    else:
+        index = pd.MultiIndex.from_tuples(keys, names=list(by))
+    return out.set_axis(index).sort_index()
+
+
+def _values(df, x):
+    if isinstance(x, str):
+        x = pd.to_numeric(df[x], errors="coerce")
+    if isinstance(x, pd.Series):
+        return x.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.asarray(x, dtype=np.float64)
+
+
+def estimate_total(df, by, col=None, weights=None, z=Z_95):
+    """Weighted total of `col` (or of records, i.e. estimated persons/households) per group."""
+    weights = design_weights(df) if weights is None else weights
+    ids, keys = group_ids(df, by)
+    x = None if col is None else _values(df, col)
+    theta = grouped_sums(ids, len(keys), weights, x)
+    present = ids >= 0 if x is None else (ids >= 0) & ~np.isnan(x)
+    return error_table(theta, keys, by, np.bincount(ids[present], minlength=len(keys)), z)
+
+
+def estimate_ratio(df, by, numerator, denominator, weights=None, z=Z_95):
+    """
+    Ratio of weighted totals sum(w y) / sum(w x) per group; y and x are
+    column names or arrays, and rows missing either are left out.
+    """
+    weights = design_weights(df) if weights is None else weights
+    ids, keys = group_ids(df, by)
+    y, x = _values(df, numerator), _values(df, denominator)
+    both = ~np.isnan(y) & ~np.isnan(x)
+    y, x = np.where(both, y, np.nan), np.where(both, x, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        theta = grouped_sums(ids, len(keys), weights, y) / grouped_sums(ids, len(keys), weights, x)
+    return error_table(theta, keys, by, np.bincount(ids[(ids >= 0) & both], minlength=len(keys)), z)
+
+
+def estimate_mean(df, by, col, weights=None, z=Z_95):
+    """Weighted mean of `col` per group (a ratio with denominator 1)."""
+    return estimate_ratio(df, by, col, np.ones(len(df)), weights, z)
+
+
+def estimate_share(df, by, condition, within=None, weights=None, z=Z_95):
+    """
+    Weighted share of records meeting `condition` (boolean array-like) among
+    those meeting `within` (all records by default), per group.
+    """
+    condition = np.asarray(condition, dtype=bool)
+    within = np.ones(len(df), dtype=bool) if within is None else np.asarray(within, dtype=bool)
+    return estimate_ratio(df, by, np.where(within, condition, np.nan), np.where(within, 1.0, np.nan), weights, z)
+
+
+def segment_quantiles(values, weights, segments, q):
+    """q-quantile of every (start, end) segment of value-sorted rows, for each weight column."""
+    starts, ends = (np.array(bounds, dtype=np.int64) for bounds in zip(*segments))
+    cum = segment_cumsum(weights, starts, ends)
+    total = cum[ends - 1]
+    out = np.empty((len(starts), weights.shape[1]))
+    for c in range(weights.shape[1]):
+        # first row whose cumulative weight reaches q x total, per segment
+        idx = starts + segment_searchsorted(cum[:, c], starts, ends, q * total[:, c])
+        out[:, c] = np.where(total[:, c] > 0, values[idx], np.nan)
+    return out
+
+
+def estimate_quantile(df, by, col, q=0.5, weights=None, z=Z_95):
+    """
+    Weighted q-quantile of `col` per group, same rule as weighted.weighted_quantiles.
+    Rows are sorted once; every weight column reuses the order.
+    """
+    weights = design_weights(df) if weights is None else weights
+    ids, keys = group_ids(df, by)
+    values = _values(df, col)
+    sel = (ids >= 0) & ~np.isnan(values)
+    g, v, w = ids[sel], values[sel], weights[sel]
+    order = np.lexsort((v, g))
+    g, v, w = g[order], v[order], w[order]
+
+    theta = np.full((len(keys), weights.shape[1]), np.nan)
+    segments = list(group_segments(g)) if len(g) else []
+    if segments:
+        theta[[g[start] for start, _ in segments]] = segment_quantiles(v, w, segments, q)
+    return error_table(theta, keys, by, np.bincount(g, minlength=len(keys)), z)
+
+
+def labour_errors(df, by, weights=None, z=Z_95):
+    """
+    LFPR, WPR and UR (in %) with sampling errors, for a frame prepared by
+    indicators.prepare(); one table per indicator. LFPR and WPR are over the
+    persons with a known status, as in indicators.labour_indicators.
+    """
+    weights = design_weights(df) if weights is None else weights
+    status = df["status_group"].to_numpy(dtype=object)
+    employed = np.isin(status, EMPLOYED).astype(np.float64)
+    labour_force = employed + (status == "unemployed")
+    known = (status != "unknown").astype(np.float64)
+    return {
+        "lfpr": estimate_ratio(df, by, 100 * labour_force, known, weights, z),
+        "wpr": estimate_ratio(df, by, 100 * employed, known, weights, z),
+        "ur": estimate_ratio(df, by, 100 * (status == "unemployed"), labour_force, weights, z),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimates with standard errors and confidence intervals from the PLFS sub-samples")
+    parser.add_argument("--dataset", choices=["hhv1", "hhrv", "perv1", "perrv"], default="perv1")
+    parser.add_argument("--by", nargs="+", default=["state", "sector"],
+                        help=f"{', '.join(DIMENSION_COLUMNS)} or any cleaned column")
+    parser.add_argument("--indicators", action="store_true", help="LFPR / WPR / UR (person files)")
+    parser.add_argument("--total", action="append", default=[], metavar="COL")
+    parser.add_argument("--mean", action="append", default=[], metavar="COL")
+    parser.add_argument("--quantile", action="append", nargs=2, default=[], metavar=("COL", "Q"))
+    parser.add_argument("--share", action="append", nargs=2, default=[], metavar=("COL", "VALUE"))
+    parser.add_argument("--z", type=float, default=Z_95, help="interval half-width in standard errors (default 95%%)")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--output", help="write the tables as JSON records instead of printing them")
+    args = parser.parse_args()
+
+    by = [DIMENSION_COLUMNS.get(d, d) for d in args.by]
+    wanted = ([c for c in by if c != "age_band"] + args.total + args.mean
+              + [c for c, _ in args.quantile] + [c for c, _ in args.share])
+    if "age_band" in by or args.indicators:
+        wanted += ["Age", "status_group", "age_band"]
+    df = load_cleaned(args.dataset, list(dict.fromkeys(wanted + DESIGN_COLUMNS)), args.data_root)
+    if "age_band" in by or args.indicators:
+        df = prepare(df, AGE_BANDS)
+    by = by if len(by) > 1 else by[0]
+    weights = design_weights(df)
+
+    tables = {}
+    if args.indicators:
+        tables.update(labour_errors(df, by, weights, args.z))
+    for col in args.total:
+        tables[f"total:{col}"] = estimate_total(df, by, col, weights, args.z)
+    for col in args.mean:
+        tables[f"mean:{col}"] = estimate_mean(df, by, col, weights, args.z)
+    for col, q in args.quantile:
+        tables[f"q{q}:{col}"] = estimate_quantile(df, by, col, float(q), weights, args.z)
+    for col, value in args.share:
+        tables[f"share:{col}={value}"] = estimate_share(df, by, df[col].astype(str) == value,
+                                                        df[col].notna(), weights, args.z)
+    if not tables:
+        tables["total"] = estimate_total(df, by, None, weights, args.z)
+
+    table = pd.concat(tables, names=["metric"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(table.reset_index().to_dict("records"), f, ensure_ascii=False, indent=2)
+        print(f"✅ {len(table):,} estimates → {args.output}")
+    else:
+        print(table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+# Grouped, survey-weighted reductions for the statewise aggregations.
+#
+# Each kernel takes the whole (filtered) frame and a grouping (e.g. state),
+# does one vectorized pass over the rows and returns {group key: result}, in
+# place of calling a per-group helper inside a groupby loop. Running sums
+# within groups (quantiles, top-n shares) go through segment_cumsum /
+# segment_searchsorted, so the work grows with the rows, not the number of
+# groups (districts as well as states).
+
+
+MULTIPLIER_COL = "Sub-sample wise Multiplier"
+NSS_COL = "Ns count for sector x stratum x substratum x sub-sample"
+NSC_COL = "Ns count for sector x stratum x substratum"
+NO_QTR_COL = "Count of contributing State x Sector x Stratum x SubStratum in 4 Quarters"
+WEIGHT_COLS = [MULTIPLIER_COL, NSS_COL, NSC_COL, NO_QTR_COL]
+SUBSAMPLE_COL = "Sub-sample"
+
+
+def final_weight(df):
+    """Per-record survey weight: multiplier / 100 (both sub-samples present) or / 200, over the quarters."""
+    return np.where(df[NSS_COL] == df[NSC_COL],
+                    df[MULTIPLIER_COL] / 100 / df[NO_QTR_COL],
+                    df[MULTIPLIER_COL] / 200 / df[NO_QTR_COL])
+
+
+def group_ids(df, by):
+    """Row -> group id (-1 where a key is missing) and the key of each group id."""
+    if isinstance(by, str):
+        ids, keys = pd.factorize(df[by])
+        return ids, list(keys)
+    ids, keys = pd.MultiIndex.from_frame(df[list(by)]).factorize()
+    ids = np.where(df[list(by)].isna().any(axis=1).to_numpy(), -1, ids)
+    return ids, list(keys)
+
+
+def group_segments(sorted_ids):
+    """(start, end) of each run of equal ids in an id-sorted array."""
+    bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+    return zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(sorted_ids)])))
+
+
+def grouped_order(ids, values):
+    """
+    Row order by (group id, value), ties in row order -- np.lexsort((values, ids))
+    as two stable argsorts, the second a radix sort when the ids fit in int16.
+    """
+    order = np.argsort(values, kind="stable")
+    ids = ids[order]
+    if len(ids) and ids.max() < np.iinfo(np.int16).max:
+        ids = ids.astype(np.int16)
+    return order[np.argsort(ids, kind="stable")]
+
+
+def segment_bounds(sorted_ids):
+    """group_segments as two arrays (starts, ends); empty for no rows."""
+    if not len(sorted_ids):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+    return np.concatenate(([0], bounds)), np.concatenate((bounds, [len(sorted_ids)]))
+
+
+def segment_cumsum(values, starts, ends):
+    """
+    Running sums of `values` (rows, or rows x columns) restarting at every
+    segment: bit for bit np.cumsum of each values[start:end]. Segments are
+    zero-padded to a power-of-two length and accumulated one length class at
+    a time, so the loop runs over log2(longest segment) classes, not segments.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    lengths = ends - starts
+    widths = (2 ** np.ceil(np.log2(np.maximum(lengths, 1)))).astype(np.int64)
+    for width in np.unique(widths):
+        offsets = np.arange(width)
+        inside = offsets < lengths[widths == width, None]
+        rows = np.where(inside, starts[widths == width, None] + offsets, 0)
+        block = values[rows]
+        block[~inside] = 0.0
+        sums = np.cumsum(block, axis=1)
+        out[rows[inside]] = sums[inside]
+    return out
+
+
+def segment_searchsorted(cum, starts, ends, targets):
+    """
+    Offset within each segment of the first row whose running sum `cum`
+    (segment_cumsum of non-negative weights) reaches the segment's target(s),
+    clipped to the last row: np.searchsorted per segment, as one search over
+    (segment, cum) pairs. targets is (segments,) or (segments, k).
+    """
+    lengths = ends - starts
+    targets = np.asarray(targets, dtype=np.float64)
+    shape = (-1,) + (1,) * (targets.ndim - 1)
+    # complex numbers sort lexicographically: real part = segment, imaginary = running sum
+    keys = np.repeat(np.arange(len(starts)), lengths) + 1j * cum
+    pos = np.searchsorted(keys, np.arange(len(starts)).reshape(shape) + 1j * targets)
+    return np.minimum(pos - starts.reshape(shape), (lengths - 1).reshape(shape))
+
+
+def grouped_sums(ids, n_groups, weights, x=None):
+    """(n_groups, weight columns) sums of a weight matrix (times x) by group id, in one bincount."""
+    k = weights.shape[1]
+    sel = ids >= 0
+    if x is not None:
+        sel &= ~np.isnan(x)
+    wx = weights[sel] if x is None else weights[sel] * x[sel, None]
+    flat = (ids[sel, None].astype(np.int64) * k + np.arange(k)).ravel()
+    return np.bincount(flat, weights=wx.ravel(), minlength=n_groups * k).reshape(n_groups, k)
+
+
+def weighted_distributions(df, by, col, weights, top_n=5, roundup_dig=2, groups=None):
+    """
+    Weighted category shares of `col` for every group of `by`, as
+    {group: {str(category): share}}: the top_n categories by weight, the rest
+    collapsed into 'other'. Same output as calling statewise's per-group
+    weighted_distribution on each group (ties keep first-seen order).
+    `groups` is group_ids(df, by) when the caller already has it.
+    """
+    weights = np.asarray(df[weights] if isinstance(weights, str) else weights, dtype=np.float64)
+    g_ids, g_keys = groups if groups is not None else group_ids(df, by)
+
+    # categories are keyed by their string form, so merge any that print the same
+    v_ids, v_keys = pd.factorize(df[col])
+    s_ids, s_keys = pd.factorize(np.array([str(v) for v in v_keys], dtype=object))
+    v_ids = np.where(v_ids >= 0, s_ids[np.maximum(v_ids, 0)] if len(s_ids) else -1, -1)
+
+    sel = (g_ids >= 0) & (v_ids >= 0)
+    n_values = max(len(s_keys), 1)
+    pair = g_ids[sel].astype(np.int64) * n_values + v_ids[sel]
+    if not len(pair):
+        return {}
+    size = len(g_keys) * n_values
+    if size <= 4 * len(pair):
+        # dense (group, category) table: no sort needed
+        sums = np.bincount(pair, weights=weights[sel], minlength=size)
+        first = np.full(size, len(pair), dtype=np.int64)
+        np.minimum.at(first, pair, np.arange(len(pair)))  # first occurrence of each pair
+        uniq = np.flatnonzero(first < len(pair))
+        sums, first = sums[uniq], first[uniq]
+    else:
+        uniq, first, inverse = np.unique(pair, return_index=True, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=weights[sel], minlength=len(uniq))
+    # bincount adds in row order, like the defaultdict accumulation it replaces
+    group = uniq // n_values
+    value = uniq % n_values
+
+    order = np.lexsort((first, -sums, group))
+    group, value, sums, first = group[order], value[order], sums[order], first[order]
+
+    starts, ends = segment_bounds(group)
+    segment = np.repeat(np.arange(len(starts)), ends - starts)
+    rank = np.arange(len(group)) - starts[segment]
+    # totals added in first-seen order, "other" in share order, as the per-group sums they replace
+    by_first = np.lexsort((first, group))
+    total = segment_cumsum(sums[by_first], starts, ends)[ends - 1]
+    rest = rank >= top_n
+    other = np.zeros(len(starts))
+    if rest.any():
+        r_starts, r_ends = segment_bounds(group[rest])
+        other[segment[rest][r_starts]] = segment_cumsum(sums[rest], r_starts, r_ends)[r_ends - 1]
+
+    out = {}
+    for i, (start, end) in enumerate(zip(starts.tolist(), np.minimum(ends, starts + top_n).tolist())):
+        t = float(total[i])
+        dist = {s_keys[v]: round(float(x) / t, roundup_dig)
+                for v, x in zip(value[start:end], sums[start:end].tolist())}
+        if other[i] > 0:
+            dist["other"] = round(float(other[i]) / t, roundup_dig)
+        out[g_keys[group[start]]] = dist
+    return out
+
+
+def weighted_quantiles(df, by, col, weights, quantiles=(0.5,), groups=None):
+    """
+    Weighted quantiles of `col` for every group of `by`: {group: array, one
+    value per quantile}. Rows are sorted once by (group, value); within a group
+    the q-quantile is the first value whose cumulative weight reaches q x the
+    group's total weight (for q=0.5, statewise's old weighted_median).
+    """
+    values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    w = np.asarray(df[weights] if isinstance(weights, str) else weights, dtype=np.float64)
+    g_ids, g_keys = groups if groups is not None else group_ids(df, by)
+
+    sel = (g_ids >= 0) & ~np.isnan(values)
+    g, v, w = g_ids[sel], values[sel], w[sel]
+    order = grouped_order(g, v)
+    g, v, w = g[order], v[order], w[order]
+
+    q = np.asarray(quantiles, dtype=np.float64)
+    starts, ends = segment_bounds(g)
+    cum = segment_cumsum(w, starts, ends)
+    idx = starts[:, None] + segment_searchsorted(cum, starts, ends, cum[ends - 1][:, None] * q)
+    return {g_keys[i]: row for i, row in zip(g[starts].tolist(), v[idx])}
+
+
+def weighted_describe(df, by, col, weights, percentiles=(.1, .25, .5, .75, .9), groups=None):
+    """
+    Survey-weighted counterpart of Series.describe(percentiles=...) for every
+    group of `by`: {group: {count, mean, std, min, 10%, ..., max}}. count is
+    the number of non-missing records; mean, std and the percentiles use the
+    weights.
+    """
+    values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    w = np.asarray(df[weights] if isinstance(weights, str) else weights, dtype=np.float64)
+    g_ids, g_keys = groups if groups is not None else group_ids(df, by)
+    sel = (g_ids >= 0) & ~np.isnan(values)
+    g, v, ws = g_ids[sel], values[sel], w[sel]
+
+    n = len(g_keys)
+    count = np.bincount(g, minlength=n)
+    total = np.bincount(g, weights=ws, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(g, weights=ws * v, minlength=n) / total
+        var = np.bincount(g, weights=ws * (v - mean[g]) ** 2, minlength=n) / total
+    lo = np.full(n, np.inf)
+    hi = np.full(n, -np.inf)
+    np.minimum.at(lo, g, v)
+    np.maximum.at(hi, g, v)
+
+    labels = [f"{p * 100:g}%" for p in percentiles]
+    quantiles = weighted_quantiles(df, by, col, w, percentiles, (g_ids, g_keys))
+    out = {}
+    for i, key in enumerate(g_keys):
+        if not count[i]:
+            continue
+        stats = {"count": float(count[i]), "mean": float(mean[i]), "std": float(np.sqrt(var[i])), "min": float(lo[i])}
+        stats.update({label: float(x) for label, x in zip(labels, quantiles[key])})
+        stats["max"] = float(hi[i])
+        out[key] = stats
+    return out